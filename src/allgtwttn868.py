@@ -21,25 +21,16 @@
 #
 # Info
 # ----------------------------------------------------------------
-# Generate csv file of EU_863_870 TTN gateways
+# Generate csv files of the TTN gateways: one file for each frequency plan
+# (gtwttn-EU_863_870.csv, gtwttn-US_902_928.csv, ...) and the combined file
+# gtwttn-all.csv with its index gtwttn-all.idx (see ttngateways.py)
 # ----------------------------------------------------------------
 #
 import os
-import wget
-import json
+import getopt, sys
 
-# https://github.com/TheThingsNetwork/lorawan-frequency-plans
-# The Things Network Stack supports at least the following bands            
-# AS_923             Asia 923 MHz
-# AU_915_928         Australia 915 - 928 MHz
-# CN_470_510         China 470 - 510 MHz
-# CN_779_787         China 779 - 787 MHz
-# EU_433             Europe 433 MHz
-# EU_863_870         Europe 863 - 870 MHz
-# IN_865_870         India 865 - 867 MHz
-# KR_920_923         Korea 920 - 923 MHz
-# RU_864_870         Russia 864 - 870 MHz
-# US_902_928         United States 902 - 928 MHz
+from transport import fetchUrl
+from ttngateways import refreshGatewayStore, gatewayCacheAge, CacheTTL
 
 # ---------------------------------------------------------------
 # config
@@ -47,99 +38,65 @@ import json
 PathBaseDir = os.getcwd()               # current working directory of the process
 csv_sep = ';'                           # char separator for csv
 
-# ---------------------------------------------------------------
-# get gateway list from ttn
-#
-fp_TTN_all_gateways = os.path.join(PathBaseDir, "TTNgateways.json")
-
 # https://stackoverflow.com/questions/7243750/download-file-from-web-in-python-3
 # https://stackabuse.com/download-files-with-python/
 url = 'http://noc.thethingsnetwork.org:8085/api/v2/gateways'
-# response = urllib.request.urlopen(url)
-# data = response.read()      # a `bytes` object
-wget.download(url, fp_TTN_all_gateways)
+cacheTTL = CacheTTL                     # validity of the gateway store (s)
 
-# ---------------------------------------------------------------
-# https://stackoverflow.com/questions/36606930/delete-an-element-in-a-json-object
+def printHlpFull():
+    print('{} [-s <gateway source>] [-t <cache hours>]'.format(sys.argv[0]))
+    print('Download the TTN gateway list and store the gateways of each frequency plan in gtwttn-<plan>.csv')
+    print('(example: gtwttn-EU_863_870.csv), and all the gateways in gtwttn-all.csv, with index gtwttn-all.idx')
+    print('-s: url or local path of the TTN gateway list (default: {})'.format(url))
+    print('-t: the gateway list is downloaded only if the store gtwttn-store.csv is older than')
+    print('    the hours specified (default: {}, 0: always). Only the csv of the plans with gateways'.format(int(CacheTTL / 3600)))
+    print('    new, moved or removed are written again, each as a whole')
 
-# Transform input file of json list to python objects
-#
-with open(fp_TTN_all_gateways, 'r') as data_file:
-    data = json.load(data_file)
+# -------------------------------------------------------------------------
+# Get command-line arguments
+
+try:
+    opts, args = getopt.getopt(
+            sys.argv[1:],
+            'hs:t:',
+            ["source=","ttl="])
+except getopt.GetoptError:
+    printHlpFull()              # print full help
+    sys.exit(2)
+
+for opt, arg in opts:
+    if opt == '-h':
+        printHlpFull()              # print full help
+        sys.exit()
+    elif opt in ("-s", "--source"):
+        url = arg
+    elif opt in ("-t", "--ttl"):
+        cacheTTL = float(arg) * 3600
 
 # ---------------------------------------------------------------
-# remove elements not used
-# for element in data['statuses']:
+# gateway store still valid: no download
 #
-for key,val in list(data['statuses'].items()):
-    # print(key)                # print gateway id
-    # ---------------- check frequency_plan
-    if "frequency_plan" not in val:
-        # there is no frequency_plan
-        data['statuses'].pop(key)
-        continue
-    # check if frequency_plan different of "EU_863_870"
-    if val["frequency_plan"] != "EU_863_870":
-        # frequency_plan different to EU_863_870
-        data['statuses'].pop(key)
-        continue
-    # check location data
-    # if (len(val['location']) == 0):
-    if 'location' not in val:
-        # ---------------- empty coordinates
-        data['statuses'].pop(key)
-        continue
-    # ---------------- check latitudes
-    if "latitude" not in val['location']:
-        # there is no latitude
-        data['statuses'].pop(key)
-        continue
-    # ---------------- check latitudes
-    if "longitude" not in val['location']:
-        # there is no longitude
-        data['statuses'].pop(key)
-        continue
-    
-    # print(val)
-    val.pop('timestamp', None)
-    val.pop('authenticated', None)
-    val.pop('uplink', None)
-    val.pop('downlink', None)
-    val.pop('gps', None)
-    val['location'].pop('source', None)
-    val.pop('time', None)
-    val.pop('rx_ok', None)
-    val.pop('tx_in', None)
+cacheAge = gatewayCacheAge(PathBaseDir)
+if cacheAge is not None and cacheAge < cacheTTL:
+    print("TTN gateway store updated {:.1f} hours ago: no download".format(cacheAge / 3600))
+    sys.exit()
 
 # ---------------------------------------------------------------
-# form file csv
+# get gateway list from ttn
 #
-fp_TTN_gateways_csv = os.path.join(PathBaseDir, "gtwttn-EU_863_870.csv")
+fp_TTN_all_gateways = os.path.join(PathBaseDir, "TTNgateways.json")
 
-with open(fp_TTN_gateways_csv, 'w') as gtwList_csv:
-    # first row
-    line = "\"{}\"{}".format(
-            "gtw_id", csv_sep)
-    line += "\"{}\"{}\"{}\"{}".format(
-            "lat", csv_sep,
-            "lon", csv_sep)
-    line += "\"{}\"\n".format(
-            "alt")
-    gtwList_csv.write(line)
-    
-    for key,val in list(data['statuses'].items()):
-        # form string
-        # id, frequency_plan
-        line = "\"{}\"{}".format(
-                key, csv_sep)
-        # lat, lon
-        line += "{}{}{}{}".format(
-                val['location']['latitude'], csv_sep,
-                val['location']['longitude'], csv_sep)
-        # altitude
-        if "altitude" in val['location']:
-            line += "{}".format(
-                 val['location']['altitude'])
-        line += "\n"                 
-        gtwList_csv.write(line)
-    gtwList_csv.close()
\ No newline at end of file
+# response = urllib.request.urlopen(url)
+# data = response.read()      # a `bytes` object
+if fetchUrl(url, fp_TTN_all_gateways) == False:
+    print("Error download TTN gateway list: {}".format(url))
+    sys.exit(2)
+
+# ---------------------------------------------------------------
+# refresh the gateway store: the gateways are read one at a time from the json file,
+# and the csv of the frequency plans with changed gateways are written again
+#
+stats = refreshGatewayStore(fp_TTN_all_gateways, PathBaseDir)
+print("gateways new: {}, moved: {}, removed: {}, unchanged: {}".format(
+        stats['new'], stats['moved'], stats['removed'], stats['unchanged']))
+print("frequency plans written: {}".format(' '.join(stats['plans']) if stats['plans'] else 'none'))
@@ -31,13 +31,20 @@
 import os
 import os.path
 import getopt, sys
+import heapq
+import time
+import multiprocessing
+import shutil
+import tempfile
 
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from staticmap import StaticMap, CircleMarker
 import csv, json, sys
 import geopy.distance
+from geodist import geodesicKm, geodesicKmExact, GeodistTol
+from ttngateways import gatewayPlanCsv, gatewayCacheAge, CacheTTL
+from gtwstore import loadGatewayStore, GatewayStore, gtwIdKey
 from array import *
 
 # ---------------------------------------------------------------
@@ -46,6 +53,22 @@ from array import *
 PathBaseDir = os.getcwd()               # current working directory of the process
 access_rights = 0o777                   # define the access rights file/folder
 csv_sep = ';'                           # char separator for csv
+# columns read from the TTN Mapper log, with their types
+log_columns = {
+    'time': str, 'nodeaddr': 'category', 'gwaddr': 'category', 'datarate': 'category',
+    'snr': np.float32, 'rssi': np.float32,
+    'freq': np.float32, 'lat': np.float64, 'lon': np.float64, 'alt': np.float32,
+}
+# columns that must have a value: the rows with missing values are removed
+# (without freq, the link budget of the row is not computed)
+required_columns = [c for c in log_columns if c != 'freq']
+time_format = '%Y-%m-%d %H:%M:%S'      # format of the time in the log
+# columns of the output file
+column_names = ['time','distance','nodeaddr','lat','lon','gwaddr','gtw_lat','gtw_lon',
+        'alt','datarate','snr','rssi','freq','fspl','excess']
+TxPower = 14.0                          # default EIRP of the devices (dBm)
+# columns of the file of the missed gateways
+missed_columns = ['time','nodeaddr','lat','lon','gtw_id','gtw_lat','gtw_lon','distance']
 
 # -------------------------------------------------------------------------
 #
@@ -92,194 +115,469 @@ def get_file_ext(full_path):
 def str2bool(v):
     return v.lower() in ("yes", "true", "t", "1")
 
+# -------------------------------------------------------------------------
+# read the TTN gateways position from the binary store of the csv srcCsv
+# (compiled in dirBase at the first run, see gtwstore.py)
+#
+def loadGateways(srcCsv, freqPlan, dirBase):
+    return loadGatewayStore(srcCsv, dirBase, freqPlan)
+
+# -------------------------------------------------------------------------
+# read the file from TTNMapper: only the columns used, with compact types.
+# The coordinates are float64: they are rounded to 4 decimals in the output.
+# If chunkRows > 0, return an iterator of dataframes with chunkRows rows
+#
+def readTTNMapperLog(fpLog, chunkRows=0):
+    return pd.read_csv(fpLog, skipinitialspace = True,
+            usecols = lambda col: col.strip() in log_columns,
+            dtype = log_columns,
+            chunksize = chunkRows if chunkRows > 0 else None)
+
+# -------------------------------------------------------------------------
+# add the columns with lat and lon and the TTN id (gtw_ttn) of the gateways.
+# The gateways are searched in the store with its id index, once for each
+# category of gwaddr. The gateways without exact match are searched as
+# substring of the TTN gateway ids (example: 'eui-' + id).
+# gtwLookup has the gateways searched (normalised id -> index in the store,
+# -1: not found): each gateway is searched only once in the chunks of a log.
+# gtwStats has the sets of gateways found with exact match, with substring
+# or not found.
+#
+def addGatewayCoords(data, gtwStore, gtwLookup, gtwStats, flCase):
+    # the key is computed once for each category of gwaddr
+    keys = gtwIdKey(data.gwaddr.cat.categories, flCase)
+    new = [x for x in pd.unique(keys) if x not in gtwLookup]
+    if new:
+        for x, pos in zip(new, gtwStore.byIds(new, flCase)):
+            if pos >= 0:
+                gtwStats['exact'].add(x)
+            else:
+                pos = gtwStore.containing(x, flCase)
+                gtwStats['substring' if pos >= 0 else 'missing'].add(x)
+            gtwLookup[x] = int(pos)
+
+    # index in the store of the gateway of each row
+    catInd = np.array([gtwLookup[x] for x in keys] + [-1], dtype=np.int64)
+    rowInd = catInd[data.gwaddr.cat.codes.values]              # code -1 (nan): last item
+    sel = np.nonzero(rowInd >= 0)[0]
+    gtwLat = np.full(len(data), np.nan)
+    gtwLon = np.full(len(data), np.nan)
+    gtwTtn = np.full(len(data), None, dtype=object)
+    gtwLat[sel] = gtwStore.lat[rowInd[sel]]
+    gtwLon[sel] = gtwStore.lon[rowInd[sel]]
+    gtwTtn[sel] = gtwStore.ids[rowInd[sel]]
+    data = data.assign(gtw_lat=gtwLat, gtw_lon=gtwLon, gtw_ttn=gtwTtn)
+    return (data, gtwLookup)
+
+def printGatewayStats(gtwStats):
+    print("gateways: {}, exact match: {}, substring match: {}".format(
+            len(gtwStats['exact']) + len(gtwStats['substring']) + len(gtwStats['missing']),
+            len(gtwStats['exact']), len(gtwStats['substring'])))
+    if gtwStats['bad_time'] > 0:
+        print("Warning: rows removed, time not valid: {}".format(gtwStats['bad_time']))
+
+# -------------------------------------------------------------------------
+# link budget of the rows:
+# fspl  : free space path loss (dB) = 20 log10(d km) + 20 log10(f MHz) + 32.44
+# excess: received power - expected power in free space (dB) = rssi - (txPower - fspl)
+# A high excess on a long link is a sign of anomalous (tropospheric) propagation.
+#
+def linkBudget(distKm, freqMHz, rssi, txPower):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fspl = 20.0 * np.log10(distKm) + 20.0 * np.log10(freqMHz.astype(np.float64)) + 32.44
+    excess = rssi.astype(np.float64) - (txPower - fspl)
+    return (fspl, excess)
+
+# -------------------------------------------------------------------------
+# time of the rows of the log. The times not in the format time_format (with
+# 'T' separator, fractional seconds or time zone) are parsed as ISO 8601 and
+# converted in UTC, truncated to the second: all the times of the output have
+# the format time_format, used to sort and merge the runs.
+# The times not valid are NaT.
+#
+def parseLogTime(times):
+    tm = pd.to_datetime(times, format=time_format, errors='coerce')
+    bad = tm.isna() & times.notna()
+    if bad.any():
+        iso = pd.to_datetime(times[bad].str.strip(), format='ISO8601', utc=True, errors='coerce')
+        tm[bad] = iso.dt.tz_convert(None).dt.floor('s')
+    return tm
+
+# -------------------------------------------------------------------------
+# remove the rows of the log with missing values, and add the coordinates
+# and the TTN id (gtw_ttn) of the gateways.
+# flCase: check the letter case of the gateway ids
+#
+def joinLog(data, gtwStore, gtwLookup, gtwStats, flCase):
+    data.columns = data.columns.str.replace(' ', '')            # Togli spazi dal nome delle colonne
+    # time of the acquisition; the rows with time not valid are removed
+    # and counted in gtwStats['bad_time']
+    data['time'] = parseLogTime(data['time'])
+    gtwStats['bad_time'] += int(data['time'].isna().sum())
+    data = data.dropna(subset=required_columns)                 # drop all rows with any NaN and NaT values
+
+    data, gtwLookup = addGatewayCoords(data, gtwStore, gtwLookup, gtwStats, flCase)
+
+    # Drop rows with NaN in specific columns. here we are removing Missing values in columns
+    data = data.dropna(subset=['gtw_lat', 'gtw_lon'])
+
+    # specify pandas to not to keep the original index with the argument drop=True.
+    data.reset_index(drop=True, inplace=True)
+    return (data, gtwLookup)
+
+# -------------------------------------------------------------------------
+# filter the rows of the log joined with the gateways: remove the rows
+# with distance device - gateway less than minDist.
+# flValidate: validate the distances with geopy
+# txPower: EIRP of the devices (dBm), used for the link budget
+# return the rows with columns column_names
+#
+def filterLog(data, minDist, flValidate, txPower=TxPower):
+
+    # ---------------------------------------------------------------
+    # add column with distance: geodesic distance of all the rows at the same time.
+    # In validation mode, the distance is computed also with geopy (row by row)
+    # and the exact values are used.
+    distance = geodesicKm(data['lat'], data['lon'], data['gtw_lat'], data['gtw_lon'])
+    if flValidate:
+        fast = distance
+        distance = geodesicKmExact(data['lat'], data['lon'], data['gtw_lat'], data['gtw_lon'])
+        maxDiff = np.abs(fast - distance).max() if len(distance) > 0 else 0.0
+        nDiff = np.count_nonzero((fast > minDist) != (distance > minDist))
+        nDiff += np.count_nonzero((np.floor(fast) != np.floor(distance)) & (distance > minDist))
+        print("validation: max difference from geopy: {:.3e} km (tolerance {:.0e}), rows changed: {}".format(
+                maxDiff, GeodistTol, nDiff))
+
+    # remove the rows with distance less than limit
+    keep = distance > minDist
+    data = data[keep].reset_index(drop=True)
+    distance = distance[keep]
+
+    # distance: set all values integer
+    data['distance'] = np.floor(distance).astype(np.int64)
+
+    # link budget with the exact distance
+    data['fspl'], data['excess'] = linkBudget(distance, data['freq'].values, data['rssi'].values, txPower)
+    # all coordinates with 4 decimals:
+    # see: https://www.geeksforgeeks.org/python-pandas-dataframe-round/
+    data = data.round({'lat':4, 'lon':4, 'gtw_lat':4, 'gtw_lon':4, 'fspl':2, 'excess':2})
+
+    # ---------------------------------------------------------------
+    # reorder columns
+    data = data.reindex(columns=column_names)
+    return data
+
+# all the steps of the conversion of the log
+def processLog(data, gtwStore, gtwLookup, gtwStats, minDist, flCase, flValidate, txPower=TxPower):
+    data, gtwLookup = joinLog(data, gtwStore, gtwLookup, gtwStats, flCase)
+    return (filterLog(data, minDist, flValidate, txPower), gtwLookup)
+
+# -------------------------------------------------------------------------
+# gateways of the store at distance <= rKm from the device that did not
+# receive the packet (time, nodeaddr, lat, lon) of the log joined with the gateways
+#
+def missedGateways(data, gtwStore, rKm):
+    rows = []
+    for (tm, node, lat, lon), grp in data.groupby(['time', 'nodeaddr', 'lat', 'lon'], sort=False, observed=True):
+        heard = set(grp['gtw_ttn'])
+        ind, geo = gtwStore.missed(lat, lon, rKm, heard)
+        for i, dist in zip(ind.tolist(), geo.tolist()):
+            rows.append((tm, node, lat, lon, str(gtwStore.ids[i]), gtwStore.lat[i], gtwStore.lon[i], dist))
+    missed = pd.DataFrame(rows, columns=missed_columns)
+    missed = missed.round({'lat':4, 'lon':4, 'gtw_lat':4, 'gtw_lon':4, 'distance':3})
+    missed.sort_values(['time', 'nodeaddr', 'distance'], inplace=True, kind='stable')
+    return missed.reset_index(drop=True)
+
+# ---------------------------------------------------------------
+# sort dataframe by columns:
+# ['distance','time','nodeaddr','gwaddr'], distance descending
+#
+def sortLog(data):
+    data.sort_values(['distance','time','nodeaddr','gwaddr'], axis=0,
+            ascending=[False,True,True,True], inplace=True, kind='stable')
+    data.reset_index(drop=True, inplace=True)
+    return data
+
+# sort key of a row of a run, same order of sortLog()
+def runKey(line):
+    row = next(csv.reader([line], delimiter=csv_sep))
+    return (-int(row[1]), row[0], row[2], row[5])
+
+# -------------------------------------------------------------------------
+# merge the sorted runs (csv without header, or with header if skipHeader)
+# in the file fpOut.
+# heapq.merge is stable: for equal keys, the rows of the first runs are
+# written first, as in the sort of the whole file.
+#
+def mergeRuns(fpRuns, fpOut, skipHeader=False):
+    files = [open(fp, 'r', encoding='utf-8', newline='') for fp in fpRuns]
+    try:
+        if skipHeader:
+            for f in files:
+                f.readline()
+        with open(fpOut, 'w', encoding='utf-8', newline='') as fOut:
+            fOut.write(csv_sep.join(column_names) + '\n')
+            for line in heapq.merge(*files, key=runKey):
+                fOut.write(line)
+    finally:
+        for f in files:
+            f.close()
+
+# -------------------------------------------------------------------------
+# convert the TTN Mapper log fpLog in the csv file fpOutCsv, with the gateways
+# of the store gtwStore
+# chunkRows: rows of a chunk in streaming mode (0: read the whole file)
+# missRadius: if > 0, the gateways of gtwStore at distance <= missRadius km
+#             that did not receive a packet are saved in <output>-missed.csv
+#             (not in streaming mode)
+# return the rows written and the gateway statistics
+#
+def convertLog(fpLog, fpOutCsv, gtwStore, minDist, flCase, flValidate, chunkRows=0, verbose=True,
+        txPower=TxPower, missRadius=0):
+    gtwStats = {'exact': set(), 'substring': set(), 'missing': set(), 'bad_time': 0}
+    gtwLookup = {}
+    if chunkRows <= 0:
+        # ---------------------------------------------------------------
+        # read the whole file from TTNMapper
+        data = readTTNMapperLog(fpLog)
+        data, gtwLookup = joinLog(data, gtwStore, gtwLookup, gtwStats, flCase)
+        if missRadius > 0:
+            missed = missedGateways(data, gtwStore, missRadius)
+            fpMissed = os.path.splitext(fpOutCsv)[0] + '-missed.csv'
+            missed.to_csv(fpMissed, sep= csv_sep, encoding='utf-8', index=False)
+            if verbose:
+                print("missed gateways: {}, output: {}".format(len(missed), fpMissed))
+        data = sortLog(filterLog(data, minDist, flValidate, txPower))
+        if verbose:
+            printGatewayStats(gtwStats)
+            print(data)
+
+        # ---------------------------------------------------------------
+        # save to csv these columns:
+        data.to_csv(fpOutCsv, sep= csv_sep, encoding='utf-8', index=False)
+        return (len(data), gtwStats)
+
+    # ---------------------------------------------------------------
+    # streaming mode: the file is read in chunks of chunkRows rows.
+    # Each chunk is processed, sorted and saved in a temporary file (run);
+    # at the end, the runs are merged in the output file.
+    dirRuns = tempfile.mkdtemp(prefix='runs-', dir=os.path.dirname(fpOutCsv))
+    fpRuns = []
+    nRows = 0
+    try:
+        for nChunk, data in enumerate(readTTNMapperLog(fpLog, chunkRows)):
+            data, gtwLookup = processLog(data, gtwStore, gtwLookup, gtwStats, minDist, flCase, flValidate, txPower)
+            data = sortLog(data)
+            fpRun = os.path.join(dirRuns, "run-{:06d}.csv".format(nChunk))
+            data.to_csv(fpRun, sep= csv_sep, encoding='utf-8', index=False, header=False)
+            fpRuns.append(fpRun)
+            nRows += len(data)
+            if verbose:
+                print("chunk {}: rows {}".format(nChunk, len(data)))
+        mergeRuns(fpRuns, fpOutCsv)
+    finally:
+        shutil.rmtree(dirRuns, ignore_errors=True)
+    if verbose:
+        printGatewayStats(gtwStats)
+        print("rows: {}, runs: {}, output: {}".format(nRows, len(fpRuns), fpOutCsv))
+    return (nRows, gtwStats)
+
+# -------------------------------------------------------------------------
+# batch mode: the gateway store is loaded once in each process of the pool
+#
+batchGtwStore = None
+
+# the gateway store is memory-mapped again in each process
+def initBatch(dirGtwStore):
+    global batchGtwStore
+    batchGtwStore = GatewayStore(dirGtwStore)
+
+# convert a log of the batch; job = (fpLog, fpOutCsv, minDist, flCase, flValidate, chunkRows, txPower, missRadius)
+# return (fpLog, fpOutCsv, rows, gateway statistics, seconds, error)
+def convertBatchLog(job):
+    fpLog, fpOutCsv, minDist, flCase, flValidate, chunkRows, txPower, missRadius = job
+    tStart = time.time()
+    try:
+        nRows, gtwStats = convertLog(fpLog, fpOutCsv, batchGtwStore,
+                minDist, flCase, flValidate, chunkRows, verbose=False, txPower=txPower,
+                missRadius=missRadius)
+    except Exception as err:
+        return (fpLog, fpOutCsv, 0, None, time.time() - tStart, str(err))
+    return (fpLog, fpOutCsv, nRows, gtwStats, time.time() - tStart, '')
+
+# print the summary of the batch
+def printBatchSummary(results, tTotal):
+    print('{:<40} {:>10} {:>8} {:>8} {:>8} {:>8} {:>9}'.format('file', 'rows', 'exact', 'substr', 'missing', 'bad time', 'seconds'))
+    for fpLog, fpOutCsv, nRows, gtwStats, tFile, err in results:
+        if err:
+            print('{:<40} error: {}'.format(os.path.basename(fpLog), err))
+            continue
+        print('{:<40} {:>10} {:>8} {:>8} {:>8} {:>8} {:>9.2f}'.format(os.path.basename(fpLog), nRows,
+                len(gtwStats['exact']), len(gtwStats['substring']), len(gtwStats['missing']),
+                gtwStats['bad_time'], tFile))
+    nFiles = len([r for r in results if not r[5]])
+    print('files: {}, errors: {}, rows: {}, time: {:.2f} s'.format(
+            nFiles, len(results) - nFiles, sum([r[2] for r in results]), tTotal))
+
 def printHlpOptions():
-    print('{} -i <TTN Mapper Log file> -d <min distance device to gateway (km)> -c <TTN gtw ID> -o <out dir>'.format(sys.argv[0]))
+    print('{} -i <TTN Mapper Log file> -d <min distance device to gateway (km)> -c <TTN gtw ID> -o <out dir> [-v] [-k <chunk rows>] [-t <tx power dBm>] [-f <frequency plan>] [-g <km>]'.format(sys.argv[0]))
+    print('{} -b <dir TTN Mapper Log files> -d <min distance device to gateway (km)> -c <TTN gtw ID> -o <out dir> [-m <merged csv>] [-p <n. processes>] [-t <tx power dBm>] [-f <frequency plan>] [-g <km>]'.format(sys.argv[0]))
 
 def printHlpFull():
-    print('{} -i <TTN Mapper Log file> -d <min distance device to gateway (km)> -c <TTN gtw ID> -o <out dir>'.format(sys.argv[0]))
+    printHlpOptions()
     print('Example:')
     print('{} -i rfsee_drivetest_unit_4.txt -d 20 -c \"no\" -o \"./outdir\"'.format(sys.argv[0]))
     print('Read rfsee_drivetest_unit_4.txt. Remove positions with distance less than 20 km'.format(sys.argv[0]))
     print('If -c \"no\", ignore letter case of gateway id name for search')
     print('Store csv result file in ./output directory')
+    print('If -v, validate the distances with geopy geodesic (slow) and use the exact values')
+    print('If -k 1000000, read the log in chunks of 1000000 rows: each chunk is sorted in a temporary file,')
+    print('and the files are merged at the end (for very large logs)')
+    print('If -t 14, the devices transmit with EIRP 14 dBm (default): for each row, the file has')
+    print('the free space path loss (fspl, dB) and the excess of the received power (excess = rssi - 14 + fspl, dB)')
+    print('If -f US_902_928, use the gateways of the frequency plan US_902_928 (default: EU_863_870),')
+    print('read from gtwttn-US_902_928.csv or from the combined file gtwttn-all.csv created by allgtwttn868.py')
+    print('If -g 50, save in <output>-missed.csv the gateways at distance <= 50 km from the device')
+    print('that did not receive a packet (not in streaming mode)')
+    print('Batch mode:')
+    print('{} -b ./logs -d 20 -c \"no\" -o \"./outdir\" -m all.csv -p 4'.format(sys.argv[0]))
+    print('Convert all the logs *.txt of ./logs with 4 processes (default: n. of cpu).')
+    print('Store a csv result file for each log, and all the results merged in ./outdir/all.csv')
 
 
 # -------------------------------------------------------------------------
 # Get command-line arguments
 
-# initialize variables
-inpTTNMapperLog = ''
-outDirCsv = ''
-minDist = 20
-flCaseGtwId = True
-
-try:
-    opts, args = getopt.getopt(
-            sys.argv[1:],
-            'i:d:c:o:',
-            ["inp=","dist=","case=","out="])
-except getopt.GetoptError:
-    printHlpFull()              # print full help
-    sys.exit(2)
-
-nArg = 0
-# print(opts)
-# print(args)
-for opt, arg in opts:
-    if opt == '-h':
+if __name__ == '__main__':
+    # initialize variables
+    inpTTNMapperLog = ''
+    outDirCsv = ''
+    minDist = 20
+    flCaseGtwId = True
+    flValidate = False                      # validate the distances with geopy
+    chunkRows = 0                           # rows of a chunk in streaming mode (0: whole file)
+    inpBatchDir = ''                        # batch mode: directory of the TTN Mapper logs
+    outMergedCsv = ''                       # batch mode: merged result of all the logs
+    nProcesses = 0                          # batch mode: n. of processes (0: n. of cpu)
+    txPower = TxPower                       # EIRP of the devices (dBm)
+    freqPlan = 'EU_863_870'                 # frequency plan of the gateways
+    missRadius = 0                          # radius (km) of the search of the missed gateways
+
+    try:
+        opts, args = getopt.getopt(
+                sys.argv[1:],
+                'i:d:c:o:vk:b:m:p:t:f:g:',
+                ["inp=","dist=","case=","out=","validate","chunk=","batch=","merge=","proc=","txpower=","freqplan=","missed="])
+    except getopt.GetoptError:
+        printHlpFull()              # print full help
+        sys.exit(2)
+
+    nArg = 0
+    # print(opts)
+    # print(args)
+    for opt, arg in opts:
+        if opt == '-h':
+            printHlpFull()              # print full help
+            sys.exit()
+        elif opt in ("-i", "--inp"):
+            inpTTNMapperLog = arg
+            # print('TTN Mapper Log file: {}'.format(inpTTNMapperLog))
+            nArg = nArg + 1
+        elif opt in ("-o", "--out"):
+            outDirCsv = arg
+            # print('Output directory csv result: {}'.format(outDirCsv))
+            nArg = nArg + 1
+        elif opt in ("-d", "--dist"):
+            minDist = int(arg)
+            # print('min distance: {}'.format(minDist))
+            nArg = nArg + 1
+        elif opt in ("-c", "--case"):
+            flCaseGtwId = False;
+            # print(arg)
+            if str2bool(arg):
+                flCaseGtwId = True;
+            # print('In TTN gateway name search, check case of letters: {}'.format(flCaseGtwId))
+            nArg = nArg + 1
+        elif opt in ("-v", "--validate"):
+            flValidate = True
+        elif opt in ("-k", "--chunk"):
+            chunkRows = int(arg)
+        elif opt in ("-b", "--batch"):
+            inpBatchDir = arg
+            nArg = nArg + 1
+        elif opt in ("-m", "--merge"):
+            outMergedCsv = arg
+        elif opt in ("-p", "--proc"):
+            nProcesses = int(arg)
+        elif opt in ("-t", "--txpower"):
+            txPower = float(arg)
+        elif opt in ("-f", "--freqplan"):
+            freqPlan = arg
+        elif opt in ("-g", "--missed"):
+            missRadius = float(arg)
+
+    # print(nArg)
+
+    if nArg < 4:
         printHlpFull()              # print full help
         sys.exit()
-    elif opt in ("-i", "--inp"):
-        inpTTNMapperLog = arg
-        # print('TTN Mapper Log file: {}'.format(inpTTNMapperLog))
-        nArg = nArg + 1
-    elif opt in ("-o", "--out"):
-        outDirCsv = arg
-        # print('Output directory csv result: {}'.format(outDirCsv))
-        nArg = nArg + 1
-    elif opt in ("-d", "--dist"):
-        minDist = int(arg)
-        # print('min distance: {}'.format(minDist))
-        nArg = nArg + 1
-    elif opt in ("-c", "--case"):
-        flCaseGtwId = False;
-        # print(arg)
-        if str2bool(arg):
-            flCaseGtwId = True;
-        # print('In TTN gateway name search, check case of letters: {}'.format(flCaseGtwId))
-        nArg = nArg + 1
-
-# print(nArg)
-        
-if nArg < 4:
-    printHlpFull()              # print full help
-    sys.exit()
-
-## if not os.path.exists(outDirCsv):
-##     os.makedirs(outDirCsv)
-
-# ---------------------------------------------------------------
-# in base of inpTTNMapperLog, get file name and extension
-# full path inpTTNMapperLog
-# original
-# fpTTNMapperLog = os.path.join(PathBaseDir, inpTTNMapperLog)
 
-# convert file path to absolute
-fpTTNMapperLog = get_full_path(inpTTNMapperLog)
-
-# get filename of output file
-outCsv = get_file_name(inpTTNMapperLog) + '.csv'
-# full path output dir
-if not os.path.exists(outDirCsv):
-    os.mkdir(outDirCsv, access_rights)
-fpOutDir = get_full_path(outDirCsv)     # full path output dir
-
-# full path output file
-fpOutCsv = os.path.join(fpOutDir, outCsv)
-
-# ---------------------------------------------------------------
-# read TTN gateways position from csv
-fp_TTN_gateways_csv = os.path.join(PathBaseDir, "gtwttn-EU_863_870.csv")
-gtw = pd.read_csv(fp_TTN_gateways_csv, sep = csv_sep)
-
-# ---------------------------------------------------------------
-# read the file from TTNMapper and clean up the elements
-data = pd.read_csv(fpTTNMapperLog, skipinitialspace = True)
-data.columns = data.columns.str.replace(' ', '')            # Togli spazi dal nome delle colonne
-#remove useless columns
-delete_columns = ['id', 'appeui', 'modulation', 'freq', 'accuracy', 'hdop', 'sats', 'provider', 'user_agent']
-data.drop(columns=delete_columns, axis=1, inplace=True)
-
-data = data.dropna()                                        # drop all rows with any NaN and NaT values
-## print(data)
-
-# trova quanti gateways ha raggiunto in tutto
-gateways = data.gwaddr.unique()
-
-# rimuovi spazi dai nomi dei gateways
-gateways = [x.strip(' ') for x in gateways]
-# print(gateways)
-
-# sys.exit()
-
-# add 2 new columns: lat, lon of gateway. Initialize with nan
-data['gtw_lat'] = np.NaN
-data['gtw_lon'] = np.NaN 
-
-# aggiungi due colonne con lat e lon dei gateways
-for x in range(0, len(gateways)):
-    df_gtw = gtw[gtw.gtw_id.str.contains(gateways[x], case=flCaseGtwId, regex=False)]
-    if df_gtw.empty:
-        continue
-
-    # ----------------- print("IN  gw[{}]".format(gateways[x]))
-    df_gtw.reset_index(drop=True, inplace=True)
-
-    ## print(df_gtw)
-    
-    lat = df_gtw.at[0,'lat']
-    lon = df_gtw.at[0,'lon']
-    
-    # sys.exit()
-    
-    data.loc[data.gwaddr.str.contains(gateways[x], regex=False) , 'gtw_lat'] = lat
-    data.loc[data.gwaddr.str.contains(gateways[x], regex=False) , 'gtw_lon'] = lon
-
-# Drop rows with NaN in specific columns. here we are removing Missing values in columns
-# data = data.dropna(subset=['gtw_lat', 'gtw_lon'])
-data = data.dropna()
-# print(data)
-
-# specify pandas to not to keep the original index with the argument drop=True.
-data.reset_index(drop=True, inplace=True)
-
-# add column with distance
-data['distance'] = np.NaN
-
-# iterate through each row and calculate 'distance'  
-for ind in data.index: 
-    coords_1 = (data['lat'][ind], data['lon'][ind])
-    coords_2 = (data['gtw_lat'][ind], data['gtw_lon'][ind])
-    distance=geopy.distance.geodesic(coords_1, coords_2).km
-    # print(distance)
-    if distance <= minDist:
-        # distance less than limit
-        continue
-    data.at[ind, 'distance'] = int(distance)
-    
-# Drop rows with NaN in specific columns. here we are removing Missing values in columns
-data = data.dropna()
-# print(data)
-data.reset_index(drop=True, inplace=True)
-
-# distance: set all values integer 
-data['distance'] = data['distance'].apply(np.int64)
-# all coordinates with 4 decimals:
-# see: https://www.geeksforgeeks.org/python-pandas-dataframe-round/
-data = data.round({'lat':4, 'lon':4, 'gtw_lat':4, 'gtw_lon':4})
-
-# ---------------------------------------------------------------
-# remove columns: ['alt','datarate','snr','rssi']
-delete_columns = ['alt','datarate','snr','rssi']
-data.drop(columns=delete_columns, axis=1, inplace=True)
-
-# ---------------------------------------------------------------
-# reorder columns: ['nodeaddr','lat','lon','gwaddr','gtw_lat','gtw_lon','distance','time']
-# column_names = ['nodeaddr','lat','lon','gwaddr','gtw_lat','gtw_lon','distance','time']
-column_names = ['time','distance','nodeaddr','lat','lon','gwaddr','gtw_lat','gtw_lon']
-data = data.reindex(columns=column_names)
-
-## print(data)
-# ---------------------------------------------------------------
-# sort dataframe
-# sorting data frame by columns:
-# ['time','nodeaddr','gwaddr','distance']
-data.sort_values(['distance','time','nodeaddr','gwaddr'], axis=0, 
-        ascending=[False,True,True,True], inplace=True)
-data.reset_index(drop=True, inplace=True)
-print(data)
+    # full path output dir
+    if not os.path.exists(outDirCsv):
+        os.mkdir(outDirCsv, access_rights)
+    fpOutDir = get_full_path(outDirCsv)     # full path output dir
+
+    # ---------------------------------------------------------------
+    # read TTN gateways position from csv
+    # gtwttn-<freqPlan>.csv, or the rows of freqPlan in the combined file gtwttn-all.csv
+    fp_TTN_gateways_csv = gatewayPlanCsv(PathBaseDir, freqPlan)
+    if fp_TTN_gateways_csv is None:
+        print("No TTN gateways of the frequency plan {} in {}".format(freqPlan, PathBaseDir))
+        sys.exit(2)
+    cacheAge = gatewayCacheAge(PathBaseDir)
+    if cacheAge is not None and cacheAge >= CacheTTL:
+        print("Warning: TTN gateway store updated {:.1f} hours ago (refresh with allgtwttn868.py)".format(cacheAge / 3600))
+    gtwStore = loadGateways(fp_TTN_gateways_csv, freqPlan, PathBaseDir)
+    if missRadius > 0 and chunkRows > 0:
+        print("Warning: no search of the missed gateways in streaming mode")
+
+    if inpBatchDir == '':
+        # ---------------------------------------------------------------
+        # in base of inpTTNMapperLog, get file name and extension
+        # convert file path to absolute
+        fpTTNMapperLog = get_full_path(inpTTNMapperLog)
+
+        # full path output file
+        fpOutCsv = os.path.join(fpOutDir, get_file_name(inpTTNMapperLog) + '.csv')
+        convertLog(fpTTNMapperLog, fpOutCsv, gtwStore, minDist, flCaseGtwId, flValidate, chunkRows,
+                txPower=txPower, missRadius=missRadius)
+        sys.exit()
 
-# ---------------------------------------------------------------
-# save to csv these columns:
-data.to_csv(fpOutCsv, sep= csv_sep, encoding='utf-8', index=False)
-                 
+    # ---------------------------------------------------------------
+    # batch mode: convert all the logs *.txt of the directory inpBatchDir
+    # with a pool of processes
+    fpBatchDir = get_full_path(inpBatchDir)
+    fpLogs = sorted([os.path.join(fpBatchDir, f) for f in os.listdir(fpBatchDir) if f.endswith('.txt')])
+    if len(fpLogs) == 0:
+        print("No TTN Mapper log in {}".format(fpBatchDir))
+        sys.exit(2)
+    jobs = [(fpLog, os.path.join(fpOutDir, get_file_name(fpLog) + '.csv'),
+            minDist, flCaseGtwId, flValidate, chunkRows, txPower, missRadius) for fpLog in fpLogs]
+    if nProcesses <= 0:
+        nProcesses = os.cpu_count()
+    nProcesses = min(nProcesses, len(jobs))
+
+    tStart = time.time()
+    with multiprocessing.Pool(nProcesses, initializer=initBatch, initargs=(gtwStore.dirStore,)) as pool:
+        results = []
+        for result in pool.imap(convertBatchLog, jobs):
+            print("{}: rows {}, {:.2f} s {}".format(os.path.basename(result[0]), result[2], result[4], result[5]))
+            results.append(result)
+
+    # ---------------------------------------------------------------
+    # merged result: the outputs are sorted, they are merged keeping the order
+    if outMergedCsv != '':
+        fpMergedCsv = os.path.join(fpOutDir, outMergedCsv)
+        mergeRuns([r[1] for r in results if not r[5]], fpMergedCsv, skipHeader=True)
+        print("merged result: {}".format(fpMergedCsv))
+    printBatchSummary(results, time.time() - tStart)
@@ -0,0 +1,340 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Layers of the map of the events (csv of inpnear.py or rsigra-near.py):
+# the GeoJSON feature collections of devices, gateways, radiosondes,
+# links device - gateway (with the arrows of the direction), links radiosonde -
+# link center and midpoints, built column-wise from the dataframe.
+# Each layer is added to the folium map as one GeoJson object: the style is
+# the same for all the features of a layer, and the markers are created by
+# the javascript functions pointToLayer.
+# There is one marker for each device position, gateway and radiosonde, with
+# the number of its events; the device markers are clustered.
+# For the big maps, the layers of each day can be written in external files
+#   <map name>-data/<YYYY-MM-DD>.geojson
+# next to the map: the map has one layer for each day, and the file of the day
+# is loaded when its layer is shown (the map must be opened from a web server).
+# ----------------------------------------------------------------
+#
+import os
+import os.path
+import json
+
+import numpy as np
+import folium
+from branca.element import MacroElement
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from folium.template import Template
+from folium.plugins import FastMarkerCluster, MarkerCluster
+
+# ---------------------------------------------------------------
+# config
+#
+NumArrows = 3                           # arrows of the direction of a link
+DayDataExt = '.geojson'                 # files of the layers of a day
+
+# marker of the point features: circle with the radius of the feature
+CircleJs = folium.JsCode("""function(feature, latlng) {
+    return L.circleMarker(latlng, {radius: feature.properties.radius});
+}""")
+
+# marker of the arrows of the links: symbol rotated by the property arrow (degrees)
+ArrowJs = folium.JsCode("""function(feature, latlng) {
+    return L.marker(latlng, {icon: L.divIcon({className: '', iconSize: [12, 12], iconAnchor: [6, 6],
+        html: '<div style="transform: rotate(' + feature.properties.arrow + 'deg); font-size: 12px; line-height: 12px;">&#9654;</div>'})});
+}""")
+
+# marker of a device in the cluster; row = [lat, lon, popup]
+DeviceClusterJs = """function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 10, fillColor: 'red', fillOpacity: 1, stroke: false});
+    marker.bindPopup(row[2]);
+    return marker;
+}"""
+
+# popup of the feature, from the property popup
+PopupJs = folium.JsCode("""function(feature, layer) {
+    if (feature.properties.popup) {
+        layer.bindPopup(feature.properties.popup, {sticky: true});
+    }
+}""")
+
+# style of the layers
+StyleDevice = {'fillColor': 'red', 'fillOpacity': 1, 'stroke': False}
+StyleGateway = {'fillColor': 'blue', 'fillOpacity': 1, 'stroke': False}
+StyleMidpoint = {'fillColor': 'black', 'fillOpacity': 1, 'stroke': False}
+StyleLink = {'color': 'red', 'weight': 2.5, 'opacity': 1}
+StyleRsLink = {'color': 'red', 'weight': 1.5, 'opacity': 1, 'dashArray': '10'}
+
+# -------------------------------------------------------------------------
+# feature collection of the geometries (list of GeoJSON coordinates) with
+# the properties props (name -> array); the features have id = position
+def featureCollection(geomType, coords, props):
+    names = list(props)
+    cols = [np.asarray(props[name]).tolist() for name in names]
+    features = [
+        {"type": "Feature", "id": i,
+         "geometry": {"type": geomType, "coordinates": c},
+         "properties": dict(zip(names, vals))}
+        for i, (c, *vals) in enumerate(zip(coords, *cols))
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+# GeoJSON coordinates [lon, lat] of the points (arrays)
+def pointCoords(lat, lon):
+    return np.column_stack([np.asarray(lon, dtype=np.float64),
+                            np.asarray(lat, dtype=np.float64)]).tolist()
+
+# GeoJSON coordinates of the lines through the points [(lat, lon), ...],
+# with the same number of points
+def lineCoords(points):
+    xy = np.stack([np.column_stack([np.asarray(lon, dtype=np.float64),
+                                    np.asarray(lat, dtype=np.float64)]) for lat, lon in points], axis=1)
+    return xy.tolist()
+
+# compass bearing (degrees) from (lat1, lon1) to (lat2, lon2)
+def bearing(lat1, lon1, lat2, lon2):
+    dLon = np.radians(lon2 - lon1)
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    x = np.sin(dLon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dLon)
+    return np.degrees(np.arctan2(x, y)) % 360
+
+# points and rotation of nArrows arrows evenly spaced on each link
+# (the first and the last point of the link are not used)
+def arrowPoints(lat1, lon1, lat2, lon2, nArrows=NumArrows):
+    frac = np.linspace(0, 1, nArrows + 2)[1:nArrows + 1]
+    lat = lat1[:, None] + (lat2 - lat1)[:, None] * frac
+    lon = lon1[:, None] + (lon2 - lon1)[:, None] * frac
+    # the arrow symbol points to east
+    rotation = np.repeat(bearing(lat1, lon1, lat2, lon2) - 90, nArrows)
+    return (lat.ravel(), lon.ravel(), rotation)
+
+# entities (device positions, gateways, radiosondes) of the columns
+# [id, lat, lon], in order of first event, with the number of events
+def entityPoints(data, cols):
+    return data.groupby(cols, sort=False).size().reset_index(name='events')
+
+# -------------------------------------------------------------------------
+# feature collections of the events of the dataframe data
+# columns used: distance, nodeaddr, lat, lon, gwaddr, gtw_lat, gtw_lon,
+#               rs_id, rs_lat, rs_lon, rs_distance
+#
+def eventLayers(data):
+    lat, lon = data['lat'].to_numpy(np.float64), data['lon'].to_numpy(np.float64)
+    gLat, gLon = data['gtw_lat'].to_numpy(np.float64), data['gtw_lon'].to_numpy(np.float64)
+    rLat, rLon = data['rs_lat'].to_numpy(np.float64), data['rs_lon'].to_numpy(np.float64)
+    n = len(data)
+    # center of the link device - gateway, and center of the line to the radiosonde
+    mLat, mLon = (lat + gLat) / 2.0, (lon + gLon) / 2.0
+    mrLat, mrLon = (mLat + rLat) / 2.0, (mLon + rLon) / 2.0
+
+    layers = {}
+    # one marker for each entity
+    ent = entityPoints(data, ['nodeaddr', 'lat', 'lon'])
+    layers['devices'] = featureCollection('Point', pointCoords(ent['lat'], ent['lon']), {
+        'radius': np.full(len(ent), 10),
+        'popup': ["{}<br>({:.4f},{:.4f})<br>events: {}".format(*v) for v in
+                  zip(ent['nodeaddr'], ent['lat'], ent['lon'], ent['events'])],
+    })
+    ent = entityPoints(data, ['gwaddr', 'gtw_lat', 'gtw_lon'])
+    layers['gateways'] = featureCollection('Point', pointCoords(ent['gtw_lat'], ent['gtw_lon']), {
+        'radius': np.full(len(ent), 10),
+        'popup': ["{}<br>({:.4f},{:.4f})<br>events: {}".format(*v) for v in
+                  zip(ent['gwaddr'], ent['gtw_lat'], ent['gtw_lon'], ent['events'])],
+    })
+    ent = entityPoints(data, ['rs_id', 'rs_lat', 'rs_lon'])
+    layers['radiosondes'] = featureCollection('Point', pointCoords(ent['rs_lat'], ent['rs_lon']), {
+        'popup': ["Radiosonde IGRA:<br>{}<br>({:.4f},{:.4f})<br>events: {}".format(*v) for v in
+                  zip(ent['rs_id'], ent['rs_lat'], ent['rs_lon'], ent['events'])],
+    })
+
+    # links device - center - gateway, and the arrows of the direction
+    aLat, aLon, aRot = arrowPoints(lat, lon, gLat, gLon)
+    links = featureCollection('LineString', lineCoords([(lat, lon), (mLat, mLon), (gLat, gLon)]), {})
+    arrows = featureCollection('Point', pointCoords(aLat, aLon), {'arrow': np.round(aRot, 2)})
+    layers['links'] = links
+    layers['arrows'] = arrows
+    layers['radiosonde links'] = featureCollection('LineString', lineCoords([(rLat, rLon), (mLat, mLon)]), {})
+
+    dist = data['distance'].to_numpy(np.float64).astype(np.int64)
+    rsDist = data['rs_distance'].to_numpy(np.float64).astype(np.int64)
+    layers['midpoints'] = featureCollection('Point', pointCoords(np.concatenate([mLat, mrLat]), np.concatenate([mLon, mrLon])), {
+        'radius': np.concatenate([np.full(n, 4.0), np.full(n, 2.5)]),
+        'popup': ["Transmission distance:<br>{}km".format(d) for d in dist]
+               + ["radiosonde dist. to trajectory center:<br>{}km".format(d) for d in rsDist],
+    })
+    return layers
+
+# GeoJson object of the layer name; the devices are in a marker cluster
+def layerGeoJson(name, fc):
+    if name == 'devices':
+        rows = [[f['geometry']['coordinates'][1], f['geometry']['coordinates'][0], f['properties']['popup']]
+                for f in fc['features']]
+        return FastMarkerCluster(rows, callback=DeviceClusterJs, name=name)
+    if name == 'radiosondes':
+        marker = folium.Marker(icon=folium.Icon(icon='cloud', color='orange', icon_color='white'))
+        return folium.GeoJson(fc, name=name, marker=marker, on_each_feature=PopupJs)
+    if name == 'arrows':
+        return folium.GeoJson(fc, name=name, pointToLayer=ArrowJs)
+    if name in ('links', 'radiosonde links'):
+        style = StyleLink if name == 'links' else StyleRsLink
+        return folium.GeoJson(fc, name=name, style_function=lambda f, style=style: style)
+    style = {'gateways': StyleGateway, 'midpoints': StyleMidpoint}[name]
+    return folium.GeoJson(fc, name=name, style_function=lambda f, style=style: style,
+                          pointToLayer=CircleJs, on_each_feature=PopupJs)
+
+# add the layers to the map; the lines are added first, under the markers
+def addEventLayers(fMap, layers):
+    for name in ('links', 'radiosonde links', 'arrows', 'midpoints', 'gateways', 'devices', 'radiosondes'):
+        if name in layers:
+            layerGeoJson(name, layers[name]).add_to(fMap)
+    folium.LayerControl().add_to(fMap)
+
+# center of the map: mean of the centers of devices, gateways and radiosondes
+def mapCenter(data):
+    cLat = np.mean([(data[c].max() + data[c].min()) / 2.0 for c in ('lat', 'gtw_lat', 'rs_lat')])
+    cLon = np.mean([(data[c].max() + data[c].min()) / 2.0 for c in ('lon', 'gtw_lon', 'rs_lon')])
+    return [cLat, cLon]
+
+# -------------------------------------------------------------------------
+# layers of the days, loaded from the external files
+#
+# javascript: build the layers of the day data (the feature collections of
+# eventLayers) in the layer group
+DayBuilderJs = """function (group, data) {
+    var styleOf = function (style) { return function (feature) { return style; }; };
+    var circleJs = %s;
+    var arrowJs = %s;
+    var popupJs = %s;
+    if (data['links']) {
+        L.geoJson(data['links'], {style: styleOf(%s)}).addTo(group);
+    }
+    if (data['radiosonde links']) {
+        L.geoJson(data['radiosonde links'], {style: styleOf(%s)}).addTo(group);
+    }
+    if (data['arrows']) {
+        L.geoJson(data['arrows'], {pointToLayer: arrowJs}).addTo(group);
+    }
+    if (data['midpoints']) {
+        L.geoJson(data['midpoints'], {style: styleOf(%s), pointToLayer: circleJs,
+            onEachFeature: popupJs}).addTo(group);
+    }
+    if (data['gateways']) {
+        L.geoJson(data['gateways'], {style: styleOf(%s), pointToLayer: circleJs,
+            onEachFeature: popupJs}).addTo(group);
+    }
+    if (data['devices']) {
+        var cluster = L.markerClusterGroup();
+        cluster.addLayer(L.geoJson(data['devices'], {style: styleOf(%s), pointToLayer: circleJs,
+            onEachFeature: popupJs}));
+        cluster.addTo(group);
+    }
+    if (data['radiosondes']) {
+        L.geoJson(data['radiosondes'], {onEachFeature: popupJs,
+            pointToLayer: function (feature, latlng) {
+                return L.marker(latlng, {icon: L.AwesomeMarkers.icon(
+                    {icon: 'cloud', markerColor: 'orange', iconColor: 'white', prefix: 'glyphicon'})});
+            }}).addTo(group);
+    }
+}""" % (CircleJs.js_code, ArrowJs.js_code, PopupJs.js_code,
+        json.dumps(StyleLink), json.dumps(StyleRsLink), json.dumps(StyleMidpoint),
+        json.dumps(StyleGateway), json.dumps(StyleDevice))
+
+# function building the layers of the days, shared by the layers of the days
+class DayBuilder(JSCSSMixin, MacroElement):
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = {{ this.builder }};
+        {% endmacro %}
+        """)
+
+    # the devices are clustered
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+    def __init__(self):
+        super().__init__()
+        self._name = 'DayBuilder'
+        self.builder = DayBuilderJs
+
+# layer of a day: group of layers, filled from the file url when it is shown
+class DayLayer(Layer):
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = L.layerGroup();
+            {{ this.get_name() }}.loaded = false;
+            {{ this.get_name() }}.on('add', function () {
+                var group = {{ this.get_name() }};
+                if (group.loaded) {
+                    return;
+                }
+                group.loaded = true;
+                fetch({{ this.url|tojson }})
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) { {{ this.builder.get_name() }}(group, data); })
+                    .catch(function (err) {
+                        group.loaded = false;
+                        console.log('error loading ' + {{ this.url|tojson }} + ': ' + err);
+                    });
+            });
+        {% endmacro %}
+        """)
+
+    def __init__(self, url, name, builder, show=False):
+        super().__init__(name=name, overlay=True, control=True, show=show)
+        self._name = 'DayLayer'
+        self.url = url
+        self.builder = builder
+
+# event days (YYYY-MM-DD) of the column time
+def eventDays(data):
+    return data['time'].astype(str).str[:10]
+
+# write the layers of each day of the events in dirData, one file for each day;
+# the old files of the directory are removed.
+# return the list of (day, file name, number of events), sorted by day
+def writeDayData(data, dirData):
+    if not os.path.exists(dirData):
+        os.makedirs(dirData)
+    for name in os.listdir(dirData):
+        if name.endswith(DayDataExt):
+            os.remove(os.path.join(dirData, name))
+    days = []
+    for day, dayData in data.groupby(eventDays(data), sort=True):
+        fileName = day + DayDataExt
+        with open(os.path.join(dirData, fileName), 'w') as fData:
+            json.dump(eventLayers(dayData.reset_index(drop=True)), fData, separators=(',', ':'))
+        days.append((day, fileName, len(dayData)))
+    return days
+
+# add the layers of the days to the map, loaded from the files in urlData
+# (url relative to the map); the first day is shown
+def addDayLayers(fMap, days, urlData):
+    builder = DayBuilder()
+    builder.add_to(fMap)
+    for i, (day, fileName, nEvents) in enumerate(days):
+        url = urlData + '/' + fileName
+        DayLayer(url, "{} ({} events)".format(day, nEvents), builder, show=(i == 0)).add_to(fMap)
+    folium.LayerControl(collapsed=False).add_to(fMap)
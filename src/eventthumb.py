@@ -0,0 +1,140 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Static thumbnails (png) of the events (csv of inpnear.py or rsigra-near.py):
+# device, gateway and nearest radiosonde on the map tiles, drawn with staticmap.
+# The tiles are saved in a local cache, one file for each tile url:
+#   <cache dir>/<tile host>/<z>/<x>/<y>.png
+# so the areas already drawn do not download the tiles again.
+# Without network (offline), the map is drawn on the tiles of the cache and
+# the missing tiles are blank; online, the tiles that can not be downloaded
+# (timeout, error of the server) are blank too, and they are not saved.
+# ----------------------------------------------------------------
+#
+import os
+import os.path
+import re
+import io
+
+import numpy as np
+import requests
+from PIL import Image
+from staticmap import StaticMap, CircleMarker, Line
+
+# ---------------------------------------------------------------
+# config
+#
+ThumbSize = (300, 200)                  # size of the thumbnails (pixel)
+ThumbPadding = 20                       # min distance of the markers from the border (pixel)
+TileUrl = "https://a.tile.openstreetmap.org/{z}/{x}/{y}.png"
+TileSize = 256
+TileTimeout = 10                        # timeout of the tile requests (s)
+TileHeaders = {"User-Agent": "TropPo static maps"}
+BlankColor = '#e8e8e8'                  # color of the missing tiles (offline)
+
+ColorDevice = 'red'
+ColorGateway = 'blue'
+ColorRadiosonde = 'orange'
+
+# -------------------------------------------------------------------------
+# path of the tile url in the cache dirCache
+def tileCachePath(dirCache, url):
+    path = re.sub(r'^[a-z]+://', '', url).split('?')[0]
+    path = re.sub(r'[^A-Za-z0-9._/-]', '_', path)
+    return os.path.join(dirCache, *[p for p in path.split('/') if p not in ('', '.', '..')])
+
+# png of a blank tile
+def blankTile(tileSize, color):
+    buf = io.BytesIO()
+    Image.new('RGB', (tileSize, tileSize), color).save(buf, format='png')
+    return buf.getvalue()
+
+# -------------------------------------------------------------------------
+# static map with the tiles read from the cache dirCache.
+# The missing tiles are downloaded and saved in the cache; they are blank if
+# offline or if the download fails.
+#
+class CachedStaticMap(StaticMap):
+    def __init__(self, width, height, dirCache, offline=False, **kwargs):
+        kwargs.setdefault('url_template', TileUrl)
+        kwargs.setdefault('tile_size', TileSize)
+        kwargs.setdefault('tile_request_timeout', TileTimeout)
+        kwargs.setdefault('headers', TileHeaders)
+        super().__init__(width, height, **kwargs)
+        self.dirCache = dirCache
+        self.offline = offline
+        self.tiles = {'cached': 0, 'downloaded': 0, 'blank': 0}
+        self.blank = blankTile(self.tile_size, BlankColor)
+
+    # status code and content of the tile url
+    def get(self, url, **kwargs):
+        fpTile = tileCachePath(self.dirCache, url)
+        if os.path.exists(fpTile):
+            with open(fpTile, 'rb') as fTile:
+                self.tiles['cached'] += 1
+                return 200, fTile.read()
+        if self.offline:
+            self.tiles['blank'] += 1
+            return 200, self.blank
+        try:
+            res = requests.get(url, **kwargs)
+            if res.status_code != 200:
+                raise ValueError("status {}".format(res.status_code))
+            Image.open(io.BytesIO(res.content)).verify()
+        except (requests.RequestException, ValueError, OSError) as err:
+            # the thumbnail is drawn with a blank tile
+            print("request failed [{}]: {}".format(err, url))
+            self.tiles['blank'] += 1
+            return 200, self.blank
+        # the processes of the batch can save the same tile
+        os.makedirs(os.path.dirname(fpTile), exist_ok=True)
+        fpTmp = "{}.{}.tmp".format(fpTile, os.getpid())
+        with open(fpTmp, 'wb') as fTile:
+            fTile.write(res.content)
+        os.replace(fpTmp, fpTile)
+        self.tiles['downloaded'] += 1
+        return 200, res.content
+
+# -------------------------------------------------------------------------
+# thumbnail of an event, saved in fpPng
+# event: dict with lat, lon, gtw_lat, gtw_lon, rs_lat, rs_lon (the radiosonde can be nan)
+# return the count of the tiles (cached, downloaded, blank)
+#
+def eventThumbnail(event, fpPng, dirCache, offline=False, size=ThumbSize, urlTemplate=TileUrl):
+    thumb = CachedStaticMap(size[0], size[1], dirCache, offline,
+                            padding_x=ThumbPadding, padding_y=ThumbPadding, url_template=urlTemplate)
+    dev = (float(event['lon']), float(event['lat']))
+    gtw = (float(event['gtw_lon']), float(event['gtw_lat']))
+    thumb.add_line(Line([dev, gtw], ColorDevice, 2))
+    if np.isfinite(event['rs_lat']) and np.isfinite(event['rs_lon']):
+        rs = (float(event['rs_lon']), float(event['rs_lat']))
+        center = ((dev[0] + gtw[0]) / 2.0, (dev[1] + gtw[1]) / 2.0)
+        thumb.add_line(Line([rs, center], ColorRadiosonde, 1))
+        thumb.add_marker(CircleMarker(rs, 'white', 10))
+        thumb.add_marker(CircleMarker(rs, ColorRadiosonde, 7))
+    thumb.add_marker(CircleMarker(gtw, 'white', 10))
+    thumb.add_marker(CircleMarker(gtw, ColorGateway, 7))
+    thumb.add_marker(CircleMarker(dev, 'white', 10))
+    thumb.add_marker(CircleMarker(dev, ColorDevice, 7))
+    image = thumb.render()
+    image.save(fpPng)
+    return thumb.tiles
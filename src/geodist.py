@@ -0,0 +1,115 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Geodesic distance on the WGS-84 ellipsoid, computed on numpy arrays.
+# geodesicKm() solves the inverse problem with the Vincenty iteration for all the
+# rows at the same time. The difference from geopy.distance.geodesic (Karney)
+# is less than GeodistTol (0.5 mm for the Vincenty formulas).
+# The rows where the iteration does not converge (points nearly antipodal)
+# are computed with geopy.
+# ----------------------------------------------------------------
+#
+import numpy as np
+import geopy.distance
+
+# ---------------------------------------------------------------
+# config
+#
+WGS84_a = 6378.137                      # semi-major axis (km)
+WGS84_f = 1 / 298.257223563             # flattening
+WGS84_b = (1 - WGS84_f) * WGS84_a       # semi-minor axis (km)
+GeodistTol = 1e-6                       # max difference from geopy geodesic (km)
+MaxIter = 200                           # max iterations of Vincenty
+IterEps = 1e-12                         # end of the iteration: change of lambda (rad)
+
+# -------------------------------------------------------------------------
+# exact distance (km) with geopy, one row at a time
+def geodesicKmExact(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+            *[np.asarray(x, dtype=np.float64) for x in (lat1, lon1, lat2, lon2)])
+    dist = np.empty(lat1.shape)
+    for i in np.ndindex(lat1.shape):
+        dist[i] = geopy.distance.geodesic((lat1[i], lon1[i]), (lat2[i], lon2[i])).km
+    return dist
+
+# -------------------------------------------------------------------------
+# geodesic distance (km) between the points (lat1, lon1) and (lat2, lon2) (degrees)
+# the arguments are arrays with the same shape (or scalars)
+#
+def geodesicKm(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+            *[np.asarray(x, dtype=np.float64) for x in (lat1, lon1, lat2, lon2)])
+    shape = lat1.shape
+    lat1, lon1, lat2, lon2 = [x.ravel() for x in (lat1, lon1, lat2, lon2)]
+
+    a, b, f = WGS84_a, WGS84_b, WGS84_f
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+    L = np.radians(lon2 - lon1)
+
+    lam = L.copy()
+    sinSigma = np.zeros_like(L)
+    cosSigma = np.ones_like(L)
+    sigma = np.zeros_like(L)
+    cosSqAlpha = np.ones_like(L)
+    cos2SigmaM = np.zeros_like(L)
+    active = np.ones(L.shape, dtype=bool)   # rows not yet converged
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for it in range(MaxIter):
+            if not active.any():
+                break
+            r = np.nonzero(active)[0]
+            sinLam, cosLam = np.sin(lam[r]), np.cos(lam[r])
+            sS = np.hypot(cosU2[r] * sinLam, cosU1[r] * sinU2[r] - sinU1[r] * cosU2[r] * cosLam)
+            cS = sinU1[r] * sinU2[r] + cosU1[r] * cosU2[r] * cosLam
+            sg = np.arctan2(sS, cS)
+            sinAlpha = np.where(sS == 0, 0.0, cosU1[r] * cosU2[r] * sinLam / sS)
+            cSqA = 1 - sinAlpha ** 2
+            # equatorial line: cos2SigmaM = 0
+            c2SM = np.where(cSqA == 0, 0.0, cS - 2 * sinU1[r] * sinU2[r] / cSqA)
+            C = f / 16 * cSqA * (4 + f * (4 - 3 * cSqA))
+            lamPrev = lam[r]
+            lamNew = L[r] + (1 - C) * f * sinAlpha * (
+                    sg + C * sS * (c2SM + C * cS * (-1 + 2 * c2SM ** 2)))
+            lam[r] = lamNew
+            sinSigma[r], cosSigma[r], sigma[r] = sS, cS, sg
+            cosSqAlpha[r], cos2SigmaM[r] = cSqA, c2SM
+            # coincident points (sS == 0) are converged
+            done = (np.abs(lamNew - lamPrev) <= IterEps) | (sS == 0)
+            active[r[done]] = False
+
+        uSq = cosSqAlpha * (a * a - b * b) / (b * b)
+        A = 1 + uSq / 16384 * (4096 + uSq * (-768 + uSq * (320 - 175 * uSq)))
+        B = uSq / 1024 * (256 + uSq * (-128 + uSq * (74 - 47 * uSq)))
+        deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (
+                cosSigma * (-1 + 2 * cos2SigmaM ** 2)
+                - B / 6 * cos2SigmaM * (-3 + 4 * sinSigma ** 2) * (-3 + 4 * cos2SigmaM ** 2)))
+        dist = b * A * (sigma - deltaSigma)
+
+    # not converged (nearly antipodal points): exact distance with geopy
+    bad = active | ~np.isfinite(dist)
+    bad &= np.isfinite(lat1) & np.isfinite(lon1) & np.isfinite(lat2) & np.isfinite(lon2)
+    if bad.any():
+        dist[bad] = geodesicKmExact(lat1[bad], lon1[bad], lat2[bad], lon2[bad])
+    return dist.reshape(shape)
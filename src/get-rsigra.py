@@ -34,77 +34,14 @@ import os.path
 import getopt, errno, sys
 import datetime
 
-import ftplib
-
 from zipfile import ZipFile
 
+from transport import openTransport, getIgraStationList, getIgraDrvd
+
 # -------------------------------------------------------------------------
 # log igra derived
 # -------------------------------------------------------------------------
 
-# return to ftp start directory
-def ftpIgraRootDir(ftp):
-    ftp_position = ftp.pwd()
-    if ftp_position == '/':
-        # sei gia' nella radice 
-        return
-    # count n. '/' in ftp_position
-    count = ftp_position.count('/')
-    path = ""
-    for i in range(count):
-        path += '../'
-    ftp.cwd(path)
-
-# return to ftp igra base dir
-def ftpIgraBaseDir(ftp):
-    ftpIgraRootDir(ftp)
-    ftp.cwd('pub/data/igra')              # change into "pub/data/igra" directory
-
-# return to ftp igra dir with derived data 
-def ftpIgraDerivedDir(ftp):
-    ftpIgraRootDir(ftp)
-    ftp.cwd('pub/data/igra/derived/derived-por/')              
-
-# get igra station list
-def getIgraStationList(ftp, dirIgraLog):
-    # goto ftp igra base dir
-    ftpIgraBaseDir(ftp)
-    
-    # get radiosonde list
-    FileName = "igra2-station-list.txt"
-
-    fpFileName = os.path.join(dirIgraLog, FileName)
-    fileOut = open(fpFileName,'wb')
-    op_completed = False
-    try:
-        print("... download: {} ...".format(FileName))
-        ftp.retrbinary("RETR " + FileName ,fileOut.write)
-        fileOut.close()
-        op_completed = True
-    except:
-        print("Error ftp download file [{}]".format(FileName))
-        fileOut.close()
-        os.unlink(fpFileName)
-    return(op_completed)
-    
-# get archive with Igra log
-def getIgraDrvd(ftp, dirIgraLog, stationID):
-    FileName = stationID + "-drvd.txt.zip"
-
-    fpFileName = os.path.join(dirIgraLog, FileName)
-    fileOut = open(fpFileName,'wb')
-    op_completed = False
-    try:
-        print("... download: {} ...".format(FileName))
-        ftp.retrbinary("RETR " + FileName ,fileOut.write)
-        fileOut.close()
-        op_completed = True
-    except:
-        print("Error ftp download file [{}]".format(FileName))
-        fileOut.close()
-        os.unlink(fpFileName)
-    return(op_completed)
-
 def igraDrvdExtract(dirIgraLog, stationID):
     # estrai dall'archivio zip il log igra
     # file name igra log archive
@@ -241,15 +178,17 @@ def str2bool(v):
     return v.lower() in ("yes", "true", "t", "1")
 
 def printHlpOptions():
-    print('{} -i <code ID radiosonda> -o <directory output>'.format(sys.argv[0]))
+    print('{} -i <code ID radiosonda> -o <directory output> [-s <igra source>]'.format(sys.argv[0]))
 
 def printHlpFull():
-    print('{} -i <code ID radiosonda> -o <directory output>'.format(sys.argv[0]))
+    print('{} -i <code ID radiosonda> -o <directory output> [-s <igra source>]'.format(sys.argv[0]))
     print('Download the igra derived data from:')
     print('ftp://ftp.ncdc.noaa.gov/pub/data/igra/derived/')
     print('Example:')
     print('{} -i GMM00010393 -o ./radio'.format(sys.argv[0]))
     print('Download GMM00010393-drvd.txt.zip in ./radio'.format(sys.argv[0]))
+    print('-s selects the igra source (default: ftp):')
+    print('   ftp, https, url of a mirror (http://, https://, ftp://, file://) or local directory')
 
 # -------------------------------------------------------------------------
 # Get command-line arguments
@@ -257,12 +196,13 @@ def printHlpFull():
 # initialize variables
 codeRadioSonda = ''
 outDirRadioSonda = ''
+igraSource = 'ftp'
 
 try:
     opts, args = getopt.getopt(
             sys.argv[1:],
-            'i:o:',
-            ["inp=","out="])
+            'i:o:s:',
+            ["inp=","out=","source="])
 except getopt.GetoptError:
     printHlpFull()              # print full help
     sys.exit(2)
@@ -280,6 +220,8 @@ for opt, arg in opts:
         outDirRadioSonda = arg
         # print('Output directory csv result: {}'.format(outDirRadioSonda))
         nArg = nArg + 1
+    elif opt in ("-s", "--source"):
+        igraSource = arg
         
 if nArg < 2:
     printHlpOptions()
@@ -303,32 +245,16 @@ print("search string: [{}] ...".format(codeRadioSonda))
 
 nFiles = 0
 
-# connect via ftp to igra
-try:
-    ftp = ftplib.FTP("ftp.ncdc.noaa.gov")
-    ftp.login()
-except:
-    print("Error to connect Igra via ftp")
-    sys.exit(2)
-
-# goto ftp igra base dir
-ftpIgraBaseDir(ftp)
+# connect to igra
+trp = openTransport(igraSource)
+print("igra source: {}".format(trp.name()))
 
 # get radiosonde list
-if getIgraStationList(ftp, outDirRadioSonda) == False:
+if getIgraStationList(trp, outDirRadioSonda) == False:
     print("Error download file list: {}".format(LstFile))
+    trp.close()
     sys.exit(2)
 
-print(ftp.pwd())
-ftpIgraRootDir(ftp)
-print(ftp.pwd())
-
-# ftp.cwd('pub/data/igra/derived/derived-por/')              
-# return to ftp igra dir with derived data 
-ftpIgraDerivedDir(ftp)
-print(ftp.pwd())
-print("ftp://ftp.ncdc.noaa.gov/pub/data/igra/derived/derived-por")
-
 with open(fpLstFile,'r') as fileRadioSonde:
     rs_list = list(fileRadioSonde)
     for lineStr in rs_list:
@@ -337,10 +263,10 @@ with open(fpLstFile,'r') as fileRadioSonde:
         if (str_sonda.find(codeRadioSonda) != -1):
             print("Found radiosonda: [{}]".format(str_id_sonda))
             # get file
-            if getIgraDrvd(ftp, outDirRadioSonda, str_id_sonda):
+            if getIgraDrvd(trp, outDirRadioSonda, str_id_sonda):
                 nFiles+=1
 
-print(ftp.pwd())
+trp.close()
 
 print("Number of files downloaded: {}".format(nFiles))
 
@@ -50,6 +50,10 @@ import plotly
 import plotly.graph_objs as go
 import plotly.express as px
 
+from rsigraplot import plotlyJsOption, writeReport, parsePanels, DefaultPanels, \
+        profileTraces, panelFigure, combinedFigure, profileFrame
+from launchidx import launchesInInterval
+
 import ftplib
 
 from zipfile import ZipFile
@@ -263,10 +267,15 @@ def str2bool(v):
     return v.lower() in ("yes", "true", "t", "1")
 
 def printHlpOptions():
-    print('{} -i <zip Igra2 derived log file> -t <string time>'.format(sys.argv[0]))
+    print('{} -i <zip Igra2 derived log file> -t <string time> [-j <plotly.js mode>] [-g <panels>] [-c]'.format(sys.argv[0]))
 
 def printHlpFull():
-    print('{} -i <zip Igra2 derived log file> -t <string time>'.format(sys.argv[0]))
+    print('{} -i <zip Igra2 derived log file> -t <string time> [-j <plotly.js mode>] [-g <panels>] [-c]'.format(sys.argv[0]))
+    print('-j: plotly.js in the html reports: inline (default), directory, cdn or <path>.js')
+    print('    directory: one plotly.min.js in the output directory, shared by all the reports')
+    print('-g: panels of the reports, separated by comma, or none (default: {})'.format(','.join(DefaultPanels)))
+    print('    reNH: N - height, reMH: M - height, slNH: dN/dH - height, slMH: dM/dH - height')
+    print('-c: one report (rsig-...html) with all the panels')
     print('Download the Igra2 derived data from:')
     print('ftp://ftp.ncdc.noaa.gov/pub/data/igra/derived/')
     print('Example:')
@@ -283,13 +292,16 @@ inpZipIgraLog = ''
 outDir = ''
 strSearchTime = ""
 dateSearch = []                 # [year, month, day, hour]
+plotlyJs = True                 # plotly.js inline in each report
+panels = DefaultPanels          # panels of the reports
+flCombined = False              # True: one report with all the panels
 
 
 try:
     opts, args = getopt.getopt(
             sys.argv[1:],
-            'i:t:',
-            ["inp=","time="])
+            'i:t:j:g:c',
+            ["inp=","time=","plotlyjs=","panels=","combined"])
 except getopt.GetoptError:
     printHlpFull()              # print full help
     sys.exit(2)
@@ -305,6 +317,20 @@ for opt, arg in opts:
     elif opt in ("-t", "--time"):
         strSearchTime = arg.strip('"')
         nArg = nArg + 1
+    elif opt in ("-j", "--plotlyjs"):
+        plotlyJs = plotlyJsOption(arg)
+        if plotlyJs is None:
+            print('Error: plotly.js mode [{}] not valid'.format(arg))
+            printHlpOptions()
+            sys.exit(2)
+    elif opt in ("-g", "--panels"):
+        panels = parsePanels(arg)
+        if panels is None:
+            print('Error: panels [{}] not valid'.format(arg))
+            printHlpOptions()
+            sys.exit(2)
+    elif opt in ("-c", "--combined"):
+        flCombined = True
 
        
 if nArg < 2:
@@ -381,8 +407,9 @@ min_val = idxLog.loc[(search_tmEpoch >= idxLog.tm_epoch), 'tm_epoch'].max()
 
 delta_sec = search_tmEpoch - min_val
 
-# get row with column tm_epoch has min_val. Pass a list
-risIdx = idxLog[idxLog['tm_epoch'].isin([min_val])]
+# get row with column tm_epoch has min_val
+# (the same selection of the static images, graph-rsigra-static.py -d 0)
+risIdx = idxLog[launchesInInterval(idxLog['tm_epoch'].values, search_tmEpoch, search_tmEpoch)]
 
 print(risIdx)
 print("... end search in log")
@@ -426,16 +453,13 @@ print(fpOutCsv)
 inputstation = stationID.upper()        # esempio: TSM00060760
 
 # html report file from station
-HtmlRep_N_Height = "reNH-{}-{}.html".format(inputstation, strDateSearch)
-HtmlRep_M_Height = "reMH-{}-{}.html".format(inputstation, strDateSearch)
-HtmlRep_N_slope  = "slNH-{}-{}.html".format(inputstation, strDateSearch)
-HtmlRep_M_slope  = "slMH-{}-{}.html".format(inputstation, strDateSearch)
-
-# full path file name html report
-fpHtmlRep_N_Height = os.path.join(dirZipIgraLog, HtmlRep_N_Height)
-fpHtmlRep_M_Height = os.path.join(dirZipIgraLog, HtmlRep_M_Height)
-fpHtmlRep_N_slope  = os.path.join(dirZipIgraLog, HtmlRep_N_slope)
-fpHtmlRep_M_slope  = os.path.join(dirZipIgraLog, HtmlRep_M_slope)
+fpHtmlRep = {}
+for panel in panels:
+    HtmlRep = "{}-{}-{}.html".format(panel, inputstation, strDateSearch)
+    # full path file name html report
+    fpHtmlRep[panel] = os.path.join(dirZipIgraLog, HtmlRep)
+HtmlRep_All = "rsig-{}-{}.html".format(inputstation, strDateSearch)
+fpHtmlRep_All = os.path.join(dirZipIgraLog, HtmlRep_All)
 
 keySearch = "#" + inputstation                              # search string
 idxKey = 0
@@ -511,45 +535,9 @@ rsLog.close()
 
 # --------------------------------------------------------------------------------------
 
-# create dataframe 
-dtAcq02 = pd.DataFrame.from_records(items, columns=['HGHT', 'N'])
-# dataframe columns:
-# HGHT  : altezza (m) (used: CALCGPH calculated geopotential height (m))
-# N     : the refractive index (unitless)
-
-# --------------------------------------------------------------------------------------
-# calculate dtAcq02['M'] = dtAcq02['N'] + 0.157 * dtAcq02['HGHT']
-dtAcq02['M'] = dtAcq02.N + 0.157 * dtAcq02.HGHT
-
-# --------------------------------------------------------------------------------------
-# calculate difference of 'N' and 'HGHT' columns
-# mod 14/05: added calc difference of 'M'
-#
-# https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.DataFrame.diff.html
-# Calculates the difference of a DataFrame element compared with another element in the DataFrame 
-# (default is the element in the same column of the previous row).
-dtAcq02['deltaN'] = dtAcq02['N'].diff()
-dtAcq02['deltaM'] = dtAcq02['M'].diff()
-
-dtAcq02['deltaH'] = dtAcq02['HGHT'].diff()
-
-# calc dtAcq02['deltaH']/dtAcq02['deltaN']
-# https://stackoverflow.com/questions/38886512/how-to-deal-with-divide-by-zero-with-pandas-dataframes-when-manipulating-colum
-dtAcq02['slopeN_H'] = dtAcq02['deltaN'].div(dtAcq02['deltaH'])
-# calc dtAcq02['deltaH']/dtAcq02['deltaM']
-dtAcq02['slopeM_H'] = dtAcq02['deltaM'].div(dtAcq02['deltaH'])
-
-# https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.DataFrame.loc.html
-# Access a group of rows and columns by label(s) or a boolean array.
-dtAcq02.loc[~np.isfinite(dtAcq02['slopeN_H']), 'slopeN_H'] = np.nan
-dtAcq02.loc[~np.isfinite(dtAcq02['slopeM_H']), 'slopeM_H'] = np.nan
-
-# note: slopeN_H and slopeM_H must be divided by 1000. For this parameter the height is in km
-dtAcq02['slopeN_H'] = dtAcq02.slopeN_H * 1000
-dtAcq02['slopeM_H'] = dtAcq02.slopeM_H * 1000
-
-# Drop the rows even with single NaN or single missing values.
-dtAcq02 = dtAcq02.dropna()
+# create dataframe with the profile of the launch
+# HGHT, N, M, deltaN, deltaM, deltaH, slopeN_H, slopeM_H (see rsigraplot.py)
+dtAcq02 = profileFrame(items)
 
 print(dtAcq02)
 dtAcq02.to_csv(fpOutCsv, header=True, index=True, sep=csv_sep) 
@@ -568,248 +556,17 @@ fig = go.Figure()
 # name_graph = "Station: " + inputstation + "      Date: " + str(inputyear) + "/" + str(inputmonth) + "/" + str(inputday) + " " + str(inputhour) + ":00"
 name_graph = "Station: " + inputstation + "<br>Date: " + strDateHuman
 
-# default font parameters
-def_font=dict(
-    family='Arial, monospace',
-    size=16,
-    color="#000000"                 # black
-)
-
-def_tickfont = dict(
-        size = 16,
-        color = "#000000"               # black
-),        
-
-EnableGraph = False
-
-if EnableGraph:
-    # --------------------------------------------------
-    # -------------- create graph HEIGHT / N
-    trace2 = go.Scatter(
-        x=dtAcq02['N'], y=dtAcq02['HGHT'],
-        line=dict(width=3,color='green'),
-        name='date: ' + strDateHuman
-    )
-    GraphTraces = [trace2]
-    GraphLayout = go.Layout(
-        title=go.layout.Title(
-            text='<b>' + name_graph + '</b>',       # bold
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            ),
-            xref='paper',
-            x=0
-        ),
-        xaxis=go.layout.XAxis(                           
-            tickfont = dict(
-                    size = 16,
-                    color = "#000000"               # black
-            ),        
-            title=go.layout.xaxis.Title(
-                text='N',
-                font=dict(
-                    family='Arial, monospace',
-                    size=16,
-                    color="#000000"                 # black
-                )
-            )
-        ),
-        yaxis=go.layout.YAxis(
-            range=[0, height_limit],
-            tickfont = dict(
-                    size = 16,
-                    color = "#000000"               # black
-            ),        
-            title=go.layout.yaxis.Title(
-                text='Height (m)',
-                font=dict(
-                    family='Arial, monospace',
-                    size=16,
-                    color="#000000"                 # black
-                )
-            )
-        )
-    )
-    fig = go.Figure(data=GraphTraces, layout=GraphLayout)
-    fig.write_html(fpHtmlRep_N_Height, auto_open=False)
-
-    # -------------- create graph HEIGHT / M
-    trace2 = go.Scatter(
-        x=dtAcq02['M'], y=dtAcq02['HGHT'],
-        line=dict(width=3,color='green'),
-        name='date: ' + strDateHuman
-    )
-    GraphTraces = [trace2]
-
-    GraphLayout = go.Layout(
-        title=go.layout.Title(
-            text='<b>' + name_graph + '</b>',       # bold
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            ),
-            xref='paper',
-            x=0
-        ),
-        xaxis=go.layout.XAxis(
-            tickfont = dict(
-                    size = 16,
-                    color = "#000000"               # black
-            ),        
-            title=go.layout.xaxis.Title(
-                text='M',
-                font=dict(
-                    family='Arial, monospace',
-                    size=16,
-                    color="#000000"                 # black
-                )
-            )
-        ),
-        yaxis=go.layout.YAxis(
-            range=[0, height_limit],
-            tickfont = dict(
-                    size = 16,
-                    color = "#000000"               # black
-            ),        
-            title=go.layout.yaxis.Title(
-                text='Height (m)',
-                font=dict(
-                    family='Arial, monospace',
-                    size=16,
-                    color="#000000"                 # black
-                )
-            )
-        )
-    )
-    fig = go.Figure(data=GraphTraces, layout=GraphLayout)
-    fig.write_html(fpHtmlRep_M_Height, auto_open=False)
-    # --------------------------------------------------[ end grafici da non generare]
-
-# -------------- create graph slope N - H
-
-# dtAcq02['HGHT'] in km
-dtAcq02.HGHT = dtAcq02['HGHT'] / 1000
-
-trace2 = go.Scatter(
-    x=dtAcq02['HGHT'], y=dtAcq02['slopeN_H'],
-    line=dict(width=3,color='green'),
-    name='<b>date: ' + strDateHuman
-)
-GraphTraces = [trace2]
-
-GraphLayout = go.Layout(
-    title=go.layout.Title(
-        text='<b>' + name_graph + '</b>',       # bold
-        font=dict(
-            family='Arial, monospace',
-            size=16,
-            color="#000000"                 # black
-        ),
-        xref='paper',
-        x=0
-    ),
-    xaxis=go.layout.XAxis(
-        range=[0, 4],
-        tickfont = dict(
-                size = 16,
-                color = "#000000"               # black
-        ),        
-        title=go.layout.xaxis.Title(
-            text='<b>Height (km)</b>',
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            )
-        )
-    ),
-    yaxis=go.layout.YAxis(
-        tickfont = dict(
-                size = 16,
-                color = "#000000"               # black
-        ),        
-        title=go.layout.yaxis.Title(
-            text='<b>&#916;N/&#916;H, km<sup>-1</sup></b>',
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            )
-        )
-    )
-)
-
-fig = go.Figure(data=GraphTraces, layout=GraphLayout)
-
-fig.update_layout(plot_bgcolor='rgb(255,255,255)')
-fig.update_xaxes(showgrid=True,gridwidth=1, gridcolor='LightPink',showline=True, linewidth=1, linecolor='black', mirror=True)
-fig.update_yaxes(showgrid=True,gridwidth=1, gridcolor='LightPink',showline=True, linewidth=1, linecolor='black', mirror=True)
-fig.update_layout()
-
-fig.write_html(fpHtmlRep_N_slope, auto_open=False)
-
-# -------------- create graph slope M - H
-
-trace2 = go.Scatter(
-    x=dtAcq02['HGHT'], y=dtAcq02['slopeM_H'],
-    line=dict(width=3,color='green'),
-    name='<b>date: ' + strDateHuman
-)
-GraphTraces = [trace2]
-
-GraphLayout = go.Layout(
-    title=go.layout.Title(
-        text='<b>' + name_graph + '</b>',       # bold
-        font=dict(
-            family='Arial, monospace',
-            size=16,
-            color="#000000"                 # black
-        ),
-        xref='paper',
-        x=0
-    ),
-    xaxis=go.layout.XAxis(
-        range=[0, 4],
-        tickfont = dict(
-                size = 16,
-                color = "#000000"               # black
-        ),        
-        title=go.layout.xaxis.Title(
-            text='<b>Height (km)</b>',
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            )
-        )
-    ),
-    yaxis=go.layout.YAxis(
-        tickfont = dict(
-                size = 16,
-                color = "#000000"               # black
-        ),        
-        title=go.layout.yaxis.Title(
-            text='<b>&#916;M/&#916;H, km<sup>-1</sup></b>',
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            )
-        )
-    )
-)
-
-fig = go.Figure(data=GraphTraces, layout=GraphLayout)
-
-fig.update_layout(plot_bgcolor='rgb(255,255,255)')
-fig.update_xaxes(showgrid=True,gridwidth=1, gridcolor='LightPink',showline=True, linewidth=1, linecolor='black', mirror=True)
-fig.update_yaxes(showgrid=True,gridwidth=1, gridcolor='LightPink',showline=True, linewidth=1, linecolor='black', mirror=True)
-fig.update_layout()
-
-fig.write_html(fpHtmlRep_M_slope, auto_open=False)
+# traces of the launch
+grTraces = profileTraces(dtAcq02, 'date: ' + strDateHuman, panels, color='green')
+
+if flCombined and len(panels) > 0:
+    # one report with all the panels
+    fig = combinedFigure(panels, {panel: [grTraces[panel]] for panel in panels}, name_graph, height_limit)
+    writeReport(fig, fpHtmlRep_All, plotlyJs)
+else:
+    for panel in panels:
+        fig = panelFigure(panel, [grTraces[panel]], name_graph, height_limit)
+        writeReport(fig, fpHtmlRep[panel], plotlyJs)
 
 
 
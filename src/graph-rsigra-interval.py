@@ -51,6 +51,12 @@ import plotly
 import plotly.graph_objs as go
 import plotly.express as px
 
+from rsigraplot import plotlyJsOption, writeReport, parsePanels, DefaultPanels, \
+        profileTraces, panelFigure, combinedFigure, HeatmapVars, HeatmapStep, heightGrid, \
+        resampleProfile, heatmapFigure, profileFrame, KeysExt, outputKey, readOutputKeys, \
+        writeOutputKeys, isCurrent
+from launchidx import launchesInInterval
+
 import ftplib
 
 from zipfile import ZipFile
@@ -267,10 +273,23 @@ def str2bool(v):
     return v.lower() in ("yes", "true", "t", "1")
 
 def printHlpOptions():
-    print('{} -i <zip Igra2 derived log file> -t <string time> -d <n. days>'.format(sys.argv[0]))
+    print('{} -i <zip Igra2 derived log file> -t <string time> -d <n. days> [-j <plotly.js mode>] [-g <panels>] [-c] [-w] [-n <max points>] [-e <variable>] [-z <height step>] [-r]'.format(sys.argv[0]))
 
 def printHlpFull():
-    print('{} -i <zip Igra2 derived log file> -t <string time> -d <n. days>'.format(sys.argv[0]))
+    print('{} -i <zip Igra2 derived log file> -t <string time> -d <n. days> [-j <plotly.js mode>] [-g <panels>] [-c] [-w] [-n <max points>] [-e <variable>] [-z <height step>] [-r]'.format(sys.argv[0]))
+    print('-j: plotly.js in the html reports: inline (default), directory, cdn or <path>.js')
+    print('    directory: one plotly.min.js in the output directory, shared by all the reports')
+    print('-g: panels of the reports, separated by comma, or none (default: {})'.format(','.join(DefaultPanels)))
+    print('    reNH: N - height, reMH: M - height, slNH: dN/dH - height, slMH: dM/dH - height')
+    print('-c: one report (rsig-...html) with all the panels')
+    print('-w: WebGL traces, for long intervals')
+    print('-n: max points of the trace of each launch (default 0: all points)')
+    print('    the points are reduced keeping the shape of the profile')
+    print('-e: time x height heatmap report (hm...html) of the variable: N, M, dN (dN/dH), dM (dM/dH)')
+    print('-z: step (m) of the height grid of the heatmap (default {})'.format(HeatmapStep))
+    print('    use -g none to write only the heatmap')
+    print('-r: rewrite all the outputs. Without -r, the csv of the launches and the reports')
+    print('    already written with the same data and options are not rewritten')
     print('Download the Igra2 derived data from:')
     print('ftp://ftp.ncdc.noaa.gov/pub/data/igra/derived/')
     print('Example:')
@@ -287,13 +306,21 @@ inpZipIgraLog = ''
 outDir = ''
 strSearchTime = ""
 dateSearch = []                 # [year, month, day, hour]
+plotlyJs = True                 # plotly.js inline in each report
+panels = DefaultPanels          # panels of the reports
+flCombined = False              # True: one report with all the panels
+flWebGL = False                 # True: WebGL traces
+maxPoints = 0                   # max points of a trace (0: all)
+hmVar = ''                      # variable of the heatmap ('': no heatmap)
+hmStep = HeatmapStep            # step (m) of the height grid of the heatmap
+flRebuild = False               # True: rewrite all the outputs
 days = 0
 
 try:
     opts, args = getopt.getopt(
             sys.argv[1:],
-            'i:t:d:',
-            ["inp=","time=","days="])
+            'i:t:d:j:g:cwn:e:z:r',
+            ["inp=","time=","days=","plotlyjs=","panels=","combined","webgl","points=","heatmap=","step=","rebuild"])
 except getopt.GetoptError:
     printHlpFull()              # print full help
     sys.exit(2)
@@ -313,6 +340,34 @@ for opt, arg in opts:
         days = int(arg)
         # print('n. days: {}'.format(days))
         nArg = nArg + 1
+    elif opt in ("-j", "--plotlyjs"):
+        plotlyJs = plotlyJsOption(arg)
+        if plotlyJs is None:
+            print('Error: plotly.js mode [{}] not valid'.format(arg))
+            printHlpOptions()
+            sys.exit(2)
+    elif opt in ("-g", "--panels"):
+        panels = parsePanels(arg)
+        if panels is None:
+            print('Error: panels [{}] not valid'.format(arg))
+            printHlpOptions()
+            sys.exit(2)
+    elif opt in ("-c", "--combined"):
+        flCombined = True
+    elif opt in ("-w", "--webgl"):
+        flWebGL = True
+    elif opt in ("-n", "--points"):
+        maxPoints = int(arg)
+    elif opt in ("-e", "--heatmap"):
+        hmVar = arg.strip()
+        if hmVar not in HeatmapVars:
+            print('Error: heatmap variable [{}] not valid'.format(arg))
+            printHlpOptions()
+            sys.exit(2)
+    elif opt in ("-z", "--step"):
+        hmStep = int(arg)
+    elif opt in ("-r", "--rebuild"):
+        flRebuild = True
 
 if nArg < 3:
     printHlpFull()              # print full help
@@ -355,13 +410,24 @@ print("fpIdxIgraLog[{}]".format(fpIdxIgraLog))
 
 outDir = dirZipIgraLog
 
-with ZipFile(fpZipIgraLog, 'r') as zipObj:
-   # Extract all the contents of zip file in outDir
-   zipObj.extractall(outDir)
+# keys of the outputs already written
+fpOutKeys = os.path.join(dirZipIgraLog, stationID + KeysExt)
+outKeys = readOutputKeys(fpOutKeys)
+
+# the log and the index are updated only if the archive is changed
+fpIgraLog = os.path.join(dirZipIgraLog, stationID + "-drvd.txt")
+if (not flRebuild and os.path.exists(fpIdxIgraLog) and os.path.exists(fpIgraLog)
+        and os.path.getmtime(fpIgraLog) >= os.path.getmtime(fpZipIgraLog)
+        and os.path.getmtime(fpIdxIgraLog) >= os.path.getmtime(fpIgraLog)):
+    print("log and index up to date")
+else:
+    with ZipFile(fpZipIgraLog, 'r') as zipObj:
+       # Extract all the contents of zip file in outDir
+       zipObj.extractall(outDir)
 
-# -------------------------------------------------------------------------
-print("create index ...")
-igraDrvdCreateIndex(dirZipIgraLog, stationID)
+    # -------------------------------------------------------------------------
+    print("create index ...")
+    igraDrvdCreateIndex(dirZipIgraLog, stationID)
 
 # get index file
 print("... read file indice")
@@ -404,13 +470,12 @@ endSrc_tmEpoch = search_tmEpoch + 86400 * days
 #
 
 min_val = idxLog.loc[(search_tmEpoch >= idxLog.tm_epoch), 'tm_epoch'].max()
-#
-max_val = idxLog.loc[(endSrc_tmEpoch >= idxLog.tm_epoch), 'tm_epoch'].max()
 
 delta_sec = search_tmEpoch - min_val
 
-# get all rows from min_val and max_val
-risIdx = idxLog[(idxLog['tm_epoch']>=min_val ) & (idxLog['tm_epoch']<=max_val)]
+# get all rows from min_val to the last launch before the end time
+# (the same selection of the static images, graph-rsigra-static.py)
+risIdx = idxLog[launchesInInterval(idxLog['tm_epoch'].values, search_tmEpoch, endSrc_tmEpoch)]
 
 print(risIdx)
 print("... end search in log")
@@ -451,16 +516,15 @@ inputstation = stationID.upper()        # esempio: TSM00060760
 
 # html report file from station
 str_days = str(days).zfill(3)
-HtmlRep_N_Height = "reNH-{}-{}-{}days.html".format(inputstation, strDateSearch, str_days)
-HtmlRep_M_Height = "reMH-{}-{}-{}days.html".format(inputstation, strDateSearch, str_days)
-HtmlRep_N_slope  = "slNH-{}-{}-{}days.html".format(inputstation, strDateSearch, str_days)
-HtmlRep_M_slope  = "slMH-{}-{}-{}days.html".format(inputstation, strDateSearch, str_days)
-
-# full path file name html report
-fpHtmlRep_N_Height = os.path.join(dirZipIgraLog, HtmlRep_N_Height)
-fpHtmlRep_M_Height = os.path.join(dirZipIgraLog, HtmlRep_M_Height)
-fpHtmlRep_N_slope  = os.path.join(dirZipIgraLog, HtmlRep_N_slope)
-fpHtmlRep_M_slope  = os.path.join(dirZipIgraLog, HtmlRep_M_slope)
+fpHtmlRep = {}
+for panel in panels:
+    HtmlRep = "{}-{}-{}-{}days.html".format(panel, inputstation, strDateSearch, str_days)
+    # full path file name html report
+    fpHtmlRep[panel] = os.path.join(dirZipIgraLog, HtmlRep)
+HtmlRep_All = "rsig-{}-{}-{}days.html".format(inputstation, strDateSearch, str_days)
+fpHtmlRep_All = os.path.join(dirZipIgraLog, HtmlRep_All)
+HtmlRep_Heatmap = "hm{}-{}-{}-{}days.html".format(hmVar, inputstation, strDateSearch, str_days)
+fpHtmlRep_Heatmap = os.path.join(dirZipIgraLog, HtmlRep_Heatmap)
 
 keySearch = "#" + inputstation                              # search string
 idxKey = 0
@@ -510,11 +574,35 @@ print(keySearch)
 
 height_limit = 4000             # max height for analysis
 
-# list of graph traces
-grTrace_N_HGHT = []             # traces x:'N', y:'HGHT'
-grTrace_M_HGHT = []             # traces x:'M', y:'HGHT'
-grTrace_HGHT_SLOPE_N_H = []     # traces x:'HGHT', y:'slopeN_H'
-grTrace_HGHT_SLOPE_M_H = []     # traces x:'HGHT', y:'slopeM_H'
+# list of graph traces of each panel
+grTraces = {panel: [] for panel in panels}
+
+# heatmap: launch times and profiles on the height grid
+hmGrid = heightGrid(height_limit, hmStep)
+hmTimes = []
+hmProfiles = []
+
+# save the traces of the profile of a launch in the lists
+def addTraces(dtAcq, date_launch):
+    for panel, trace in profileTraces(dtAcq, date_launch, panels,
+                                      gl=flWebGL, maxPoints=maxPoints).items():
+        grTraces[panel].append(trace)
+    if hmVar != '':
+        hmTimes.append(date_launch)
+        hmProfiles.append(resampleProfile(dtAcq['HGHT'], dtAcq[HeatmapVars[hmVar][0]], hmGrid))
+
+# reports to write and their key: the launches and the options of the graphs
+fpReports = []
+if hmVar != '':
+    fpReports.append(fpHtmlRep_Heatmap)
+if flCombined and len(panels) > 0:
+    fpReports.append(fpHtmlRep_All)
+elif not flCombined:
+    fpReports += [fpHtmlRep[panel] for panel in panels]
+repKey = outputKey(stationID, ','.join([str(t) for t in risIdx['tm_epoch']]), height_limit,
+                   ','.join(panels), flCombined, flWebGL, maxPoints, hmVar, hmStep, plotlyJs)
+reportsCurrent = not flRebuild and all([isCurrent(outKeys, fp, repKey) for fp in fpReports])
+nCsvSkipped = 0
 
 # ---------------------------------------------------------------
 
@@ -532,6 +620,18 @@ for rowPos in range(nRows_risIdx):
     fpOutCsv = os.path.join(dirZipIgraLog, fNameOutCsv)
     print(fpOutCsv)
 
+    # csv already written for the launch
+    csvKey = outputKey(stationID, risIdx.at[rowPos, 'tm_epoch'], height_limit)
+    if not flRebuild and isCurrent(outKeys, fpOutCsv, csvKey):
+        nCsvSkipped += 1
+        if reportsCurrent:
+            continue
+        # the profile for the reports is read from the csv
+        dtAcq02 = pd.read_csv(fpOutCsv, sep=csv_sep, index_col=0, float_precision='round_trip')
+        addTraces(dtAcq02, date_launch)
+        del [[dtAcq02]]
+        continue
+
     with open(fpIgraLog,'r') as rsLog:
         rsLog.seek(pos_data, os.SEEK_SET)  # go to the beginning of the file displacement pos_data.
         while True:
@@ -556,87 +656,18 @@ for rowPos in range(nRows_risIdx):
 
     # --------------------------------------------------------------------------------------
 
-    # create dataframe 
-    dtAcq02 = pd.DataFrame.from_records(items, columns=['HGHT', 'N'])
-    # dataframe columns:
-    # HGHT  : altezza (m) (used: CALCGPH calculated geopotential height (m))
-    # N     : the refractive index (unitless)
-
-    # --------------------------------------------------------------------------------------
-    # calculate dtAcq02['M'] = dtAcq02['N'] + 0.157 * dtAcq02['HGHT']
-    dtAcq02['M'] = dtAcq02.N + 0.157 * dtAcq02.HGHT
-
-    # --------------------------------------------------------------------------------------
-    # calculate difference of 'N' and 'HGHT' columns
-
-    # Calculates the difference of a DataFrame element compared with another element in the DataFrame 
-    # (default is the element in the same column of the previous row).
-    dtAcq02['deltaN'] = dtAcq02['N'].diff()
-    dtAcq02['deltaM'] = dtAcq02['M'].diff()
-
-    dtAcq02['deltaH'] = dtAcq02['HGHT'].diff()
-
-    # calc dtAcq02['deltaH']/dtAcq02['deltaN']
-    dtAcq02['slopeN_H'] = dtAcq02['deltaN'].div(dtAcq02['deltaH'])
-    # calc dtAcq02['deltaH']/dtAcq02['deltaM']
-    dtAcq02['slopeM_H'] = dtAcq02['deltaM'].div(dtAcq02['deltaH'])
-
-    # Access a group of rows and columns by label(s) or a boolean array.
-    dtAcq02.loc[~np.isfinite(dtAcq02['slopeN_H']), 'slopeN_H'] = np.nan
-    dtAcq02.loc[~np.isfinite(dtAcq02['slopeM_H']), 'slopeM_H'] = np.nan
-
-    # note: slopeN_H must be divided by 1000. For this parameter the height is in km
-    dtAcq02['slopeN_H'] = dtAcq02.slopeN_H * 1000
-    dtAcq02['slopeM_H'] = dtAcq02.slopeM_H * 1000
-
-    # Drop the rows even with single NaN or single missing values.
-    dtAcq02 = dtAcq02.dropna()
+    # create dataframe with the profile of the launch
+    # HGHT, N, M, deltaN, deltaM, deltaH, slopeN_H, slopeM_H (see rsigraplot.py)
+    dtAcq02 = profileFrame(items)
 
     print(dtAcq02)
     dtAcq02.to_csv(fpOutCsv, header=True, index=True, sep=csv_sep)
+    outKeys[fNameOutCsv] = csvKey
 
     # ---------------------------------------------------------
     # save traces in lists
+    addTraces(dtAcq02, date_launch)
 
-    # traces x:'N', y:'HGHT'
-    grTrace_N_HGHT.append(
-        go.Scatter(
-            x=dtAcq02['N'], y=dtAcq02['HGHT'],
-            # line=dict(width=3,color='green'),
-            line=dict(width=3),
-            name=date_launch
-        )
-    )
-    # traces x:'M', y:'HGHT'
-    grTrace_M_HGHT.append(
-        go.Scatter(
-            x=dtAcq02['M'], y=dtAcq02['HGHT'],
-            # line=dict(width=3,color='green'),
-            line=dict(width=3),
-            name=date_launch
-        )
-    )
-    # dtAcq02['HGHT'] in km
-    dtAcq02.HGHT = dtAcq02['HGHT'] / 1000
-    # traces x:'HGHT', y:'slopeN_H'
-    grTrace_HGHT_SLOPE_N_H.append(     
-        go.Scatter(
-            x=dtAcq02['HGHT'], y=dtAcq02['slopeN_H'],
-            # line=dict(width=3,color='green'),
-            line=dict(width=3),                
-            name=date_launch
-        )
-    )
-    # traces x:'HGHT', y:'slopeM_H'
-    grTrace_HGHT_SLOPE_M_H.append(     
-        go.Scatter(
-            x=dtAcq02['HGHT'], y=dtAcq02['slopeM_H'],
-            # line=dict(width=3,color='green'),
-            line=dict(width=3),                
-            name=date_launch
-        )
-    )
-    
     # ---------------------------------------------------------
     # free memory
     # delete dataframes
@@ -666,218 +697,26 @@ fig = go.Figure()
 # name_graph = "Station: " + inputstation + "      Date: " + str(inputyear) + "/" + str(inputmonth) + "/" + str(inputday) + " " + str(inputhour) + ":00"
 name_graph = "Station: " + inputstation + "<br>Start date: " + strDateHuman
 
-# default font parameters
-def_font=dict(
-    family='Arial, monospace',
-    size=16,
-    color="#000000"                 # black
-)
-
-def_tickfont = dict(
-        size = 16,
-        color = "#000000"               # black
-),        
-
-# mod 19/05
-EnableGraph = False
-
-if EnableGraph:
-    # --------------------------------------------------[ grafici da non generare]
-
-    # -------------- create graph HEIGHT / N
-    GraphLayout = go.Layout(
-        title=go.layout.Title(
-            text='<b>' + name_graph + '</b>',       # bold
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            ),
-            xref='paper',
-            x=0
-        ),
-        xaxis=go.layout.XAxis(                           
-            tickfont = dict(
-                    size = 16,
-                    color = "#000000"               # black
-            ),        
-            title=go.layout.xaxis.Title(
-                text='N',
-                font=dict(
-                    family='Arial, monospace',
-                    size=16,
-                    color="#000000"                 # black
-                )
-            )
-        ),
-        yaxis=go.layout.YAxis(
-            range=[0, height_limit],
-            tickfont = dict(
-                    size = 16,
-                    color = "#000000"               # black
-            ),        
-            title=go.layout.yaxis.Title(
-                text='Height (m)',
-                font=dict(
-                    family='Arial, monospace',
-                    size=16,
-                    color="#000000"                 # black
-                )
-            )
-        )
-    )
-    fig = go.Figure(data=grTrace_N_HGHT, layout=GraphLayout)
-    fig.write_html(fpHtmlRep_N_Height, auto_open=False)
-
-    # -------------- create graph HEIGHT / M
-    GraphLayout = go.Layout(
-        title=go.layout.Title(
-            text='<b>' + name_graph + '</b>',       # bold
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            ),
-            xref='paper',
-            x=0
-        ),
-        xaxis=go.layout.XAxis(
-            tickfont = dict(
-                    size = 16,
-                    color = "#000000"               # black
-            ),        
-            title=go.layout.xaxis.Title(
-                text='M',
-                font=dict(
-                    family='Arial, monospace',
-                    size=16,
-                    color="#000000"                 # black
-                )
-            )
-        ),
-        yaxis=go.layout.YAxis(
-            range=[0, height_limit],
-            tickfont = dict(
-                    size = 16,
-                    color = "#000000"               # black
-            ),        
-            title=go.layout.yaxis.Title(
-                text='Height (m)',
-                font=dict(
-                    family='Arial, monospace',
-                    size=16,
-                    color="#000000"                 # black
-                )
-            )
-        )
-    )
-    fig = go.Figure(data=grTrace_M_HGHT, layout=GraphLayout)
-    fig.write_html(fpHtmlRep_M_Height, auto_open=False)
-    # --------------------------------------------------[ end grafici da non generare]
-
-# -------------- create graph slope N - H
-GraphLayout = go.Layout(
-    title=go.layout.Title(
-        text='<b>' + name_graph + '</b>',       # bold
-        font=dict(
-            family='Arial, monospace',
-            size=16,
-            color="#000000"                 # black
-        ),
-        xref='paper',
-        x=0
-    ),
-    xaxis=go.layout.XAxis(
-        range=[0, 4],
-        tickfont = dict(
-                size = 16,
-                color = "#000000"               # black
-        ),        
-        title=go.layout.xaxis.Title(
-            text='<b>Height (km)</b>',
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            )
-        )
-    ),
-    yaxis=go.layout.YAxis(
-        tickfont = dict(
-                size = 16,
-                color = "#000000"               # black
-        ),        
-        title=go.layout.yaxis.Title(
-            text='<b>&#916;N/&#916;H, km<sup>-1</sup></b>',
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            )
-        )
-    )
-)
-
-fig = go.Figure(data=grTrace_HGHT_SLOPE_N_H, layout=GraphLayout)
-
-fig.update_layout(plot_bgcolor='rgb(255,255,255)')
-fig.update_xaxes(showgrid=True,gridwidth=1, gridcolor='LightPink',showline=True, linewidth=1, linecolor='black', mirror=True)
-fig.update_yaxes(showgrid=True,gridwidth=1, gridcolor='LightPink',showline=True, linewidth=1, linecolor='black', mirror=True)
-fig.update_layout()
-
-fig.write_html(fpHtmlRep_N_slope, auto_open=False)
-
-# -------------- create graph slope M - H
-GraphLayout = go.Layout(
-    title=go.layout.Title(
-        text='<b>' + name_graph + '</b>',       # bold
-        font=dict(
-            family='Arial, monospace',
-            size=16,
-            color="#000000"                 # black
-        ),
-        xref='paper',
-        x=0
-    ),
-    xaxis=go.layout.XAxis(
-        range=[0, 4],
-        tickfont = dict(
-                size = 16,
-                color = "#000000"               # black
-        ),        
-        title=go.layout.xaxis.Title(
-            text='<b>Height (km)</b>',
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            )
-        )
-    ),
-    yaxis=go.layout.YAxis(
-        tickfont = dict(
-                size = 16,
-                color = "#000000"               # black
-        ),        
-        title=go.layout.yaxis.Title(
-            text='<b>&#916;M/&#916;H, km<sup>-1</sup></b>',
-            font=dict(
-                family='Arial, monospace',
-                size=16,
-                color="#000000"                 # black
-            )
-        )
-    )
-)
-
-fig = go.Figure(data=grTrace_HGHT_SLOPE_M_H, layout=GraphLayout)
-
-fig.update_layout(plot_bgcolor='rgb(255,255,255)')
-fig.update_xaxes(showgrid=True,gridwidth=1, gridcolor='LightPink',showline=True, linewidth=1, linecolor='black', mirror=True)
-fig.update_yaxes(showgrid=True,gridwidth=1, gridcolor='LightPink',showline=True, linewidth=1, linecolor='black', mirror=True)
-fig.update_layout()
-
-fig.write_html(fpHtmlRep_M_slope, auto_open=False)
+print("launches: {}, csv up to date: {}".format(nRows_risIdx, nCsvSkipped))
+if reportsCurrent:
+    print("reports up to date")
+else:
+    if hmVar != '' and len(hmProfiles) > 0:
+        # time x height heatmap, one trace for all the launches
+        fig = heatmapFigure(hmVar, hmTimes, np.column_stack(hmProfiles), hmGrid, name_graph)
+        writeReport(fig, fpHtmlRep_Heatmap, plotlyJs)
+
+    if flCombined and len(panels) > 0:
+        # one report with all the panels
+        fig = combinedFigure(panels, grTraces, name_graph, height_limit)
+        writeReport(fig, fpHtmlRep_All, plotlyJs)
+    else:
+        for panel in panels:
+            fig = panelFigure(panel, grTraces[panel], name_graph, height_limit)
+            writeReport(fig, fpHtmlRep[panel], plotlyJs)
+    for fp in fpReports:
+        outKeys[os.path.basename(fp)] = repKey
+writeOutputKeys(fpOutKeys, outKeys)
 
 
 
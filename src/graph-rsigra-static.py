@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# ===================================================================================
+# Project:    TropPo 
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:   
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Receives:
+# 1. log archive path of radiosonde, time in format year month day hour min, n. days
+#    or a file with a list of these jobs (station-days)
+# The program generates the static images (png or svg) of the profile plots
+# N, M and slope as a function of the height H reached by the balloon,
+# for all the launches of each job, with a pool of processes.
+#
+# import required modules 
+import os
+import os.path
+import getopt, sys
+import time
+from calendar import timegm
+import multiprocessing
+
+from rsigraplot import Panels, parsePanels
+from rsigrastatic import ImageFormats, readProfiles, renderProfiles
+
+# ---------------------------------------------------------------
+# config
+#
+csv_sep = ';'                   # char separator for csv
+height_limit = 4000             # max height for analysis
+
+# -------------------------------------------------------------------------
+# return the full path of the file name
+def get_full_path(file_folder_name):
+    return (os.path.abspath(file_folder_name))
+
+# return the directory name of full path
+def get_dir_name(full_path):
+    dirname = os.path.dirname(full_path)    # os independent
+    return dirname
+
+# return the file name without path
+def get_file_name(full_path):
+    basename = os.path.basename(full_path)  # os independent
+    base = basename.split('.')[0]
+    return base
+
+# epoch time of the string time "YYYY MM DD hh mm"
+def strTimeEpoch(strTime):
+    return timegm(time.strptime(strTime.strip('"'), "%Y %m %d %H %M"))
+
+# -------------------------------------------------------------------------
+# job of a station-days:
+# (fpZip, stationID, tStart, tEnd, title, fpBase)
+# fpBase: path of the images, with {} for the name of the panel
+#
+def makeJob(inpZip, strTime, days, outDir):
+    fpZip = get_full_path(inpZip)
+    stationID = get_file_name(fpZip)[0:11].upper()
+    tStart = strTimeEpoch(strTime)
+    tEnd = tStart + 86400 * days
+    strDate = time.strftime("%Y%m%d%H%M", time.gmtime(tStart))
+    strDateHuman = time.strftime("%Y/%m/%d %H:%M", time.gmtime(tStart))
+    title = "Station: " + stationID + "<br>Start date: " + strDateHuman
+    dirOut = outDir if outDir != '' else get_dir_name(fpZip)
+    fpBase = os.path.join(dirOut, "{}-" + "{}-{}-{}days".format(stationID, strDate, str(days).zfill(3)))
+    return (fpZip, stationID, tStart, tEnd, title, fpBase)
+
+# jobs of the file fpJobs: one job for each line <zip>;<time>;<n. days>
+def readJobs(fpJobs, outDir):
+    jobs = []
+    with open(fpJobs, 'r') as fJobs:
+        for line in fJobs:
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            fields = line.split(csv_sep)
+            days = int(fields[2]) if len(fields) > 2 else 1
+            jobs.append(makeJob(fields[0], fields[1], days, outDir))
+    return jobs
+
+# -------------------------------------------------------------------------
+# processes of the batch
+#
+def initBatch(panels, fmt):
+    global batchPanels, batchFmt
+    batchPanels = panels
+    batchFmt = fmt
+
+# read the profiles of all the jobs of a station; group = (fpZip, stationID, jobs)
+# return a list of (job, profiles, error)
+def readStationJobs(group):
+    fpZip, stationID, jobs = group
+    try:
+        profiles = readProfiles(fpZip, stationID, [(job[2], job[3]) for job in jobs], height_limit)
+    except Exception as err:
+        return [(job, [], str(err)) for job in jobs]
+    return [(job, profiles[i], '') for i, job in enumerate(jobs)]
+
+# images of a job; return (job, n. launches, n. figures, seconds, error)
+def renderJob(jobProfiles):
+    job, profiles, err = jobProfiles
+    if err:
+        return (job, 0, 0, 0.0, err)
+    if len(profiles) == 0:
+        return (job, 0, 0, 0.0, 'no launch in the interval')
+    tStart = time.time()
+    try:
+        files = renderProfiles(profiles, batchPanels, job[4], height_limit, job[5], batchFmt)
+    except Exception as err:
+        return (job, len(profiles), 0, time.time() - tStart, str(err))
+    return (job, len(profiles), len(files), time.time() - tStart, '')
+
+# print the summary of the batch
+def printBatchSummary(results, tTotal):
+    print('{:<40} {:>9} {:>8} {:>9}'.format('job', 'launches', 'figures', 'seconds'))
+    for job, nLaunches, nFigures, tJob, err in results:
+        name = os.path.basename(job[5].format('')).lstrip('-')
+        if err:
+            print('{:<40} error: {}'.format(name, err))
+            continue
+        print('{:<40} {:>9} {:>8} {:>9.2f}'.format(name, nLaunches, nFigures, tJob))
+    nFigures = sum([r[2] for r in results])
+    nErrors = len([r for r in results if r[4]])
+    print('jobs: {}, errors: {}, figures: {}, time: {:.2f} s, {:.1f} figures/s'.format(
+            len(results), nErrors, nFigures, tTotal, nFigures / tTotal if tTotal > 0 else 0.0))
+
+def printHlpOptions():
+    print('{} -i <zip Igra2 derived log file> -t <string time> [-d <n. days>] [-o <out dir>] [-f <png|svg>] [-g <panels>] [-p <n. processes>]'.format(sys.argv[0]))
+    print('{} -b <jobs file> [-o <out dir>] [-f <png|svg>] [-g <panels>] [-p <n. processes>]'.format(sys.argv[0]))
+
+def printHlpFull():
+    printHlpOptions()
+    print('-d: n. days from the time (default 1): the launches from the last launch at or before')
+    print('    the time, as graph-rsigra-interval.py; 0: only the launch at or before the time,')
+    print('    as graph-rsigra-day.py')
+    print('-o: directory of the images (default: directory of the zip)')
+    print('-f: format of the images, png (default) or svg')
+    print('-g: panels, separated by comma (default: {})'.format(','.join(Panels)))
+    print('    reNH: N - height, reMH: M - height, slNH: dN/dH - height, slMH: dM/dH - height')
+    print('-p: n. processes (default: n. of cpu)')
+    print('-b: file with a job for each line: <zip>;<string time>;<n. days>')
+    print('Example:')
+    print('{} -i radio/GMM00010393-drvd.txt.zip -t \"2020 02 16 00 00\" -d 7 -f svg'.format(sys.argv[0]))
+    print('Read the launches of radio/GMM00010393-drvd.txt.zip from \"2020-02-16 00:00\" for 7 days')
+    print('and save the images slNH-GMM00010393-202002160000-007days.svg, ...')
+    print('{} -b jobs.txt -o ./images -p 4'.format(sys.argv[0]))
+    print('jobs.txt:')
+    print('radio/GMM00010393-drvd.txt.zip;2020 02 16 00 00;1')
+    print('radio/GMM00010393-drvd.txt.zip;2020 02 17 00 00;1')
+
+
+# -------------------------------------------------------------------------
+# Get command-line arguments
+if __name__ == '__main__':
+    # initialize variables
+    inpZipIgraLog = ''
+    strSearchTime = ''
+    days = 1
+    inpJobs = ''
+    outDir = ''
+    fmt = ImageFormats[0]
+    panels = list(Panels)
+    nProcesses = 0
+
+    try:
+        opts, args = getopt.getopt(
+                sys.argv[1:],
+                'i:t:d:b:o:f:g:p:',
+                ["inp=","time=","days=","batch=","out=","format=","panels=","processes="])
+    except getopt.GetoptError:
+        printHlpFull()              # print full help
+        sys.exit(2)
+
+    nArg = 0
+    for opt, arg in opts:
+        if opt == '-h':
+            printHlpFull()              # print full help
+            sys.exit()
+        elif opt in ("-i", "--inp"):
+            inpZipIgraLog = arg
+            nArg = nArg + 1
+        elif opt in ("-t", "--time"):
+            strSearchTime = arg.strip('"')
+            nArg = nArg + 1
+        elif opt in ("-d", "--days"):
+            days = int(arg)
+        elif opt in ("-b", "--batch"):
+            inpJobs = arg
+            nArg = nArg + 2
+        elif opt in ("-o", "--out"):
+            outDir = arg
+        elif opt in ("-f", "--format"):
+            fmt = arg.strip().lower()
+            if fmt not in ImageFormats:
+                print('Error: image format [{}] not valid'.format(arg))
+                printHlpOptions()
+                sys.exit(2)
+        elif opt in ("-g", "--panels"):
+            panels = parsePanels(arg)
+            if not panels:
+                print('Error: panels [{}] not valid'.format(arg))
+                printHlpOptions()
+                sys.exit(2)
+        elif opt in ("-p", "--processes"):
+            nProcesses = int(arg)
+
+    if nArg < 2:
+        printHlpFull()              # print full help
+        sys.exit()
+
+    if outDir != '':
+        outDir = get_full_path(outDir)
+        os.makedirs(outDir, exist_ok=True)
+    if inpJobs != '':
+        jobs = readJobs(inpJobs, outDir)
+    else:
+        jobs = [makeJob(inpZipIgraLog, strSearchTime, days, outDir)]
+    if len(jobs) == 0:
+        print("No job in {}".format(inpJobs))
+        sys.exit(2)
+
+    # the jobs of a station are read with one pass on its archive
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job[0], job[1]), []).append(job)
+    groups = [(fpZip, stationID, stJobs) for (fpZip, stationID), stJobs in groups.items()]
+
+    if nProcesses <= 0:
+        nProcesses = os.cpu_count()
+    nProcesses = min(nProcesses, len(jobs))
+
+    # ---------------------------------------------------------------
+    # read the archives and draw the images in the same pool:
+    # the images of a station are drawn while the next archives are read
+    tStart = time.time()
+    with multiprocessing.Pool(nProcesses, initializer=initBatch, initargs=(panels, fmt)) as pool:
+        pending = []
+        for jobsProfiles in pool.imap_unordered(readStationJobs, groups):
+            for jobProfiles in jobsProfiles:
+                pending.append(pool.apply_async(renderJob, (jobProfiles,)))
+        results = []
+        for res in pending:
+            result = res.get()
+            print("{}: launches {}, figures {}, {:.2f} s {}".format(
+                    os.path.basename(result[0][5].format('')).lstrip('-'), result[1], result[2], result[3], result[4]))
+            results.append(result)
+    printBatchSummary(results, time.time() - tStart)
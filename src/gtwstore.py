@@ -0,0 +1,203 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Binary store of the TTN gateways of a frequency plan, compiled from the csv
+# gtwttn-<plan>.csv (see ttngateways.py) in typed numpy arrays, with:
+# - the id indexes: the ids (without spaces, and in lower case) sorted,
+#   searched with a binary search;
+# - the spatial index of the gateways (see spatialidx.py).
+# The store is saved in a directory, one for each version of the csv:
+#   gtwttn-bin-<plan>-<key>/<array>.npy
+# The key is computed from the size and modification time of the csv, so the
+# next runs load the arrays memory-mapped, without reading the csv.
+# ----------------------------------------------------------------
+#
+import os
+import os.path
+import io
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from spatialidx import BallTree, buildBallTree, latlonToXyz, kmToChord, SphereRelErr
+from geodist import geodesicKm
+
+# ---------------------------------------------------------------
+# config
+#
+GtwStoreVersion = 2                     # change if the format of the store changes
+GtwBinPrefix = "gtwttn-bin-"
+csv_sep = ';'                           # char separator for csv
+
+# arrays of the store
+colGtwStore = ['gtw_id', 'gtw_id_lower', 'lat', 'lon', 'alt',
+               'keys_sorted', 'keys_order', 'lkeys_sorted', 'lkeys_order']
+
+# -------------------------------------------------------------------------
+# content of the csv of the gateways (path or file object)
+def readCsvBytes(srcCsv):
+    if isinstance(srcCsv, (str, os.PathLike)):
+        with open(srcCsv, 'rb') as fCsv:
+            return fCsv.read()
+    data = srcCsv.read()
+    srcCsv.seek(0)
+    return data.encode('utf-8') if isinstance(data, str) else data
+
+# key of the store: version of the csv and format.
+# The version of a csv file is its size and modification time; the version of
+# a file object (rows of gtwttn-all.csv, already in memory) is its content.
+def gtwStoreKey(srcCsv):
+    if isinstance(srcCsv, (str, os.PathLike)):
+        st = os.stat(srcCsv)
+        sha = hashlib.sha1("{};{}".format(st.st_size, st.st_mtime_ns).encode())
+    else:
+        sha = hashlib.sha1(readCsvBytes(srcCsv))
+    sha.update(";{}".format(GtwStoreVersion).encode())
+    return sha.hexdigest()[:16]
+
+# key of the gateway ids: without spaces, in lower case if not flCase
+def gtwIdKey(ids, flCase):
+    ids = np.char.strip(np.asarray(ids, dtype=str), ' ')
+    return ids if flCase else np.char.lower(ids)
+
+# -------------------------------------------------------------------------
+# compiled store of the gateways
+#
+class GatewayStore:
+    def __init__(self, dirStore):
+        self.dirStore = dirStore
+        arrays = {}
+        for name in colGtwStore:
+            arrays[name] = np.load(os.path.join(dirStore, name + '.npy'), mmap_mode='r')
+        self.ids = arrays['gtw_id']
+        self.idsLower = arrays['gtw_id_lower']
+        self.lat = arrays['lat']
+        self.lon = arrays['lon']
+        self.alt = arrays['alt']
+        # id indexes, with and without letter case
+        self.keys = {True: (arrays['keys_sorted'], arrays['keys_order']),
+                     False: (arrays['lkeys_sorted'], arrays['lkeys_order'])}
+        xyz = np.load(os.path.join(dirStore, 'xyz.npy'), mmap_mode='r')
+        tree = {}
+        for name in ('idx', 'centre', 'radius', 'start', 'end', 'left', 'right'):
+            tree[name] = np.load(os.path.join(dirStore, 'tree-' + name + '.npy'), mmap_mode='r')
+        self.tree = BallTree(xyz, tree)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # indexes of the gateways with the ids gtwIds (-1 if not present);
+    # the ids are compared without spaces, and without letter case if not flCase.
+    # For the ids repeated in the csv, the first gateway.
+    def byIds(self, gtwIds, flCase=True):
+        keysSorted, keysOrder = self.keys[flCase]
+        keys = gtwIdKey(gtwIds, flCase)
+        if len(keysSorted) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(keysSorted, keys, side='left'), len(keysSorted) - 1)
+        return np.where(keysSorted[pos] == keys, keysOrder[pos], -1).astype(np.int64)
+
+    # index of the gateway gtwId (-1 if not present)
+    def byId(self, gtwId, flCase=True):
+        return int(self.byIds([gtwId], flCase)[0])
+
+    # index of the first gateway with the id containing sub (-1 if not present)
+    def containing(self, sub, flCase=True):
+        if flCase:
+            found = np.nonzero(np.char.find(self.ids, sub) >= 0)[0]
+        else:
+            found = np.nonzero(np.char.find(self.idsLower, sub.lower()) >= 0)[0]
+        return int(found[0]) if len(found) > 0 else -1
+
+    # gateways at distance <= rKm from the point (lat, lon)
+    # return the indexes of the gateways and the geodesic distances (km), sorted by distance
+    def within(self, lat, lon, rKm):
+        # the great circle distance can be larger than the geodesic distance
+        chord = kmToChord(rKm / (1.0 - SphereRelErr))
+        q = latlonToXyz([lat], [lon])[0]
+        cDist, ind = self.tree.queryRadius(q, chord)
+        if len(ind) == 0:
+            return (ind, np.empty(0))
+        geo = geodesicKm(lat, lon, self.lat[ind], self.lon[ind])
+        sel = geo <= rKm
+        ind, geo = ind[sel], geo[sel]
+        order = np.argsort(geo, kind='stable')
+        return (ind[order], geo[order])
+
+    # gateways at distance <= rKm from the point (lat, lon) not in the ids heard:
+    # the gateways that could have received the device
+    def missed(self, lat, lon, rKm, heard):
+        ind, geo = self.within(lat, lon, rKm)
+        sel = np.array([str(self.ids[i]) not in heard for i in ind], dtype=bool)
+        return (ind[sel], geo[sel])
+
+# compile the store of the csv in dirStore
+def compileGatewayStore(csvBytes, dirStore):
+    gtw = pd.read_csv(io.BytesIO(csvBytes), sep=csv_sep, dtype={'gtw_id': str})
+    gtw['lat'] = pd.to_numeric(gtw['lat'], errors='coerce')
+    gtw['lon'] = pd.to_numeric(gtw['lon'], errors='coerce')
+    gtw['alt'] = pd.to_numeric(gtw['alt'], errors='coerce')
+    # the gateways without coordinates can not be used
+    gtw = gtw.dropna(subset=['gtw_id', 'lat', 'lon']).reset_index(drop=True)
+
+    # save in a temporary directory, then rename it
+    dirTmp = dirStore + '.tmp'
+    if os.path.exists(dirTmp):
+        shutil.rmtree(dirTmp)
+    os.makedirs(dirTmp)
+    ids = gtw['gtw_id'].to_numpy().astype(str)
+    np.save(os.path.join(dirTmp, 'gtw_id.npy'), ids)
+    np.save(os.path.join(dirTmp, 'gtw_id_lower.npy'), np.char.lower(ids))
+    np.save(os.path.join(dirTmp, 'lat.npy'), gtw['lat'].to_numpy(np.float64))
+    np.save(os.path.join(dirTmp, 'lon.npy'), gtw['lon'].to_numpy(np.float64))
+    np.save(os.path.join(dirTmp, 'alt.npy'), gtw['alt'].to_numpy(np.float32))
+    # stable sort: the first of the repeated ids is found first
+    for prefix, flCase in (('keys', True), ('lkeys', False)):
+        keys = gtwIdKey(ids, flCase)
+        order = np.argsort(keys, kind='stable')
+        np.save(os.path.join(dirTmp, prefix + '_sorted.npy'), keys[order])
+        np.save(os.path.join(dirTmp, prefix + '_order.npy'), order.astype(np.int64))
+    xyz = latlonToXyz(gtw['lat'].values, gtw['lon'].values)
+    np.save(os.path.join(dirTmp, 'xyz.npy'), xyz)
+    for name, arr in buildBallTree(xyz).items():
+        np.save(os.path.join(dirTmp, 'tree-' + name + '.npy'), arr)
+    os.replace(dirTmp, dirStore)
+
+# -------------------------------------------------------------------------
+# load the store of the gateways of the frequency plan freqPlan, from the csv
+# srcCsv (path or file object). The store is saved in dirBase; it is compiled
+# if it does not exist for this version of the csv, and the stores of the old
+# versions of the plan are removed.
+#
+def loadGatewayStore(srcCsv, dirBase, freqPlan):
+    prefix = GtwBinPrefix + freqPlan + '-'
+    dirStore = os.path.join(dirBase, prefix + gtwStoreKey(srcCsv))
+    if not os.path.isdir(dirStore):
+        print("compile gateway store: {} ...".format(os.path.basename(dirStore)))
+        compileGatewayStore(readCsvBytes(srcCsv), dirStore)
+        for name in os.listdir(dirBase):
+            fpName = os.path.join(dirBase, name)
+            if name.startswith(prefix) and fpName != dirStore and os.path.isdir(fpName):
+                shutil.rmtree(fpName, ignore_errors=True)
+    return GatewayStore(dirStore)
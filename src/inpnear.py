@@ -40,7 +40,9 @@ import csv, json, sys
 import geopy.distance
 from array import *
 
-import ftplib
+from transport import openTransport, getIgraStationList
+from spatialidx import nearestStations
+from stationcat import loadStationCatalog
 
 # ---------------------------
 # constant limits
@@ -223,13 +225,16 @@ def str2bool(v):
     return v.lower() in ("yes", "true", "t", "1")
 
 def printHlpOptions():
-    print('{} -o <path output csv>>'.format(sys.argv[0]))
+    print('{} -o <path output csv>> [-s <igra source>] [-x]'.format(sys.argv[0]))
 
 def printHlpFull():
-    print('{} -o <path output csv>>'.format(sys.argv[0]))
+    print('{} -o <path output csv>> [-s <igra source>] [-x]'.format(sys.argv[0]))
     print('Example:')
     print('{} -o ./data/result.csv'.format(sys.argv[0]))
     print('Store result data in ./data/result.csv file')
+    print('-s selects the igra source (default: ftp):')
+    print('   ftp, https, url of a mirror (http://, https://, ftp://, file://) or local directory')
+    print('-x: save the debug csv igra2station.csv and igra2-2020.csv in the current directory')
 
 # -----------------------------------------------------------------------------------
 # main
@@ -239,12 +244,14 @@ def printHlpFull():
 # initialize variables
 inpEventsLog = ''
 outDirCsv = ''
+igraSource = 'ftp'
+flExportCsv = False
 
 try:
     opts, args = getopt.getopt(
             sys.argv[1:],
-            'o:',
-            ["out="])
+            'o:s:x',
+            ["out=","source=","export"])
 except getopt.GetoptError:
     printHlpFull()              # print full help
     sys.exit(2)
@@ -260,6 +267,10 @@ for opt, arg in opts:
         inpEventsLog = arg
         # print('TTN Mapper Log file: {}'.format(inpTTNEventsLog))
         nArg = nArg + 1
+    elif opt in ("-s", "--source"):
+        igraSource = arg
+    elif opt in ("-x", "--export"):
+        flExportCsv = True
 
 # print(nArg)
         
@@ -322,103 +333,32 @@ coords_1 = (mlat, mlon)
 # -------------------------------------------------------------------------
 # read list of radiosonde
 #
-# with ftplib.FTP("ftp://ftp.ncdc.noaa.gov/pub/data/igra/") as ftp:
-try:
-    print("access to ftp://ftp.ncdc.noaa.gov/pub/data/igra ...")
-    ftp = ftplib.FTP("ftp.ncdc.noaa.gov")
-    ftp.login()
-    ftp.cwd('pub/data/igra')              # change into "pub/data/igra" directory
-    print("-------------------- ftp.ncdc.noaa.gov/pub/data/igra")
-    # ftp.dir()
-except:
-    print("access error to ftp://ftp.ncdc.noaa.gov/pub/data/igra")
-    sys.exit()
+trp = openTransport(igraSource)
+print("access to {} ...".format(trp.name()))
 # get radiosonde list
-# https://stackoverflow.com/questions/11573817/how-to-download-a-file-via-ftp-with-python-ftplib
-try:
-    print("get radiosonde list: {} ...".format(LstFile))
-    ftp.retrbinary("RETR " + LstFile ,open(fpLstFile, 'wb').write)
-except:
+print("get radiosonde list: {} ...".format(LstFile))
+ris = getIgraStationList(trp, PathBaseDir)
+trp.close()
+if ris == False:
     print("Error download file list: {}".format(LstFile))
     sys.exit()
 
-colIgra2Names = [
-    "ICAONAT"   ,   # Character
-    "NETCODE"   ,
-    "IDCODE"    ,
-    "IGRA2_ID"  ,   # Character
-    "LATITUDE"  ,   # Real
-    "LONGITUDE" ,   # Real
-    "ELEVATION" ,   # Real
-    "STATE"     ,   # Character
-    "NAME"      ,   # Character
-    "FSTYEAR"   ,   # Integer
-    "LSTYEAR"   ,   # Integer
-    "NOBS"      ,   # Integer
-]
-
-colIgra2StationList = [
-    [ 0, 2],    # ICAONAT   : Character (Icao National Codes)
-    [ 2, 3],    # NETCODE   : Character (Network Code: 
-                #    I      : ICAO id (last 4 char IGRA2ID), 
-                #    M      : WMO id number (last 5 char IGRA2ID),
-                #    V      : Vol.Obs.id (last 5 to 6 char IGRA2ID)
-                #    W      : WBAN id (last 5 char IGRA2ID)
-                #    X      : Special id ("UA" with 6 alpha chr)
-    [ 3,11],    # IDCODE    : Integer
-    [ 0,11],    # IGRA2_ID  : Character
-    [12,20],    # LATITUDE  : Real
-    [21,30],    # LONGITUDE : Real
-    [31,37],    # ELEVATION : Real
-    [38,40],    # STATE     : Character
-    [41,71],    # NAME      : Character
-    [72,76],    # FSTYEAR   : Integer
-    [77,81],    # LSTYEAR   : Integer
-    [82,88]     # NOBS      : Integer
-]
-
-igraStation = pd.read_fwf(fpLstFile, names=colIgra2Names, header=None, colspecs=colIgra2StationList)
-# igraStation.to_csv('igra2station.csv', header=True, index=True, sep=csv_sep) 
-igraStation.to_csv('igra2station.csv', header=True, index=False, sep=csv_sep) 
-
-# filter elements in list:
-
-# get actual year
-now = datetime.datetime.now()
-act_year = int(now.strftime("%Y"))      # now.strftime("%Y-%m-%d %H:%M:%S")
-# filter list: remove lines with LSTYEAR less than act_year
-igraStation.drop(igraStation.loc[igraStation['LSTYEAR']<act_year].index, inplace=True)
-
-# filter list: remove lines with coordinates for mobile radiosonde (see igra2-list-format.txt):
-# LATITUDE   is the latitude of the station (in decimal degrees, mobile = -98.8888).
-# LONGITUDE  is the longitude of the station (in decimal degrees, mobile = -998.8888).
-# ELEVATION  is the elevation of the station (in meters, missing = -999.9, mobile = -998.8).
-igraStation.drop(igraStation.loc[igraStation['LONGITUDE'] == -998.8888].index, inplace=True)
-
-# reindex
-igraStation.reset_index(drop=True, inplace=True)
-
-# save for debug
-igraStation.to_csv('igra2-2020.csv', header=True, index=False, sep=csv_sep) 
-
-# initialize the last_distance to a dummy value, greather than expected
-last_distance = 400000.0                    # 400000km
-## print(coords_1)
-for i2 in igraStation.index:
-# for i2 in range(0, len(igraStation)):
-    coords_2 = (igraStation['LATITUDE'][i2], igraStation['LONGITUDE'][i2])
-    # print(coords_2)
-    distance = geopy.distance.geodesic(coords_1, coords_2).km
-    
-    # set flag checking value of rs_id is not set (cell has np.NaN)
-    # flSetNewRadiosonda = pd.isna(data['rs_distance'][i1])
-    if last_distance > distance:
-        # set new values in row
-        data.at[0, 'rs_id']        = igraStation.at[i2, 'IGRA2_ID']
-        data.at[0, 'rs_lat']       = igraStation.at[i2, 'LATITUDE']
-        data.at[0, 'rs_lon']       = igraStation.at[i2, 'LONGITUDE'] 
-        data.at[0, 'rs_distance']  = int(distance)
-        last_distance = distance
+# catalog of the stations active in the current year, with spatial index.
+# The catalog is compiled once for each version of the station list (see stationcat.py)
+igraCatalog = loadStationCatalog(fpLstFile, exportCsv=flExportCsv)
+print("stations in catalog: {}".format(len(igraCatalog)))
+
+# search the nearest radiosonde with the spatial index of the stations
+stLat = igraCatalog.lat
+stLon = igraCatalog.lon
+stTree = igraCatalog.tree
+rsInd, rsDist = nearestStations(stTree, stLat, stLon, mlat, mlon, k=1)
+
+i2 = rsInd[0, 0]
+data.at[0, 'rs_id']        = igraCatalog.ids[i2]
+data.at[0, 'rs_lat']       = stLat[i2]
+data.at[0, 'rs_lon']       = stLon[i2]
+data.at[0, 'rs_distance']  = int(rsDist[0, 0])
 
 radiosonde = data.rs_id.unique()
 
@@ -0,0 +1,169 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Launch index of the igra stations: sorted array with the epoch time (s)
+# of all the launches in the derived archive of a station, saved in
+#   <stationID>-drvd.launch.npy
+# next to the archive <stationID>-drvd.txt.zip.
+# The index is built reading the headers of the records directly from the zip,
+# and it is rebuilt when the archive changes.
+# If there is no archive, the index <stationID>-drvd.idx created by
+# get-rsigra.py or by the graph programs is used.
+# ----------------------------------------------------------------
+#
+import os
+import os.path
+import io
+from zipfile import ZipFile
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------------------
+# config
+#
+LaunchExt = '-drvd.launch.npy'
+csv_sep = ';'                           # char separator for csv
+
+# -------------------------------------------------------------------------
+# epoch time of the header of a derived record
+# YEAR         14- 17  Integer
+# MONTH        19- 20  Integer
+# DAY          22- 23  Integer
+# HOUR         25- 26  Integer  (99 = missing: the launch is set at 00)
+#
+def headerEpoch(line):
+    hour = line[24:26]
+    if hour == '99':
+        hour = '00'
+    date_acq = "{}-{}-{}T{}:00:00".format(line[13:17], line[18:20], line[21:23], hour)
+    return np.datetime64(date_acq, 's').astype(np.int64)
+
+# build the launch index of the archive fpZip
+def buildLaunchIndex(fpZip, stationID):
+    keySearch = "#" + stationID
+    launches = []
+    with ZipFile(fpZip, 'r') as zipObj:
+        for name in zipObj.namelist():
+            with zipObj.open(name) as fLog:
+                for line in io.TextIOWrapper(fLog, encoding='ascii', errors='replace'):
+                    if line.startswith(keySearch):
+                        try:
+                            launches.append(headerEpoch(line))
+                        except ValueError:
+                            continue
+    launches = np.unique(np.array(launches, dtype=np.int64))
+    fpLaunch = os.path.join(os.path.dirname(fpZip), stationID + LaunchExt)
+    np.save(fpLaunch, launches)
+    return launches
+
+# launch times from the index file .idx (column date)
+def readIdxLaunches(fpIdx):
+    idxLog = pd.read_csv(fpIdx, sep=csv_sep)
+    dates = pd.to_datetime(idxLog['date'], format="%Y-%m-%d %H:%M:%S", errors='coerce').dropna()
+    return np.unique(dates.values.astype('datetime64[s]').astype(np.int64))
+
+# -------------------------------------------------------------------------
+# return the sorted launch times of the station, searched in dirIdx,
+# or None if the launches of the station are unknown
+#
+def loadLaunchTimes(dirIdx, stationID):
+    fpZip = os.path.join(dirIdx, stationID + "-drvd.txt.zip")
+    fpLaunch = os.path.join(dirIdx, stationID + LaunchExt)
+    fpIdx = os.path.join(dirIdx, stationID + "-drvd.idx")
+    if os.path.exists(fpLaunch):
+        if not os.path.exists(fpZip) or os.path.getmtime(fpLaunch) >= os.path.getmtime(fpZip):
+            return np.load(fpLaunch)
+    if os.path.exists(fpZip):
+        try:
+            return buildLaunchIndex(fpZip, stationID)
+        except (OSError, ValueError) as err:
+            print("Error launch index [{}]: {}".format(fpZip, err))
+    if os.path.exists(fpIdx):
+        return readIdxLaunches(fpIdx)
+    return None
+
+# launches of the graphs of the interval [tStart, tEnd] (epoch time, s), as
+# selected by graph-rsigra-interval.py: from the last launch at or before tStart
+# to the last launch at or before tEnd. With tEnd = tStart, only the launch at
+# or before tStart, as selected by graph-rsigra-day.py.
+# return the mask of the selected launches
+def launchesInInterval(launches, tStart, tEnd):
+    launches = np.asarray(launches, dtype=np.int64)
+    before = launches[launches <= tStart]
+    if len(before) == 0:
+        return np.zeros(len(launches), dtype=bool)
+    return (launches >= before.max()) & (launches <= tEnd)
+
+# for each event time, True if the station has a launch in [time - window, time + window]
+def launchNear(launches, tEvent, window):
+    tEvent = np.asarray(tEvent, dtype=np.int64)
+    if len(launches) == 0:
+        return np.zeros(len(tEvent), dtype=bool)
+    # first launch at or after time - window
+    pos = np.searchsorted(launches, tEvent - window, side='left')
+    pos = np.minimum(pos, len(launches) - 1)
+    return np.abs(launches[pos] - tEvent) <= window
+
+# -------------------------------------------------------------------------
+# time-aware selection of the station of each event.
+# rsInd         : array (n. events, k) of candidate stations, sorted by distance
+# stationIds    : id of the stations
+# tEvent        : epoch time of the events (s)
+# window        : max time (s) between event and launch
+# fetchLaunches : function(stationID) returning the launches of a station without
+#                 index in dirIdx (e.g. downloading its archive), or None
+# The candidates are checked by rank, only for the events without a launch in
+# the window at the previous ranks: the launches of a station are loaded (or
+# fetched) only when they are needed.
+# For each event, the selected candidate is the nearest one with a launch in the
+# window; if there is none, the nearest one (rank 0).
+# return the rank of the selected candidate and its launch state:
+#    1: launch in the window, 0: no launch in the window, -1: unknown
+#
+def selectByLaunch(rsInd, stationIds, tEvent, window, dirIdx, fetchLaunches=None):
+    tEvent = np.asarray(tEvent, dtype=np.int64)
+    nEvents, k = rsInd.shape
+    state = np.full((nEvents, k), -1, dtype=np.int8)
+    pending = np.ones(nEvents, dtype=bool)  # events without a launch in the window
+    launchCache = {}
+    for rank in range(k):
+        rows = np.nonzero(pending)[0]
+        if len(rows) == 0:
+            break
+        col = rsInd[rows, rank]
+        for st in np.unique(col):
+            if st not in launchCache:
+                launches = loadLaunchTimes(dirIdx, str(stationIds[st]))
+                if launches is None and fetchLaunches is not None:
+                    launches = fetchLaunches(str(stationIds[st]))
+                launchCache[st] = launches
+            launches = launchCache[st]
+            if launches is None:
+                continue
+            stRows = rows[col == st]
+            state[stRows, rank] = np.where(launchNear(launches, tEvent[stRows], window), 1, 0)
+        pending[rows] = state[rows, rank] != 1
+
+    isNear = (state == 1)
+    sel = np.where(isNear.any(axis=1), isNear.argmax(axis=1), 0)
+    return (sel, state[np.arange(nEvents), sel])
@@ -0,0 +1,190 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# receives a csv file generated by inpnear.py or rsigra-near.py.
+# Generates a png thumbnail for each event with the location of the device,
+# gateway and nearest igra radiosonde, with a pool of processes.
+# The map tiles are saved in a local cache (option -c); with the option -n
+# (no network) the thumbnails are drawn on the tiles of the cache, and the
+# missing tiles are blank.
+
+import os
+import os.path
+import getopt, sys
+import time
+import multiprocessing
+
+import pandas as pd
+
+from eventthumb import ThumbSize, TileUrl, eventThumbnail
+
+# ---------------------------------------------------------------
+# config
+#
+PathBaseDir = os.getcwd()               # current working directory of the process
+csv_sep = ';'                           # char separator for csv
+TileCacheDir = 'tile-cache'             # default directory of the tile cache
+
+# -------------------------------------------------------------------------
+#
+# get full path file or directory
+def get_full_path(file_folder_name):
+    return (os.path.abspath(file_folder_name))
+
+# return the file name without path
+def get_file_name(full_path):
+    basename = os.path.basename(full_path)  # os independent
+    base = basename.split('.')[0]
+    return base
+
+# name of the file of an event
+def thumbName(idx, event):
+    name = "thumb-{:06d}-{}-{}.png".format(idx, event['nodeaddr'], event['gwaddr'])
+    return name.replace('/', '_').replace(' ', '_')
+
+# -------------------------------------------------------------------------
+# processes of the batch
+#
+def initBatch(dirCache, offline, size, urlTemplate):
+    global batchCache, batchOffline, batchSize, batchUrl
+    batchCache = dirCache
+    batchOffline = offline
+    batchSize = size
+    batchUrl = urlTemplate
+
+# thumbnail of an event; job = (event, fpPng)
+# return (fpPng, tiles, seconds, error)
+def renderThumb(job):
+    event, fpPng = job
+    tStart = time.time()
+    try:
+        tiles = eventThumbnail(event, fpPng, batchCache, batchOffline, batchSize, batchUrl)
+    except Exception as err:
+        return (fpPng, {}, time.time() - tStart, str(err))
+    return (fpPng, tiles, time.time() - tStart, '')
+
+def printHlpOptions():
+    print('{} -i <log TTN events> -o <out dir> [-c <tile cache dir>] [-n] [-s <width>x<height>] [-u <tile url>] [-p <n. processes>]'.format(sys.argv[0]))
+
+def printHlpFull():
+    printHlpOptions()
+    print('-c: directory of the tile cache (default: ./{})'.format(TileCacheDir))
+    print('-n: no network: the tiles not in the cache are blank')
+    print('-s: size of the thumbnails (default {}x{})'.format(*ThumbSize))
+    print('-u: url of the tiles (default {})'.format(TileUrl))
+    print('-p: n. processes (default: n. of cpu)')
+    print('Example:')
+    print('{} -i budnag-20190828.csv -o thumbs'.format(sys.argv[0]))
+    print('Read budnag-20190828.csv.')
+    print('Store the thumbnails thumb-<n. event>-<device>-<gateway>.png in ./thumbs directory')
+
+# -------------------------------------------------------------------------
+# Get command-line arguments
+if __name__ == '__main__':
+    # initialize variables
+    inpTTNEventsLog = ''
+    OutDirThumb = ''
+    dirCache = TileCacheDir
+    flOffline = False
+    size = ThumbSize
+    urlTemplate = TileUrl
+    nProcesses = 0
+
+    try:
+        opts, args = getopt.getopt(
+                sys.argv[1:],
+                'i:o:c:ns:u:p:',
+                ["inp=","out=","cache=","no-network","size=","url=","processes="])
+    except getopt.GetoptError:
+        printHlpFull()              # print full help
+        sys.exit(2)
+
+    nArg = 0
+    for opt, arg in opts:
+        if opt == '-h':
+            printHlpFull()              # print full help
+            sys.exit()
+        elif opt in ("-i", "--inp"):
+            inpTTNEventsLog = arg
+            nArg = nArg + 1
+        elif opt in ("-o", "--out"):
+            OutDirThumb = arg
+            nArg = nArg + 1
+        elif opt in ("-c", "--cache"):
+            dirCache = arg
+        elif opt in ("-n", "--no-network"):
+            flOffline = True
+        elif opt in ("-s", "--size"):
+            try:
+                size = tuple([int(v) for v in arg.lower().split('x')])
+            except ValueError:
+                size = ()
+            if len(size) != 2 or min(size) <= 0:
+                print('Error: size [{}] not valid'.format(arg))
+                printHlpOptions()
+                sys.exit(2)
+        elif opt in ("-u", "--url"):
+            urlTemplate = arg
+        elif opt in ("-p", "--processes"):
+            nProcesses = int(arg)
+
+    if nArg < 2:
+        printHlpFull()              # print full help
+        sys.exit()
+
+    fpTTNEventsLog = os.path.join(PathBaseDir, inpTTNEventsLog)
+    fpOutDir = get_full_path(OutDirThumb)
+    os.makedirs(fpOutDir, exist_ok=True)
+    dirCache = get_full_path(dirCache)
+    os.makedirs(dirCache, exist_ok=True)
+
+    # ---------------------------------------------------------------
+    # one thumbnail for each link device - gateway, as in map-rsigra.py
+    data = pd.read_csv(fpTTNEventsLog, skipinitialspace = True, sep = csv_sep)
+    data.drop_duplicates(['nodeaddr','gwaddr'], inplace=True)
+    cols = ['nodeaddr', 'lat', 'lon', 'gwaddr', 'gtw_lat', 'gtw_lon', 'rs_lat', 'rs_lon']
+    jobs = [(event, os.path.join(fpOutDir, thumbName(idx, event)))
+            for idx, event in zip(data.index, data[cols].to_dict('records'))]
+    if len(jobs) == 0:
+        print("No event in {}".format(inpTTNEventsLog))
+        sys.exit(2)
+
+    if nProcesses <= 0:
+        nProcesses = os.cpu_count()
+    nProcesses = min(nProcesses, len(jobs))
+
+    tStart = time.time()
+    tiles = {'cached': 0, 'downloaded': 0, 'blank': 0}
+    nErrors = 0
+    with multiprocessing.Pool(nProcesses, initializer=initBatch,
+                              initargs=(dirCache, flOffline, size, urlTemplate)) as pool:
+        for fpPng, thumbTiles, tThumb, err in pool.imap_unordered(renderThumb, jobs, chunksize=4):
+            if err:
+                nErrors = nErrors + 1
+                print("{}: error: {}".format(os.path.basename(fpPng), err))
+                continue
+            for key in thumbTiles:
+                tiles[key] = tiles[key] + thumbTiles[key]
+    tTotal = time.time() - tStart
+    print('thumbnails: {}, errors: {}, time: {:.2f} s, {:.1f} thumbnails/s'.format(
+            len(jobs) - nErrors, nErrors, tTotal, (len(jobs) - nErrors) / tTotal if tTotal > 0 else 0.0))
+    print('tiles: cached {}, downloaded {}, blank {}'.format(tiles['cached'], tiles['downloaded'], tiles['blank']))
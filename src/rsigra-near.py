@@ -35,81 +35,18 @@ import datetime
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from staticmap import StaticMap, CircleMarker
 import csv, json, sys
 import geopy.distance
 from array import *
 
-import ftplib
+from transport import openTransport, getIgraStationList, getIgraDrvd
+from stationcat import loadStationCatalog, catalogNearest
+from launchidx import selectByLaunch, loadLaunchTimes
 
 # -------------------------------------------------------------------------
 # igra log derived
 # -------------------------------------------------------------------------
 
-# return to ftp start directory
-def ftpIgraRootDir(ftp):
-    ftp_position = ftp.pwd()
-    if ftp_position == '/':
-        # sei gia' nella radice 
-        return
-    # count n. '/' in ftp_position
-    count = ftp_position.count('/')
-    path = ""
-    for i in range(count):
-        path += '../'
-    ftp.cwd(path)
-
-# return to ftp igra base dir
-def ftpIgraBaseDir(ftp):
-    ftpIgraRootDir(ftp)
-    ftp.cwd('pub/data/igra')              # change into "pub/data/igra" directory
-
-# return to ftp igra dir with derived data 
-def ftpIgraDerivedDir(ftp):
-    ftpIgraRootDir(ftp)
-    ftp.cwd('pub/data/igra/derived/derived-por/')              
-
-# get igra station list
-def getIgraStationList(ftp, dirIgraLog):
-    # goto ftp igra base dir
-    ftpIgraBaseDir(ftp)
-    
-    # get radiosonde list
-    # https://stackoverflow.com/questions/11573817/how-to-download-a-file-via-ftp-with-python-ftplib
-    FileName = "igra2-station-list.txt"
-
-    fpFileName = os.path.join(dirIgraLog, FileName)
-    fileOut = open(fpFileName,'wb')
-    op_completed = False
-    try:
-        print("... download: {} ...".format(FileName))
-        ftp.retrbinary("RETR " + FileName ,fileOut.write)
-        fileOut.close()
-        op_completed = True
-    except:
-        print("Error ftp download file [{}]".format(FileName))
-        fileOut.close()
-        os.unlink(fpFileName)
-    return(op_completed)
-    
-# get archive with Igra log
-def getIgraDrvd(ftp, dirIgraLog, stationID):
-    FileName = stationID + "-drvd.txt.zip"
-
-    fpFileName = os.path.join(dirIgraLog, FileName)
-    fileOut = open(fpFileName,'wb')
-    op_completed = False
-    try:
-        print("... download: {} ...".format(FileName))
-        ftp.retrbinary("RETR " + FileName ,fileOut.write)
-        fileOut.close()
-        op_completed = True
-    except:
-        print("Error ftp download file [{}]".format(FileName))
-        fileOut.close()
-        os.unlink(fpFileName)
-    return(op_completed)
-
 def igraDrvdExtract(dirIgraLog, stationID):
     # file name igra log archive
     fNameZipIgraLog = stationID + "-drvd" + ".txt.zip"
@@ -246,14 +183,25 @@ def str2bool(v):
     return v.lower() in ("yes", "true", "t", "1")
 
 def printHlpOptions():
-    print('{} -i <log TTN events> -o <out dir>'.format(sys.argv[0]))
+    print('{} -i <log TTN events> -o <out dir> [-s <igra source>] [-g <grid step>] [-w <hours> [-k <n>] [-l <dir>]] [-x]'.format(sys.argv[0]))
 
 def printHlpFull():
-    print('{} -i <log TTN events> -o <out dir>'.format(sys.argv[0]))
+    print('{} -i <log TTN events> -o <out dir> [-s <igra source>] [-g <grid step>] [-w <hours> [-k <n>] [-l <dir>]] [-x]'.format(sys.argv[0]))
     print('Example:')
     print('{} -i rfsee_drivetest_unit_4.csv -o \"./outdir\"'.format(sys.argv[0]))
     print('Read rfsee_drivetest_unit_4.csv.'.format(sys.argv[0]))
     print('Store csv result file in ./output directory')
+    print('-s selects the igra source (default: ftp):')
+    print('   ftp, https, url of a mirror (http://, https://, ftp://, file://) or local directory')
+    print('-g: quantise the median points to a grid with step in degrees (default 0: exact points)')
+    print('    the points in a cell of the grid share the nearest radiosonde')
+    print('-w: time window in hours: select the nearest radiosonde with a launch')
+    print('    in [time - window, time + window] of the event (default 0: nearest radiosonde);')
+    print('    if no candidate has a launch in the window, the nearest radiosonde.')
+    print('    The archives of the candidates without launch index are downloaded and indexed')
+    print('-k: n. of nearest radiosonde checked for the launches (default 5 with -w, else 1)')
+    print('-l: directory with the radiosonde archives and launch indexes (default: out dir)')
+    print('-x: save the debug csv igra2station.csv and igra2-2020.csv in the current directory')
 
 # -------------------------------------------------------------------------
 # Get command-line arguments
@@ -263,12 +211,18 @@ inpTTNEventsLog = ''
 outDirCsv = ''
 minDist = 20
 flCaseGtwId = True
+igraSource = 'ftp'
+flExportCsv = False
+gridStep = 0.0
+timeWindow = 0                  # time window (hours) for the launches
+nCandidates = 0                 # n. of candidate radiosonde
+dirLaunchIdx = ''               # directory of the launch indexes
 
 try:
     opts, args = getopt.getopt(
             sys.argv[1:],
-            'i:o:',
-            ["inp=","out="])
+            'i:o:s:g:w:k:l:x',
+            ["inp=","out=","source=","grid=","window=","cand=","launch=","export"])
 except getopt.GetoptError:
     printHlpFull()              # print full help
     sys.exit(2)
@@ -286,11 +240,26 @@ for opt, arg in opts:
         outDirCsv = arg
         # print('Output directory csv result: {}'.format(outDirCsv))
         nArg = nArg + 1
+    elif opt in ("-s", "--source"):
+        igraSource = arg
+    elif opt in ("-g", "--grid"):
+        gridStep = float(arg)
+    elif opt in ("-w", "--window"):
+        timeWindow = float(arg)
+    elif opt in ("-k", "--cand"):
+        nCandidates = int(arg)
+    elif opt in ("-l", "--launch"):
+        dirLaunchIdx = arg
+    elif opt in ("-x", "--export"):
+        flExportCsv = True
 
 if nArg < 2:
     printHlpFull()              # print full help
     sys.exit()
 
+if nCandidates <= 0:
+    nCandidates = 5 if timeWindow > 0 else 1
+
 # ---------------------------------------------------------------
 # full path inpTTNMapperLog
 fpTTNEventsLog = os.path.join(PathBaseDir, inpTTNEventsLog)
@@ -317,101 +286,23 @@ fpLstFile = os.path.join(outDirRadioSonda, LstFile)
 # with ftplib.FTP("ftp://ftp.ncdc.noaa.gov/pub/data/igra/data/data-por/") as ftp:
 nFiles = 0
 
-# connect via ftp to igra
-try:
-    ftp = ftplib.FTP("ftp.ncdc.noaa.gov")
-    ftp.login()
-except:
-    print("Error to connect Igra via ftp")
-    sys.exit(2)
-
-# goto ftp igra base dir
-ftpIgraBaseDir(ftp)
+# connect to igra
+trp = openTransport(igraSource)
+print("igra source: {}".format(trp.name()))
 
 # get radiosonde list
-# https://stackoverflow.com/questions/11573817/how-to-download-a-file-via-ftp-with-python-ftplib
-# get radiosonde list
-if getIgraStationList(ftp, outDirRadioSonda) == False:
+if getIgraStationList(trp, outDirRadioSonda) == False:
     print("Error download file list: {}".format(LstFile))
+    trp.close()
     sys.exit(2)
 
-# Close the connection unilaterally
-ftp.close()
-
-# create pandas dataframe with list of radiosonde
-## ------------------------------
-## Variable   Columns   Type
-## ID            1-11   Character
-## LATITUDE     13-20   Real
-## LONGITUDE    22-30   Real
-## ELEVATION    32-37   Real
-## STATE        39-40   Character
-## NAME         42-71   Character
-## FSTYEAR      73-76   Integer
-## LSTYEAR      78-81   Integer
-## NOBS         83-88   Integer
-## ------------------------------
-
-colIgra2Names = [
-    "ICAONAT"   ,   # Character
-    "NETCODE"   ,
-    "IDCODE"    ,
-    "IGRA2_ID"  ,   # Character
-    "LATITUDE"  ,   # Real
-    "LONGITUDE" ,   # Real
-    "ELEVATION" ,   # Real
-    "STATE"     ,   # Character
-    "NAME"      ,   # Character
-    "FSTYEAR"   ,   # Integer
-    "LSTYEAR"   ,   # Integer
-    "NOBS"      ,   # Integer
-]
-
-colIgra2StationList = [
-    [ 0, 2],    # ICAONAT   : Character (Icao National Codes)
-    [ 2, 3],    # NETCODE   : Character (Network Code: 
-                #    I      : ICAO id (last 4 char IGRA2ID), 
-                #    M      : WMO id number (last 5 char IGRA2ID),
-                #    V      : Vol.Obs.id (last 5 to 6 char IGRA2ID)
-                #    W      : WBAN id (last 5 char IGRA2ID)
-                #    X      : Special id ("UA" with 6 alpha chr)
-    [ 3,11],    # IDCODE    : Integer
-    [ 0,11],    # IGRA2_ID  : Character
-    [12,20],    # LATITUDE  : Real
-    [21,30],    # LONGITUDE : Real
-    [31,37],    # ELEVATION : Real
-    [38,40],    # STATE     : Character
-    [41,71],    # NAME      : Character
-    [72,76],    # FSTYEAR   : Integer
-    [77,81],    # LSTYEAR   : Integer
-    [82,88]     # NOBS      : Integer
-]
-
-# https://www.programcreek.com/python/example/101362/pandas.read_fwf
-igraStation = pd.read_fwf(fpLstFile, names=colIgra2Names, header=None, colspecs=colIgra2StationList)
-# igraStation.to_csv('igra2station.csv', header=True, index=True, sep=csv_sep) 
-igraStation.to_csv('igra2station.csv', header=True, index=False, sep=csv_sep) 
-
-# filter elements in list:
-
-# get actual year
-now = datetime.datetime.now()
-act_year = int(now.strftime("%Y"))      # now.strftime("%Y-%m-%d %H:%M:%S")
-# filter list: remove lines with LSTYEAR less than act_year
-igraStation.drop(igraStation.loc[igraStation['LSTYEAR']<act_year].index, inplace=True)
-
-# filter list: remove lines with coordinates for mobile radiosonde (see igra2-list-format.txt):
-# LATITUDE   is the latitude of the station (in decimal degrees, mobile = -98.8888).
-# LONGITUDE  is the longitude of the station (in decimal degrees, mobile = -998.8888).
-# ELEVATION  is the elevation of the station (in meters, missing = -999.9, mobile = -998.8).
-igraStation.drop(igraStation.loc[igraStation['LONGITUDE'] == -998.8888].index, inplace=True)
-
-# reindex
-igraStation.reset_index(drop=True, inplace=True)
-
-# save for debug
-igraStation.to_csv('igra2-2020.csv', header=True, index=False, sep=csv_sep) 
-# completata la lista di tutte le stazioni che hanno dati del 2020
+# Close the connection: it is reopened to download the radiosonde archives
+trp.close()
+
+# catalog of the stations active in the current year, with spatial index.
+# The catalog is compiled once for each version of the station list (see stationcat.py)
+igraCatalog = loadStationCatalog(fpLstFile, exportCsv=flExportCsv)
+print("stations in catalog: {}".format(len(igraCatalog)))
 
 # -------------------------------------------------------------------------
 # leggi il csv di nome fpTTNEventsLog
@@ -431,31 +322,56 @@ data['rs_distance'] = data['distance'].apply(np.int64)
 # see: https://www.geeksforgeeks.org/python-pandas-dataframe-round/
 data = data.round({'rs_lat':4, 'rs_lon':4})
 
-# https://www.geeksforgeeks.org/different-ways-to-iterate-over-rows-in-pandas-dataframe/
-# iterate through each row data   
-for i1 in data.index:
-    print("row index: {}...".format(i1))
-    # calculate median point of tw o coordinates
-    mlat = (data['lat'][i1] + data['gtw_lat'][i1]) / 2.0
-    mlon = (data['lon'][i1] + data['gtw_lon'][i1]) / 2.0
-    coords_1 = (mlat, mlon)
-    # initialize the last_distance to a dummy value, greather than expected
-    last_distance = 400000.0                    # 400000km
-    ## print(coords_1)
-    for i2 in igraStation.index:
-        coords_2 = (igraStation['LATITUDE'][i2], igraStation['LONGITUDE'][i2])
-        distance=geopy.distance.geodesic(coords_1, coords_2).km
-        
-        # set flag checking value of rs_id is not set (cell has np.NaN)
-        if last_distance > distance:
-            # set new values in row
-            data.at[i1, 'rs_id']        = igraStation.at[i2, 'IGRA2_ID']
-            data.at[i1, 'rs_lat']       = igraStation.at[i2, 'LATITUDE']
-            data.at[i1, 'rs_lon']       = igraStation.at[i2, 'LONGITUDE'] 
-            data.at[i1, 'rs_distance']  = int(distance)
-            last_distance = distance
-
-radiosonde = data.rs_id.unique()
+# -------------------------------------------------------------------------
+# search the nearest radiosonde of the median point of each event.
+# All the median points are searched in a single batch with the spatial index
+# of the catalog: the repeated points are searched once, and the points
+# already searched in the previous runs are read from the memo (see stationcat.py)
+stLat = igraCatalog.lat
+stLon = igraCatalog.lon
+
+# calculate median point of two coordinates
+mlat = ((data['lat'] + data['gtw_lat']) / 2.0).values
+mlon = ((data['lon'] + data['gtw_lon']) / 2.0).values
+rsInd, rsDist = catalogNearest(igraCatalog, mlat, mlon, k=nCandidates, grid=gridStep)
+
+# select the radiosonde of each event
+rsRank = np.zeros(len(data), dtype=np.int64)
+if timeWindow > 0:
+    # nearest of the candidates with a launch in the time window of the event
+    if dirLaunchIdx == '':
+        dirLaunchIdx = fpOutDir
+    tEvent = pd.to_datetime(data['time']).values.astype('datetime64[s]').astype(np.int64)
+
+    # the candidates without launch index are downloaded and indexed when they
+    # are checked: their archive is needed anyway if they are selected
+    fetched = set()
+    def fetchLaunches(stationID):
+        if not getIgraDrvd(trp, fpOutDir, stationID):
+            return None
+        fetched.add(stationID)
+        return loadLaunchTimes(fpOutDir, stationID)
+
+    rsRank, rsLaunch = selectByLaunch(rsInd, igraCatalog.ids, tEvent,
+                                      int(timeWindow * 3600), dirLaunchIdx, fetchLaunches)
+    print("radiosonde archives downloaded for the launch indexes: {}".format(len(fetched)))
+rsSel = rsInd[np.arange(len(data)), rsRank]
+
+# set the values of the selected radiosonde in the rows
+data['rs_id']       = igraCatalog.ids[rsSel]
+data['rs_lat']      = stLat[rsSel]
+data['rs_lon']      = stLon[rsSel]
+data['rs_distance'] = rsDist[np.arange(len(data)), rsRank].astype(np.int64)
+
+if timeWindow > 0:
+    # rs_launch: 1 launch in the time window, 0 no launch, -1 launches unknown
+    data['rs_launch'] = rsLaunch
+    print("events with launch in window: {}, no launch: {}, unknown: {}".format(
+            (rsLaunch == 1).sum(), (rsLaunch == 0).sum(), (rsLaunch == -1).sum()))
+    # the archives of the radiosonde without launches in the window are not downloaded
+    radiosonde = data.loc[data['rs_launch'] != 0, 'rs_id'].unique()
+else:
+    radiosonde = data.rs_id.unique()
 
 print("N. radiosonde identificate: {}".format(len(radiosonde)))
 print(radiosonde)
@@ -470,44 +386,21 @@ if len(radiosonde) == 0:
     
 # ---------------------------------------------------------------
 
-# reconnect via ftp to igra
-try:
-    ftp = ftplib.FTP("ftp.ncdc.noaa.gov")
-    ftp.login()
-except:
-    print("Error to connect Igra via ftp")
-    sys.exit(2)
-
-# goto ftp igra base dir
-ftpIgraBaseDir(ftp)
-
-# open ftp directory with radiosonda last data:
-print(ftp.pwd())
-ftpIgraRootDir(ftp)
-print(ftp.pwd())
-
-# return to ftp igra dir with derived data 
-ftpIgraDerivedDir(ftp)
-print(ftp.pwd())
-print("ftp://ftp.ncdc.noaa.gov/pub/data/igra/derived/derived-por")
-
-# get the radiosonoda files
+# get the radiosonoda files, all with the same connection to igra
 nFiles = 0
 for idRadioSonda in radiosonde:
-    # 'l' (last):
-    FileName = idRadioSonda + "-drvd.txt.zip"
-    fpFileName = os.path.join(fpOutDir, FileName)
-    fileOut = open(fpFileName,'wb')
-    try:
-        print("... download: {} ...".format(FileName))
-        ftp.retrbinary("RETR " + FileName ,fileOut.write)
-        fileOut.close()
+    if timeWindow > 0 and idRadioSonda in fetched:
+        # already downloaded for the launch index
         nFiles+=1
-    except:
-        print("Error download file: {}".format(FileName))
-        fileOut.close()
-        os.unlink(fpFileName)
         continue
+    if getIgraDrvd(trp, fpOutDir, idRadioSonda):
+        nFiles+=1
+
+trp.close()
 
 print("Number of radiosonda files downloaded: {}".format(nFiles))
-    
+
+if timeWindow > 0 and os.path.abspath(dirLaunchIdx) == fpOutDir:
+    # update the launch indexes of the archives, used by the next runs
+    for idRadioSonda in radiosonde:
+        loadLaunchTimes(fpOutDir, idRadioSonda)
@@ -0,0 +1,327 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Output of the html reports of the igra graph programs
+# (graph-rsigra-day.py, graph-rsigra-interval.py).
+# The plotly.js bundle (about 3.5 MB) can be:
+# - inline   : included in each report (default);
+# - directory: a single plotly.min.js shared by all the reports in the output
+#              directory, copied there by the first report written;
+# - cdn      : loaded from the plotly cdn (needs an internet connection);
+# - <path>.js: loaded from the path (or url) given.
+# The panels of the reports (option -g of the graph programs):
+#   reNH: N - height       reMH: M - height
+#   slNH: dN/dH - height   slMH: dM/dH - height
+# Each panel is written in its report, or all the panels selected are written
+# in one report with a subplot for each panel (option -c).
+# For long intervals, the traces can be drawn with WebGL (Scattergl) and the
+# points of each launch reduced with the Largest-Triangle-Three-Buckets
+# algorithm, which keeps the peaks of the profile.
+# The heatmap view resamples the profile of each launch on a common height grid
+# and draws one time x height heatmap of N, M or of a gradient (option -e).
+# Incremental output: the key of each output (csv of a launch, report) is saved
+# in <stationID>-drvd.keys, and the outputs with the same key are not rewritten.
+# ----------------------------------------------------------------
+#
+import os
+import os.path
+import hashlib
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+from plotly.subplots import make_subplots
+
+# ---------------------------------------------------------------
+# config
+#
+PlotlyJsModes = {
+    'inline': True,
+    'directory': 'directory',
+    'cdn': 'cdn',
+}
+
+# panels: name -> (x column, y column, x title, y title)
+# the slope panels have the height in km
+Panels = {
+    'reNH': ('N', 'HGHT', 'N', 'Height (m)'),
+    'reMH': ('M', 'HGHT', 'M', 'Height (m)'),
+    'slNH': ('HGHT', 'slopeN_H', '<b>Height (km)</b>', '<b>&#916;N/&#916;H, km<sup>-1</sup></b>'),
+    'slMH': ('HGHT', 'slopeM_H', '<b>Height (km)</b>', '<b>&#916;M/&#916;H, km<sup>-1</sup></b>'),
+}
+SlopePanels = ('slNH', 'slMH')
+DefaultPanels = ['slNH', 'slMH']
+PanelHeight = 450                       # height (px) of a panel in the combined report
+
+# variables of the heatmap: name -> (column, title)
+HeatmapVars = {
+    'N': ('N', 'N'),
+    'M': ('M', 'M'),
+    'dN': ('slopeN_H', '&#916;N/&#916;H, km<sup>-1</sup>'),
+    'dM': ('slopeM_H', '&#916;M/&#916;H, km<sup>-1</sup>'),
+}
+HeatmapStep = 50                        # default step (m) of the height grid
+
+ReportVersion = 1                       # change if the content of the outputs changes
+KeysExt = '-drvd.keys'
+csv_sep = ';'                           # char separator for csv
+
+# default font parameters
+def_font = dict(
+    family='Arial, monospace',
+    size=16,
+    color="#000000"                     # black
+)
+def_tickfont = dict(
+    size=16,
+    color="#000000"                     # black
+)
+
+# -------------------------------------------------------------------------
+# value of include_plotlyjs for the mode; None if the mode is not valid
+def plotlyJsOption(mode):
+    mode = mode.strip()
+    if mode in PlotlyJsModes:
+        return PlotlyJsModes[mode]
+    if mode.endswith('.js'):
+        return mode
+    return None
+
+# write the html report of the figure
+def writeReport(fig, fpHtml, plotlyJs=True):
+    fig.write_html(fpHtml, include_plotlyjs=plotlyJs, auto_open=False)
+
+# -------------------------------------------------------------------------
+# list of the panels in the string "reNH,slNH,..." ("none": no panel);
+# None if a panel is not valid
+def parsePanels(arg):
+    panels = []
+    if arg.strip() == 'none':
+        return panels
+    for name in arg.split(','):
+        name = name.strip()
+        if name == '':
+            continue
+        if name not in Panels:
+            return None
+        if name not in panels:
+            panels.append(name)
+    return panels
+
+# profile of a launch from the levels items = [(CalcGph, RefIndex), ...]
+# columns:
+# HGHT      : height (m) (CALCGPH calculated geopotential height)
+# N         : the refractive index (unitless)
+# M         : N + 0.157 * HGHT
+# deltaN, deltaM, deltaH : difference from the previous level
+# slopeN_H, slopeM_H     : deltaN / deltaH, deltaM / deltaH (km^-1)
+# the levels with missing values are removed
+def profileFrame(items):
+    dtAcq = pd.DataFrame.from_records(items, columns=['HGHT', 'N'])
+    dtAcq['M'] = dtAcq.N + 0.157 * dtAcq.HGHT
+    dtAcq['deltaN'] = dtAcq['N'].diff()
+    dtAcq['deltaM'] = dtAcq['M'].diff()
+    dtAcq['deltaH'] = dtAcq['HGHT'].diff()
+    dtAcq['slopeN_H'] = dtAcq['deltaN'].div(dtAcq['deltaH'])
+    dtAcq['slopeM_H'] = dtAcq['deltaM'].div(dtAcq['deltaH'])
+    dtAcq.loc[~np.isfinite(dtAcq['slopeN_H']), 'slopeN_H'] = np.nan
+    dtAcq.loc[~np.isfinite(dtAcq['slopeM_H']), 'slopeM_H'] = np.nan
+    # the height of the slopes is in km
+    dtAcq['slopeN_H'] = dtAcq.slopeN_H * 1000
+    dtAcq['slopeM_H'] = dtAcq.slopeM_H * 1000
+    return dtAcq.dropna()
+
+# Largest-Triangle-Three-Buckets: indexes of nOut points of the line (x, y).
+# The first and the last point are kept; the other points are divided in
+# nOut - 2 buckets, and from each bucket the point selected is the one making
+# the largest triangle with the point selected in the previous bucket and the
+# mean of the next bucket.
+def lttb(x, y, nOut):
+    n = len(x)
+    if nOut >= n or nOut < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, nOut - 1).astype(np.int64)
+    idx = np.empty(nOut, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for i in range(nOut - 2):
+        start, end = edges[i], edges[i + 1]
+        nextEnd = edges[i + 2] if i + 2 < len(edges) else n
+        avgX = x[end:nextEnd].mean()
+        avgY = y[end:nextEnd].mean()
+        area = np.abs((x[a] - avgX) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avgY - y[a]))
+        a = start + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+# traces of the profile of a launch (dataframe with the columns HGHT (m), N, M,
+# slopeN_H, slopeM_H) for each panel. The panels use the same arrays.
+# gl        : True, WebGL traces
+# maxPoints : max points of each trace (0: all), reduced with lttb()
+def profileTraces(dtAcq, name, panels, color=None, gl=False, maxPoints=0):
+    hght = dtAcq['HGHT'].to_numpy()
+    cols = {
+        'HGHT': hght,
+        'N': dtAcq['N'].to_numpy(),
+        'M': dtAcq['M'].to_numpy(),
+        'slopeN_H': dtAcq['slopeN_H'].to_numpy(),
+        'slopeM_H': dtAcq['slopeM_H'].to_numpy(),
+    }
+    hghtKm = hght / 1000
+    line = dict(width=3) if color is None else dict(width=3, color=color)
+    Trace = go.Scattergl if gl else go.Scatter
+    traces = {}
+    for panel in panels:
+        xCol, yCol = Panels[panel][0:2]
+        x = hghtKm if panel in SlopePanels else cols[xCol]
+        y = cols[yCol]
+        if maxPoints > 0 and len(hght) > maxPoints:
+            # the points of the profile are in order of height
+            if panel in SlopePanels:
+                sel = lttb(hght, y, maxPoints)
+            else:
+                sel = lttb(hght, x, maxPoints)
+            x, y = x[sel], y[sel]
+        traces[panel] = Trace(x=x, y=y, line=line, name=name, legendgroup=name)
+    return traces
+
+# axis of the panel: title, range
+def axisLayout(text, rng=None):
+    axis = dict(
+        tickfont=def_tickfont,
+        title=dict(text=text, font=def_font)
+    )
+    if rng is not None:
+        axis['range'] = rng
+    return axis
+
+# layout of the title of the report
+def titleLayout(title):
+    return dict(text='<b>' + title + '</b>', font=def_font, xref='paper', x=0)
+
+# x, y axis of the panel
+def panelAxes(panel, heightLimit):
+    xTitle, yTitle = Panels[panel][2:4]
+    if panel in SlopePanels:
+        return (axisLayout(xTitle, [0, heightLimit / 1000]), axisLayout(yTitle))
+    return (axisLayout(xTitle), axisLayout(yTitle, [0, heightLimit]))
+
+# white background and grids of the slope panels
+def gridStyle(fig, **kwargs):
+    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='LightPink', showline=True,
+                     linewidth=1, linecolor='black', mirror=True, **kwargs)
+    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='LightPink', showline=True,
+                     linewidth=1, linecolor='black', mirror=True, **kwargs)
+
+# -------------------------------------------------------------------------
+# figure of a panel with the traces of all the launches
+def panelFigure(panel, traces, title, heightLimit):
+    xaxis, yaxis = panelAxes(panel, heightLimit)
+    layout = go.Layout(title=titleLayout(title), xaxis=xaxis, yaxis=yaxis)
+    fig = go.Figure(data=traces, layout=layout)
+    if panel in SlopePanels:
+        fig.update_layout(plot_bgcolor='rgb(255,255,255)')
+        gridStyle(fig)
+    return fig
+
+# figure with a subplot for each panel; the traces of a launch are in the same
+# legend group, so a launch is shown or hidden in all the panels
+def combinedFigure(panels, traces, title, heightLimit):
+    fig = make_subplots(rows=len(panels), cols=1, vertical_spacing=0.25 / len(panels))
+    for row, panel in enumerate(panels, start=1):
+        for trace in traces[panel]:
+            trace.showlegend = (row == 1)
+            fig.add_trace(trace, row=row, col=1)
+        xaxis, yaxis = panelAxes(panel, heightLimit)
+        fig.update_xaxes(row=row, col=1, **xaxis)
+        fig.update_yaxes(row=row, col=1, **yaxis)
+    fig.update_layout(title=titleLayout(title), height=PanelHeight * len(panels),
+                      plot_bgcolor='rgb(255,255,255)')
+    gridStyle(fig)
+    return fig
+
+# -------------------------------------------------------------------------
+# heatmap view
+#
+# heights (m) of the grid
+def heightGrid(heightLimit, step=HeatmapStep):
+    return np.arange(0, heightLimit + step, step, dtype=np.float64)
+
+# values of the profile (hght, values) interpolated on the height grid;
+# NaN out of the heights of the profile
+def resampleProfile(hght, values, grid):
+    hght = np.asarray(hght, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(hght, kind='stable')
+    if len(order) == 0:
+        return np.full(len(grid), np.nan)
+    return np.interp(grid, hght[order], values[order], left=np.nan, right=np.nan)
+
+# figure of the heatmap: times of the launches, matrix (n. heights, n. launches)
+def heatmapFigure(var, times, z, grid, title):
+    zTitle = HeatmapVars[var][1]
+    layout = go.Layout(
+        title=titleLayout(title),
+        xaxis=axisLayout('<b>Launch time</b>'),
+        yaxis=axisLayout('<b>Height (m)</b>', [grid[0], grid[-1]]),
+    )
+    trace = go.Heatmap(x=times, y=grid, z=z, colorscale='Viridis',
+                       colorbar=dict(title=dict(text=zTitle, font=def_font)),
+                       hoverongaps=False)
+    return go.Figure(data=[trace], layout=layout)
+
+# -------------------------------------------------------------------------
+# keys of the outputs
+#
+# key of an output, from the fields of its content and ReportVersion
+def outputKey(*fields):
+    sha = hashlib.sha1(csv_sep.join([str(f) for f in fields]).encode())
+    sha.update("{}{}".format(csv_sep, ReportVersion).encode())
+    return sha.hexdigest()[:16]
+
+# keys of the outputs of the station (file name -> key)
+def readOutputKeys(fpKeys):
+    keys = {}
+    if not os.path.exists(fpKeys):
+        return keys
+    with open(fpKeys, 'r') as fKeys:
+        for line in fKeys:
+            fields = line.rstrip('\n').split(csv_sep)
+            if len(fields) == 2 and fields[0] != 'file':
+                keys[fields[0]] = fields[1]
+    return keys
+
+def writeOutputKeys(fpKeys, keys):
+    fpTmp = fpKeys + '.tmp'
+    with open(fpTmp, 'w') as fKeys:
+        fKeys.write("file" + csv_sep + "key\n")
+        for name in sorted(keys):
+            fKeys.write(name + csv_sep + keys[name] + '\n')
+    os.replace(fpTmp, fpKeys)
+
+# True if the output fpOut exists and it has the key
+def isCurrent(keys, fpOut, key):
+    return keys.get(os.path.basename(fpOut)) == key and os.path.exists(fpOut)
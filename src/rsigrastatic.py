@@ -0,0 +1,158 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Static images (png, svg) of the igra profile plots, for the batch reports.
+# The plots are the panels of rsigraplot.py (reNH, reMH, slNH, slMH), drawn
+# with the matplotlib Agg backend, without a display.
+# The profiles are read directly from the derived archive of the station
+#   <stationID>-drvd.txt.zip
+# reading the archive once for all the jobs of the station. The launches of a
+# job are selected with the launch index (launchidx.py), as in the html graphs.
+# ----------------------------------------------------------------
+#
+import os
+import os.path
+import io
+import time
+from zipfile import ZipFile
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from launchidx import headerEpoch, loadLaunchTimes, buildLaunchIndex, launchesInInterval
+from rsigraplot import Panels, SlopePanels, profileFrame
+
+# ---------------------------------------------------------------
+# config
+#
+ImageFormats = ('png', 'svg')
+FigSize = (8, 6)                        # size of the images (inches)
+FigDpi = 100
+
+# -------------------------------------------------------------------------
+# launches of the archive fpZip selected for the intervals [tStart, tEnd]
+# (epoch time, s), as in the html graphs (see launchidx.launchesInInterval)
+# return a set of launch times for each interval
+#
+def selectLaunches(fpZip, stationID, intervals):
+    launches = None
+    if os.path.basename(fpZip) == stationID + "-drvd.txt.zip":
+        launches = loadLaunchTimes(os.path.dirname(fpZip), stationID)
+    if launches is None:
+        launches = buildLaunchIndex(fpZip, stationID)
+    return [set(launches[launchesInInterval(launches, tStart, tEnd)].tolist())
+            for tStart, tEnd in intervals]
+
+# profiles of the launches of the archive fpZip selected for the intervals
+# [tStart, tEnd] (epoch time, s). The archive is read once, up to the last launch.
+# return a list for each interval of (date launch, profile dataframe)
+#
+def readProfiles(fpZip, stationID, intervals, heightLimit):
+    keySearch = "#" + stationID
+    selected = selectLaunches(fpZip, stationID, intervals)
+    profiles = [[] for i in intervals]
+    tLast = max([max(sel) for sel in selected if sel], default=None)
+    if tLast is None:
+        return profiles
+    with ZipFile(fpZip, 'r') as zipObj:
+        for name in zipObj.namelist():
+            with zipObj.open(name) as fLog:
+                items = None            # levels of the launch read
+                for line in io.TextIOWrapper(fLog, encoding='ascii', errors='replace'):
+                    if line.startswith('#'):
+                        if items is not None:
+                            addProfile(profiles, selected, epoch, dateLaunch, items)
+                        items = None
+                        if not line.startswith(keySearch):
+                            continue
+                        try:
+                            epoch = int(headerEpoch(line))
+                        except ValueError:
+                            continue
+                        if epoch > tLast:
+                            # the records are in order of time
+                            break
+                        if any([epoch in sel for sel in selected]):
+                            dateLaunch = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(epoch))
+                            items = []
+                            levelsEnd = False
+                        continue
+                    if items is None or levelsEnd:
+                        continue
+                    CalcGph = int(line[16:23])          # calculated geopotential height (meters)
+                    RefIndex = int(line[144:151])       # N, the refractive index (unitless)
+                    items.append((CalcGph, RefIndex))
+                    # acquisition limit, based on height
+                    levelsEnd = CalcGph > heightLimit
+                if items is not None:
+                    addProfile(profiles, selected, epoch, dateLaunch, items)
+    return profiles
+
+# add the profile of the launch to the intervals selecting the launch
+def addProfile(profiles, selected, epoch, dateLaunch, items):
+    dtAcq = profileFrame(items)
+    for i, sel in enumerate(selected):
+        if epoch in sel:
+            profiles[i].append((dateLaunch, dtAcq))
+
+# -------------------------------------------------------------------------
+# image of a panel with the profiles of the launches, saved in fpImage
+# (format from the extension)
+def renderPanel(panel, profiles, title, heightLimit, fpImage):
+    xCol, yCol, xTitle, yTitle = Panels[panel]
+    fig = Figure(figsize=FigSize, dpi=FigDpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    for dateLaunch, dtAcq in profiles:
+        x = dtAcq[xCol].to_numpy()
+        if panel in SlopePanels:
+            x = x / 1000                # height in km
+        ax.plot(x, dtAcq[yCol].to_numpy(), linewidth=2, label=dateLaunch)
+    if panel in SlopePanels:
+        ax.set_xlim(0, heightLimit / 1000)
+        ax.grid(True, color='LightPink')
+    else:
+        ax.set_ylim(0, heightLimit)
+    ax.set_xlabel(plainText(xTitle))
+    ax.set_ylabel(plainText(yTitle))
+    ax.set_title(plainText(title), loc='left', fontweight='bold')
+    if 0 < len(profiles) <= 20:
+        ax.legend(fontsize='small')
+    fig.savefig(fpImage)
+
+# text of the html titles of the panels
+def plainText(text):
+    for tag, txt in (('<b>', ''), ('</b>', ''), ('<br>', '\n'), ('&#916;', 'Δ'),
+                     ('<sup>', '$^{'), ('</sup>', '}$')):
+        text = text.replace(tag, txt)
+    return text
+
+# images of the panels of a station-interval; return the list of the files
+def renderProfiles(profiles, panels, title, heightLimit, fpBase, fmt):
+    files = []
+    for panel in panels:
+        fpImage = "{}.{}".format(fpBase.format(panel), fmt)
+        renderPanel(panel, profiles, title, heightLimit, fpImage)
+        files.append(fpImage)
+    return files
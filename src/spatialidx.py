@@ -0,0 +1,239 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Spatial index of points on the earth (igra stations, gateways).
+# The points are converted to unit vectors (x, y, z) on the sphere and stored
+# in a ball tree: the chord distance between two unit vectors increases with the
+# great circle distance, so the k nearest points in 3d are the k nearest on the sphere.
+# The tree is stored in flat numpy arrays, that can be saved and memory-mapped.
+#
+# nearestStations() refines the candidates of the tree with the exact geodesic
+# distance on the WGS-84 ellipsoid (geodist), so the result is the same of a full search.
+# ----------------------------------------------------------------
+#
+import heapq
+
+import numpy as np
+
+from geodist import geodesicKm
+
+# ---------------------------------------------------------------
+# config
+#
+EarthRadius = 6371.0088                 # mean earth radius (km)
+LeafSize = 16                           # max n. of points in a leaf of the tree
+# max relative difference between the geodesic distance on the WGS-84 ellipsoid
+# and the great circle distance on the sphere with radius EarthRadius (about 0.6%)
+SphereRelErr = 0.01
+
+# -------------------------------------------------------------------------
+# conversions
+#
+# latitude, longitude (degrees) to unit vectors: array (n, 3)
+def latlonToXyz(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cosLat = np.cos(lat)
+    return np.column_stack((cosLat * np.cos(lon), cosLat * np.sin(lon), np.sin(lat)))
+
+# chord distance between unit vectors to great circle distance (km)
+def chordToKm(chord):
+    return 2.0 * EarthRadius * np.arcsin(np.minimum(np.asarray(chord) / 2.0, 1.0))
+
+# great circle distance (km) to chord distance between unit vectors
+def kmToChord(km):
+    return 2.0 * np.sin(np.minimum(np.asarray(km) / (2.0 * EarthRadius), np.pi / 2.0))
+
+# -------------------------------------------------------------------------
+# ball tree
+#
+# arrays of the tree:
+#   points      : (n, 3) unit vectors, in the order of the input
+#   idx         : (n,)   permutation of the points: each node has the points idx[start:end]
+#   centre      : (m, 3) centre of the ball of the node
+#   radius      : (m,)   radius of the ball of the node
+#   start, end  : (m,)   range of the node in idx
+#   left, right : (m,)   children of the node (-1 for leaves)
+#
+class BallTree:
+    def __init__(self, points, arrays=None):
+        self.points = np.asarray(points, dtype=np.float64)
+        if arrays is None:
+            arrays = buildBallTree(self.points)
+        self.idx    = arrays['idx']
+        self.centre = arrays['centre']
+        self.radius = arrays['radius']
+        self.start  = arrays['start']
+        self.end    = arrays['end']
+        self.left   = arrays['left']
+        self.right  = arrays['right']
+
+    # arrays of the tree, used to save it
+    def arrays(self):
+        return {
+            'idx': self.idx, 'centre': self.centre, 'radius': self.radius,
+            'start': self.start, 'end': self.end,
+            'left': self.left, 'right': self.right,
+        }
+
+    def __len__(self):
+        return self.points.shape[0]
+
+    # k nearest points of the unit vector q
+    # return chord distances and indexes of points, sorted by distance
+    def queryOne(self, q, k):
+        k = min(k, len(self))
+        best = []                           # heap of (-distance, index point)
+        nodes = [(0.0, 0)]                  # heap of (min distance, node)
+        while nodes:
+            dMin, node = heapq.heappop(nodes)
+            if len(best) == k and dMin >= -best[0][0]:
+                break
+            if self.left[node] < 0:
+                # leaf: distance to all the points of the node
+                ind = self.idx[self.start[node]:self.end[node]]
+                dist = np.sqrt(((self.points[ind] - q) ** 2).sum(axis=1))
+                for d, i in zip(dist.tolist(), ind.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, i))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, i))
+                continue
+            for child in (self.left[node], self.right[node]):
+                dc = np.sqrt(((self.centre[child] - q) ** 2).sum()) - self.radius[child]
+                dc = max(dc, 0.0)
+                if len(best) < k or dc < -best[0][0]:
+                    heapq.heappush(nodes, (dc, child))
+        best.sort(reverse=True)
+        return (np.array([-d for d, i in best]), np.array([i for d, i in best], dtype=np.int64))
+
+    # points with chord distance <= r from the unit vector q
+    # return chord distances and indexes of points, sorted by distance
+    def queryRadius(self, q, r):
+        dists, inds = [], []
+        nodes = [0] if len(self) > 0 else []
+        while nodes:
+            node = nodes.pop()
+            if np.sqrt(((self.centre[node] - q) ** 2).sum()) - self.radius[node] > r:
+                continue
+            if self.left[node] < 0:
+                ind = self.idx[self.start[node]:self.end[node]]
+                dist = np.sqrt(((self.points[ind] - q) ** 2).sum(axis=1))
+                sel = dist <= r
+                dists.append(dist[sel])
+                inds.append(ind[sel])
+                continue
+            nodes.append(self.left[node])
+            nodes.append(self.right[node])
+        if not dists:
+            return (np.empty(0), np.empty(0, dtype=np.int64))
+        dist = np.concatenate(dists)
+        ind = np.concatenate(inds).astype(np.int64)
+        order = np.argsort(dist, kind='stable')
+        return (dist[order], ind[order])
+
+    # k nearest points for each row of the array q (nq, 3)
+    # return arrays (nq, k) of chord distances and indexes
+    def query(self, q, k):
+        q = np.atleast_2d(q)
+        k = min(k, len(self))
+        dist = np.empty((q.shape[0], k))
+        ind = np.empty((q.shape[0], k), dtype=np.int64)
+        for row in range(q.shape[0]):
+            dist[row], ind[row] = self.queryOne(q[row], k)
+        return (dist, ind)
+
+# build the arrays of the ball tree of the unit vectors points (n, 3)
+def buildBallTree(points):
+    n = points.shape[0]
+    idx = np.arange(n, dtype=np.int64)
+    centre, radius, start, end, left, right = [], [], [], [], [], []
+
+    def newNode(s, e):
+        pts = points[idx[s:e]]
+        c = pts.mean(axis=0) if e > s else np.zeros(3)
+        centre.append(c)
+        radius.append(np.sqrt(((pts - c) ** 2).sum(axis=1)).max() if e > s else 0.0)
+        start.append(s)
+        end.append(e)
+        left.append(-1)
+        right.append(-1)
+        return len(start) - 1
+
+    stack = [newNode(0, n)]
+    while stack:
+        node = stack.pop()
+        s, e = start[node], end[node]
+        if e - s <= LeafSize:
+            continue
+        # split at the median of the coordinate with max spread
+        pts = points[idx[s:e]]
+        dim = np.argmax(pts.max(axis=0) - pts.min(axis=0))
+        half = (e - s) // 2
+        order = np.argpartition(pts[:, dim], half)
+        idx[s:e] = idx[s:e][order]
+        left[node] = newNode(s, s + half)
+        right[node] = newNode(s + half, e)
+        stack.append(left[node])
+        stack.append(right[node])
+
+    return {
+        'idx': idx,
+        'centre': np.array(centre, dtype=np.float64).reshape(-1, 3),
+        'radius': np.array(radius, dtype=np.float64),
+        'start': np.array(start, dtype=np.int64),
+        'end': np.array(end, dtype=np.int64),
+        'left': np.array(left, dtype=np.int64),
+        'right': np.array(right, dtype=np.int64),
+    }
+
+# -------------------------------------------------------------------------
+# k nearest stations of the points (lat, lon), with exact geodesic distance.
+# tree has the unit vectors of the stations with coordinates stLat, stLon.
+# The candidates of the tree are checked with the geodesic distance: the search is
+# extended until the candidates not checked can not be nearer than the k-th station.
+# return arrays (n. points, k) of station indexes and geodesic distances (km)
+#
+def nearestStations(tree, stLat, stLon, lat, lon, k=1, extra=8):
+    lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+    lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+    nStations = len(tree)
+    k = min(k, nStations)
+    q = latlonToXyz(lat, lon)
+    nCand = min(k + extra, nStations)
+    candDist, candInd = tree.query(q, nCand)
+
+    rsInd = np.empty((len(lat), k), dtype=np.int64)
+    rsDist = np.empty((len(lat), k))
+    for row in range(len(lat)):
+        chord, ind = candDist[row], candInd[row]
+        while True:
+            geo = geodesicKm(lat[row], lon[row], stLat[ind], stLon[ind])
+            order = np.argsort(geo, kind='stable')[:k]
+            kthDist = geo[order[-1]]
+            if len(ind) >= nStations or chordToKm(chord[-1]) * (1.0 - SphereRelErr) > kthDist:
+                break
+            # a station out of the candidates could be nearer: extend the search
+            chord, ind = tree.queryOne(q[row], min(2 * len(ind), nStations))
+        rsInd[row] = ind[order]
+        rsDist[row] = geo[order]
+    return (rsInd, rsDist)
@@ -0,0 +1,299 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Catalog of the igra stations, compiled from igra2-station-list.txt.
+# The catalog has the stations active in the current year (filter on LSTYEAR),
+# without the mobile stations, in typed numpy arrays, and the spatial index
+# of the stations (see spatialidx.py).
+# The catalog is saved in a directory next to the station list, one for each
+# version of the list (sha1 of the file) and year:
+#   igra2-catalog-<key>/<column>.npy
+# The next runs load the arrays memory-mapped, without parsing the station list.
+#
+# catalogNearest() searches the nearest stations of many points: equal points
+# (optionally quantised to a grid) are searched once, and the results are saved
+# in a memo in the directory of the catalog, used by the next runs:
+#   igra2-catalog-<key>/nearest-<grid>.csv
+# ----------------------------------------------------------------
+#
+import os
+import os.path
+import shutil
+import hashlib
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from spatialidx import BallTree, buildBallTree, latlonToXyz, nearestStations
+
+# ---------------------------------------------------------------
+# config
+#
+CatalogVersion = 1                      # change if the format of the catalog changes
+CatalogPrefix = "igra2-catalog-"
+csv_sep = ';'                           # char separator for csv
+
+# create pandas dataframe with list of radiosonde
+## ------------------------------
+## Variable   Columns   Type
+## ID            1-11   Character
+## LATITUDE     13-20   Real
+## LONGITUDE    22-30   Real
+## ELEVATION    32-37   Real
+## STATE        39-40   Character
+## NAME         42-71   Character
+## FSTYEAR      73-76   Integer
+## LSTYEAR      78-81   Integer
+## NOBS         83-88   Integer
+## ------------------------------
+
+colIgra2Names = [
+    "ICAONAT"   ,   # Character
+    "NETCODE"   ,
+    "IDCODE"    ,
+    "IGRA2_ID"  ,   # Character
+    "LATITUDE"  ,   # Real
+    "LONGITUDE" ,   # Real
+    "ELEVATION" ,   # Real
+    "STATE"     ,   # Character
+    "NAME"      ,   # Character
+    "FSTYEAR"   ,   # Integer
+    "LSTYEAR"   ,   # Integer
+    "NOBS"      ,   # Integer
+]
+
+colIgra2StationList = [
+    [ 0, 2],    # ICAONAT   : Character (Icao National Codes)
+    [ 2, 3],    # NETCODE   : Character (Network Code:
+                #    I      : ICAO id (last 4 char IGRA2ID),
+                #    M      : WMO id number (last 5 char IGRA2ID),
+                #    V      : Vol.Obs.id (last 5 to 6 char IGRA2ID)
+                #    W      : WBAN id (last 5 char IGRA2ID)
+                #    X      : Special id ("UA" with 6 alpha chr)
+    [ 3,11],    # IDCODE    : Integer
+    [ 0,11],    # IGRA2_ID  : Character
+    [12,20],    # LATITUDE  : Real
+    [21,30],    # LONGITUDE : Real
+    [31,37],    # ELEVATION : Real
+    [38,40],    # STATE     : Character
+    [41,71],    # NAME      : Character
+    [72,76],    # FSTYEAR   : Integer
+    [77,81],    # LSTYEAR   : Integer
+    [82,88]     # NOBS      : Integer
+]
+
+# columns of the catalog and their type
+colCatalog = [
+    ("IGRA2_ID" , 'U11'),
+    ("LATITUDE" , np.float64),
+    ("LONGITUDE", np.float64),
+    ("ELEVATION", np.float32),
+    ("STATE"    , 'U2'),
+    ("NAME"     , 'U30'),
+    ("FSTYEAR"  , np.int16),
+    ("LSTYEAR"  , np.int16),
+    ("NOBS"     , np.int32),
+]
+
+# -------------------------------------------------------------------------
+# read the station list
+def readStationList(fpLstFile):
+    # https://www.programcreek.com/python/example/101362/pandas.read_fwf
+    return pd.read_fwf(fpLstFile, names=colIgra2Names, header=None, colspecs=colIgra2StationList)
+
+# filter the station list. Return the stations active in act_year
+def filterStationList(igraStation, act_year):
+    # filter list: remove lines with LSTYEAR less than act_year
+    igraStation = igraStation.drop(igraStation.loc[igraStation['LSTYEAR']<act_year].index)
+
+    # filter list: remove lines with coordinates for mobile radiosonde (see igra2-list-format.txt):
+    # LATITUDE   is the latitude of the station (in decimal degrees, mobile = -98.8888).
+    # LONGITUDE  is the longitude of the station (in decimal degrees, mobile = -998.8888).
+    # ELEVATION  is the elevation of the station (in meters, missing = -999.9, mobile = -998.8).
+    igraStation = igraStation.drop(igraStation.loc[igraStation['LONGITUDE'] == -998.8888].index)
+
+    # reindex
+    return igraStation.reset_index(drop=True)
+
+# key of the catalog: version of the station list, year of the filter, format
+def catalogKey(fpLstFile, act_year):
+    sha = hashlib.sha1()
+    with open(fpLstFile, 'rb') as fLst:
+        for block in iter(lambda: fLst.read(65536), b''):
+            sha.update(block)
+    sha.update("{};{}".format(act_year, CatalogVersion).encode())
+    return sha.hexdigest()[:16]
+
+# -------------------------------------------------------------------------
+# compiled catalog of the stations
+#
+class StationCatalog:
+    def __init__(self, dirCatalog):
+        self.dirCatalog = dirCatalog
+        self.key = os.path.basename(dirCatalog)[len(CatalogPrefix):]
+        self.columns = {}
+        for col, dtype in colCatalog:
+            self.columns[col] = np.load(os.path.join(dirCatalog, col + '.npy'), mmap_mode='r')
+        self.ids = self.columns['IGRA2_ID']
+        self.lat = self.columns['LATITUDE']
+        self.lon = self.columns['LONGITUDE']
+        xyz = np.load(os.path.join(dirCatalog, 'xyz.npy'), mmap_mode='r')
+        arrays = {}
+        for name in ('idx', 'centre', 'radius', 'start', 'end', 'left', 'right'):
+            arrays[name] = np.load(os.path.join(dirCatalog, 'tree-' + name + '.npy'), mmap_mode='r')
+        self.tree = BallTree(xyz, arrays)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # catalog as pandas dataframe
+    def toDataFrame(self):
+        return pd.DataFrame({col: np.asarray(self.columns[col]) for col, dtype in colCatalog})
+
+# compile the catalog of the station list in dirCatalog
+def compileCatalog(fpLstFile, act_year, dirCatalog):
+    igraStation = filterStationList(readStationList(fpLstFile), act_year)
+    # save in a temporary directory, then rename it
+    dirTmp = dirCatalog + '.tmp'
+    if os.path.exists(dirTmp):
+        shutil.rmtree(dirTmp)
+    os.makedirs(dirTmp)
+    for col, dtype in colCatalog:
+        values = igraStation[col]
+        if np.dtype(dtype).kind == 'U':
+            values = values.fillna('').astype(str)
+        elif np.dtype(dtype).kind == 'i':
+            values = values.fillna(-1)
+        np.save(os.path.join(dirTmp, col + '.npy'), values.to_numpy().astype(dtype))
+    xyz = latlonToXyz(igraStation['LATITUDE'].values, igraStation['LONGITUDE'].values)
+    np.save(os.path.join(dirTmp, 'xyz.npy'), xyz)
+    for name, arr in buildBallTree(xyz).items():
+        np.save(os.path.join(dirTmp, 'tree-' + name + '.npy'), arr)
+    os.replace(dirTmp, dirCatalog)
+
+# -------------------------------------------------------------------------
+# load the catalog of the station list fpLstFile.
+# The catalog is compiled if it does not exist for this version of the list;
+# the catalogs of the old versions are removed.
+# If exportCsv, save the debug csv files igra2station.csv (all the stations)
+# and igra2-2020.csv (stations of the catalog) in the current directory.
+#
+def loadStationCatalog(fpLstFile, exportCsv=False, act_year=None):
+    if act_year is None:
+        # get actual year
+        act_year = datetime.datetime.now().year
+    dirBase = os.path.dirname(os.path.abspath(fpLstFile))
+    key = catalogKey(fpLstFile, act_year)
+    dirCatalog = os.path.join(dirBase, CatalogPrefix + key)
+    if not os.path.isdir(dirCatalog):
+        print("compile station catalog: {} ...".format(os.path.basename(dirCatalog)))
+        compileCatalog(fpLstFile, act_year, dirCatalog)
+        for name in os.listdir(dirBase):
+            fpName = os.path.join(dirBase, name)
+            if name.startswith(CatalogPrefix) and fpName != dirCatalog and os.path.isdir(fpName):
+                shutil.rmtree(fpName, ignore_errors=True)
+    cat = StationCatalog(dirCatalog)
+
+    if exportCsv:
+        # save for debug
+        igraStation = readStationList(fpLstFile)
+        igraStation.to_csv('igra2station.csv', header=True, index=False, sep=csv_sep)
+        igraStation = filterStationList(igraStation, act_year)
+        igraStation.to_csv('igra2-2020.csv', header=True, index=False, sep=csv_sep)
+    return cat
+
+# -------------------------------------------------------------------------
+# memo of the nearest stations
+#
+# file name of the memo for the grid step (degrees)
+def memoFileName(cat, grid):
+    return os.path.join(cat.dirCatalog, "nearest-{}.csv".format(repr(float(grid))))
+
+# read the memo. Return dict (lat, lon) -> (station indexes, distances) sorted by rank
+def readMemo(fpMemo):
+    memo = {}
+    if not os.path.exists(fpMemo):
+        return memo
+    dfMemo = pd.read_csv(fpMemo, sep=csv_sep, float_precision='round_trip')
+    # the last record of a point replaces the previous ones
+    dfMemo = dfMemo.drop_duplicates(['mlat', 'mlon', 'rank'], keep='last')
+    dfMemo = dfMemo.sort_values(['mlat', 'mlon', 'rank'])
+    for (mlat, mlon), grp in dfMemo.groupby(['mlat', 'mlon'], sort=False):
+        memo[(mlat, mlon)] = (grp['rs_idx'].to_numpy(np.int64), grp['rs_distance'].to_numpy(np.float64))
+    return memo
+
+# append the new points to the memo
+def appendMemo(fpMemo, mlat, mlon, rsInd, rsDist):
+    k = rsInd.shape[1]
+    dfNew = pd.DataFrame({
+        'mlat': np.repeat(mlat, k),
+        'mlon': np.repeat(mlon, k),
+        'rank': np.tile(np.arange(k), len(mlat)),
+        'rs_idx': rsInd.ravel(),
+        'rs_distance': rsDist.ravel(),
+    })
+    flHeader = not os.path.exists(fpMemo)
+    dfNew.to_csv(fpMemo, mode='a', header=flHeader, index=False, sep=csv_sep)
+
+# -------------------------------------------------------------------------
+# k nearest stations of the catalog for the points (lat, lon).
+# if grid > 0, the points are quantised to a grid with step grid (degrees):
+# the points of a cell share the stations and the distances of the centre of the cell.
+# return arrays (n. points, k) of station indexes and geodesic distances (km)
+#
+def catalogNearest(cat, lat, lon, k=1, grid=0.0):
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    k = min(k, len(cat))
+    if grid > 0:
+        lat = np.round(lat / grid) * grid
+        lon = np.round(lon / grid) * grid
+    # unique points, and position of each point in the list of unique points
+    uniq, inverse = np.unique(np.column_stack((lat, lon)), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+
+    fpMemo = memoFileName(cat, grid)
+    memo = readMemo(fpMemo)
+    uInd = np.empty((len(uniq), k), dtype=np.int64)
+    uDist = np.empty((len(uniq), k))
+    missing = []
+    for row, (mlat, mlon) in enumerate(uniq.tolist()):
+        rec = memo.get((mlat, mlon))
+        if rec is None or len(rec[0]) < k:
+            missing.append(row)
+            continue
+        uInd[row] = rec[0][:k]
+        uDist[row] = rec[1][:k]
+    print("points: {}, unique: {}, from memo: {}".format(
+            len(lat), len(uniq), len(uniq) - len(missing)))
+
+    if missing:
+        missing = np.array(missing, dtype=np.int64)
+        rsInd, rsDist = nearestStations(cat.tree, cat.lat, cat.lon,
+                                        uniq[missing, 0], uniq[missing, 1], k)
+        uInd[missing] = rsInd
+        uDist[missing] = rsDist
+        appendMemo(fpMemo, uniq[missing, 0], uniq[missing, 1], rsInd, rsDist)
+
+    # results of the unique points to all the points
+    return (uInd[inverse], uDist[inverse])
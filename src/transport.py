@@ -0,0 +1,343 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# Transport used by the TropPo tools to download the igra archives and the TTN data.
+# A source is selected with a string:
+#   ftp                 ftp://ftp.ncdc.noaa.gov/pub/data/igra (original igra ftp site)
+#   https               https://www.ncei.noaa.gov/data/integrated-global-radiosonde-archive
+#   http(s)://...       web server or local server with a mirror of the igra ftp tree
+#   ftp://...           ftp server with a mirror of the igra ftp tree
+#   file://... or path  local directory with a mirror of the igra ftp tree (air-gapped sites)
+#
+# The http backend keeps the connection open between the files (keep-alive)
+# and uses conditional GET (If-None-Match / If-Modified-Since): a file already
+# downloaded and not changed on the server is not transferred again.
+# ----------------------------------------------------------------
+#
+import os
+import os.path
+import json
+import shutil
+import ftplib
+import http.client
+import urllib.parse
+
+# ---------------------------------------------------------------
+# config
+#
+IgraFtpSource   = "ftp://ftp.ncdc.noaa.gov/pub/data/igra"
+IgraHttpsSource = "https://www.ncei.noaa.gov/data/integrated-global-radiosonde-archive"
+
+# path of the igra files, relative to the base of the source
+# 'list': igra station list
+# 'drvd': archive with derived data of a station
+IgraLayout = {
+    'ftp': {
+        'list': "igra2-station-list.txt",
+        'drvd': "derived/derived-por/{}-drvd.txt.zip",
+    },
+    'ncei': {
+        'list': "doc/igra2-station-list.txt",
+        'drvd': "access/derived-por/{}-drvd.txt.zip",
+    },
+}
+
+HttpTimeout = 60                        # timeout (s) of the http connection
+HttpBlockSize = 65536                   # block size used to save the http response
+HttpMaxRedirect = 5                     # max n. of http redirections
+HdrExt = '.hdr'                         # extension of the file with the http validators
+
+# -------------------------------------------------------------------------
+# http validators (ETag, Last-Modified) of a downloaded file,
+# saved in the file fpLocal + HdrExt
+#
+def readValidators(fpLocal):
+    fpHdr = fpLocal + HdrExt
+    if not (os.path.exists(fpLocal) and os.path.exists(fpHdr)):
+        return {}
+    try:
+        with open(fpHdr, 'r') as fHdr:
+            return json.load(fHdr)
+    except (OSError, ValueError):
+        return {}
+
+def writeValidators(fpLocal, etag, lastModified):
+    validators = {}
+    if etag:
+        validators['etag'] = etag
+    if lastModified:
+        validators['last_modified'] = lastModified
+    fpHdr = fpLocal + HdrExt
+    if not validators:
+        if os.path.exists(fpHdr):
+            os.unlink(fpHdr)
+        return
+    with open(fpHdr, 'w') as fHdr:
+        json.dump(validators, fHdr)
+
+# -------------------------------------------------------------------------
+# http/https backend, with persistent connection
+#
+class HttpTransport:
+    def __init__(self, baseUrl, layout='ftp'):
+        url = urllib.parse.urlsplit(baseUrl)
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.basePath = url.path.rstrip('/')
+        self.layout = layout
+        self.conn = None
+
+    def name(self):
+        return "{}://{}{}".format(self.scheme, self.host, self.basePath)
+
+    def connect(self):
+        if self.conn is None:
+            if self.scheme == 'https':
+                self.conn = http.client.HTTPSConnection(self.host, timeout=HttpTimeout)
+            else:
+                self.conn = http.client.HTTPConnection(self.host, timeout=HttpTimeout)
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # send the request. If the server has closed the kept-alive connection, reconnect once
+    def request(self, path, headers):
+        for attempt in range(2):
+            conn = self.connect()
+            try:
+                conn.request('GET', path, headers=headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                    http.client.BadStatusLine, ConnectionResetError, BrokenPipeError):
+                self.close()
+                if attempt > 0:
+                    raise
+
+    # download the file at path (relative to the base of the source) in fpLocal
+    # return True if fpLocal is updated or already up to date
+    def fetch(self, relPath, fpLocal):
+        return self.fetchPath(self.basePath + '/' + relPath.lstrip('/'), fpLocal, 0)
+
+    def fetchPath(self, path, fpLocal, nRedirect):
+        FileName = os.path.basename(fpLocal)
+        headers = {
+            'Connection': 'keep-alive',
+            'Accept-Encoding': 'identity',
+            'User-Agent': 'TropPo/1.0',
+        }
+        # conditional GET
+        validators = readValidators(fpLocal)
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+
+        try:
+            resp = self.request(path, headers)
+        except (OSError, http.client.HTTPException):
+            print("Error http download file [{}]".format(FileName))
+            self.close()
+            return False
+
+        if resp.status == 304:
+            resp.read()
+            self.checkClose(resp)
+            print("... not modified: {} ...".format(FileName))
+            return True
+
+        if resp.status in (301, 302, 303, 307, 308) and nRedirect < HttpMaxRedirect:
+            location = resp.getheader('Location', '')
+            resp.read()
+            self.checkClose(resp)
+            url = urllib.parse.urlsplit(urllib.parse.urljoin(
+                        "{}://{}{}".format(self.scheme, self.host, path), location))
+            newPath = url.path + ('?' + url.query if url.query else '')
+            if url.scheme == self.scheme and url.netloc == self.host:
+                return self.fetchPath(newPath, fpLocal, nRedirect + 1)
+            # redirection to another server
+            trp = HttpTransport("{}://{}".format(url.scheme, url.netloc), self.layout)
+            ris = trp.fetchPath(newPath, fpLocal, nRedirect + 1)
+            trp.close()
+            return ris
+
+        if resp.status != 200:
+            resp.read()
+            self.checkClose(resp)
+            print("Error http download file [{}]: {} {}".format(FileName, resp.status, resp.reason))
+            return False
+
+        # save the response in a temporary file, then rename it
+        print("... download: {} ...".format(FileName))
+        fpPart = fpLocal + '.part'
+        try:
+            with open(fpPart, 'wb') as fileOut:
+                while True:
+                    block = resp.read(HttpBlockSize)
+                    if not block:
+                        break
+                    fileOut.write(block)
+            os.replace(fpPart, fpLocal)
+        except (OSError, http.client.HTTPException):
+            print("Error http download file [{}]".format(FileName))
+            self.close()
+            if os.path.exists(fpPart):
+                os.unlink(fpPart)
+            return False
+        writeValidators(fpLocal, resp.getheader('ETag'), resp.getheader('Last-Modified'))
+        self.checkClose(resp)
+        return True
+
+    # the server has requested to close the connection
+    def checkClose(self, resp):
+        if resp.will_close:
+            self.close()
+
+# -------------------------------------------------------------------------
+# ftp backend (original access to igra). The connection is used for all the files
+#
+class FtpTransport:
+    def __init__(self, baseUrl, layout='ftp'):
+        url = urllib.parse.urlsplit(baseUrl)
+        self.host = url.netloc
+        self.basePath = url.path.rstrip('/')
+        self.layout = layout
+        self.ftp = None
+
+    def name(self):
+        return "ftp://{}{}".format(self.host, self.basePath)
+
+    def connect(self):
+        if self.ftp is None:
+            self.ftp = ftplib.FTP(self.host)
+            self.ftp.login()
+        return self.ftp
+
+    def close(self):
+        if self.ftp is not None:
+            try:
+                self.ftp.quit()
+            except (OSError, ftplib.Error):
+                self.ftp.close()
+            self.ftp = None
+
+    def fetch(self, relPath, fpLocal):
+        FileName = os.path.basename(fpLocal)
+        fpPart = fpLocal + '.part'
+        try:
+            ftp = self.connect()
+            print("... download: {} ...".format(FileName))
+            with open(fpPart, 'wb') as fileOut:
+                ftp.retrbinary("RETR " + self.basePath + '/' + relPath.lstrip('/'), fileOut.write)
+            os.replace(fpPart, fpLocal)
+        except (OSError, EOFError, ftplib.Error):
+            print("Error ftp download file [{}]".format(FileName))
+            if os.path.exists(fpPart):
+                os.unlink(fpPart)
+            return False
+        return True
+
+# -------------------------------------------------------------------------
+# local backend: directory with a mirror of the files (tests, air-gapped mirrors)
+# a file is copied only if the copy is missing or different from the mirror
+#
+class LocalTransport:
+    def __init__(self, baseDir, layout='ftp'):
+        self.baseDir = os.path.abspath(baseDir)
+        self.layout = layout
+
+    def name(self):
+        return self.baseDir
+
+    def close(self):
+        pass
+
+    def fetch(self, relPath, fpLocal):
+        FileName = os.path.basename(fpLocal)
+        fpSource = os.path.join(self.baseDir, *relPath.split('/'))
+        if not os.path.isfile(fpSource):
+            print("Error local copy file [{}]".format(FileName))
+            return False
+        if os.path.abspath(fpLocal) == fpSource:
+            return True
+        stSource = os.stat(fpSource)
+        if os.path.exists(fpLocal):
+            stLocal = os.stat(fpLocal)
+            if (stLocal.st_size == stSource.st_size and
+                    int(stLocal.st_mtime) == int(stSource.st_mtime)):
+                print("... not modified: {} ...".format(FileName))
+                return True
+        print("... copy: {} ...".format(FileName))
+        shutil.copy2(fpSource, fpLocal)
+        return True
+
+# -------------------------------------------------------------------------
+# return the transport for the source string (see Info)
+#
+def openTransport(source):
+    if source == 'ftp':
+        return FtpTransport(IgraFtpSource, 'ftp')
+    if source in ('https', 'ncei'):
+        return HttpTransport(IgraHttpsSource, 'ncei')
+    url = urllib.parse.urlsplit(source)
+    layout = 'ncei' if url.netloc == 'www.ncei.noaa.gov' else 'ftp'
+    if url.scheme in ('http', 'https'):
+        return HttpTransport(source, layout)
+    if url.scheme == 'ftp':
+        return FtpTransport(source, layout)
+    if url.scheme == 'file':
+        return LocalTransport(urllib.parse.unquote(url.path), layout)
+    return LocalTransport(source, layout)
+
+# download a single file from url (http, https, ftp, file or local path)
+def fetchUrl(source, fpLocal):
+    url = urllib.parse.urlsplit(source)
+    if url.scheme in ('http', 'https', 'ftp'):
+        base = "{}://{}".format(url.scheme, url.netloc)
+        relPath = url.path + ('?' + url.query if url.query else '')
+    else:
+        base = os.path.dirname(url.path if url.scheme == 'file' else source)
+        relPath = os.path.basename(url.path if url.scheme == 'file' else source)
+        if url.scheme == 'file':
+            base = 'file://' + base
+    trp = openTransport(base)
+    ris = trp.fetch(relPath, fpLocal)
+    trp.close()
+    return ris
+
+# -------------------------------------------------------------------------
+# igra files
+# -------------------------------------------------------------------------
+
+# get igra station list
+def getIgraStationList(trp, dirIgraLog):
+    FileName = "igra2-station-list.txt"
+    fpFileName = os.path.join(dirIgraLog, FileName)
+    return trp.fetch(IgraLayout[trp.layout]['list'], fpFileName)
+
+# get archive with Igra log
+def getIgraDrvd(trp, dirIgraLog, stationID):
+    FileName = stationID + "-drvd.txt.zip"
+    fpFileName = os.path.join(dirIgraLog, FileName)
+    return trp.fetch(IgraLayout[trp.layout]['drvd'].format(stationID), fpFileName)
@@ -0,0 +1,312 @@
+# ===================================================================================
+# Project:    TropPo
+#             v. 1.0 2020-03-01, ICTP Wireless Lab
+# Programmer: Marco Rainone - ICTP Wireless Lab
+# Specifications, revisions and verifications:
+#             Marco Zennaro, Ermanno Pietrosemoli, Marco Rainone - ICTP Wireless Lab
+# ===================================================================================
+#
+# The project is released with Mit License
+# https://opensource.org/licenses/MIT
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ===================================================================================
+#
+# Info
+# ----------------------------------------------------------------
+# TTN gateway list (json returned by the TTN api):
+#   {"statuses": {"<gateway id>": {"frequency_plan": ..., "location": {...}, ...}, ...}}
+# The file is read in blocks and the gateways are decoded one at a time,
+# so the memory used does not depend on the number of gateways.
+#
+# The gateways with coordinates are kept in the store gtwttn-store.csv, refreshed
+# comparing the new list with the store; they are written in a csv file for each
+# frequency plan, gtwttn-<plan>.csv, and in the combined file gtwttn-all.csv,
+# with the gateways grouped by frequency plan. The index gtwttn-all.idx has
+# the position and the size (bytes) of the rows of each plan in gtwttn-all.csv.
+# ----------------------------------------------------------------
+#
+import os
+import io
+import csv
+import json
+import shutil
+import time
+
+# ---------------------------------------------------------------
+# config
+#
+BlockSize = 1 << 16                     # size of the blocks read from the file
+csv_sep = ';'                           # char separator for csv
+GtwAllName = "gtwttn-all"               # combined file of all the frequency plans
+GtwStoreName = "gtwttn-store.csv"       # store of the gateways, with time of update
+CacheTTL = 24 * 3600                    # validity of the gateway store (s)
+
+# https://github.com/TheThingsNetwork/lorawan-frequency-plans
+# frequency plans of The Things Network Stack
+FreqPlans = [
+    'AS_923',                           # Asia 923 MHz
+    'AU_915_928',                       # Australia 915 - 928 MHz
+    'CN_470_510',                       # China 470 - 510 MHz
+    'CN_779_787',                       # China 779 - 787 MHz
+    'EU_433',                           # Europe 433 MHz
+    'EU_863_870',                       # Europe 863 - 870 MHz
+    'IN_865_870',                       # India 865 - 867 MHz
+    'KR_920_923',                       # Korea 920 - 923 MHz
+    'RU_864_870',                       # Russia 864 - 870 MHz
+    'US_902_928',                       # United States 902 - 928 MHz
+]
+
+# -------------------------------------------------------------------------
+# incremental reader of a json document.
+# The buffer has only the part of the file not yet decoded.
+#
+class JsonStream:
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    # read a new block; return False at the end of the file
+    def fill(self):
+        if self.eof:
+            return False
+        block = self.f.read(BlockSize)
+        if not block:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + block
+        self.pos = 0
+        return True
+
+    # next char not blank ('' at the end of the file)
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError("json: expected '{}' at char {}".format(ch, self.pos))
+        self.pos += 1
+
+    # decode the next value; if it is not complete in the buffer, read more blocks.
+    # A value that ends at the end of the buffer (a number) could continue in the next block
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                val, end = self.decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return val
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    # keys of the object that starts at the current position:
+    # after each key, the caller must read its value
+    def members(self):
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            ch = self.peek()
+            if ch == ',':
+                self.pos += 1
+            elif ch == '}':
+                self.pos += 1
+                return
+            else:
+                raise ValueError("json: expected ',' or '}}' at char {}".format(self.pos))
+
+# -------------------------------------------------------------------------
+# gateways of the TTN json file fpJson: iterator of (gateway id, status)
+#
+def iterGateways(fpJson):
+    with open(fpJson, 'r', encoding='utf-8') as f:
+        js = JsonStream(f)
+        for key in js.members():
+            if key != 'statuses':
+                js.value()                  # not used
+                continue
+            for gtwId in js.members():
+                yield (gtwId, js.value())
+
+# -------------------------------------------------------------------------
+# record of the gateway in the store: (frequency plan, lat, lon, altitude),
+# with the values as strings, as written in the csv.
+# None if the gateway has no coordinates
+#
+def gatewayRecord(val):
+    loc = val.get('location')
+    if loc is None or "latitude" not in loc or "longitude" not in loc:
+        return None
+    alt = "{}".format(loc['altitude']) if "altitude" in loc else ""
+    return ("{}".format(val.get("frequency_plan", "")),
+            "{}".format(loc['latitude']), "{}".format(loc['longitude']), alt)
+
+# line of the csv of the gateway: id; lat; lon; altitude
+def gatewayCsvLine(gtwId, rec):
+    return "\"{}\"{}{}{}{}{}{}\n".format(gtwId, csv_sep, rec[1], csv_sep, rec[2], csv_sep, rec[3])
+
+# first row of the csv
+def gatewayCsvHeader():
+    return "\"gtw_id\"{0}\"lat\"{0}\"lon\"{0}\"alt\"\n".format(csv_sep)
+
+# file name of the csv of the frequency plan
+def gatewayPlanFileName(freqPlan):
+    return "gtwttn-{}.csv".format(freqPlan)
+
+# -------------------------------------------------------------------------
+# gateway store gtwttn-store.csv: all the gateways with coordinates, with
+#   gtw_id; freq_plan; lat; lon; alt; updated_at
+# updated_at is the time (epoch s) of the refresh that found the gateway
+# new or with a different frequency plan or position.
+# The modification time of the store is the time of the last refresh:
+# the cache is valid for CacheTTL seconds.
+#
+def readGatewayStore(dirGtw):
+    store = {}
+    fpStore = os.path.join(dirGtw, GtwStoreName)
+    if not os.path.exists(fpStore):
+        return store
+    with open(fpStore, 'r', newline='', encoding='utf-8') as fStore:
+        for row in csv.DictReader(fStore, delimiter=csv_sep):
+            store[row['gtw_id']] = (row['freq_plan'], row['lat'], row['lon'], row['alt'], int(row['updated_at']))
+    return store
+
+def writeGatewayStore(dirGtw, store):
+    fpStore = os.path.join(dirGtw, GtwStoreName)
+    fpTmp = fpStore + '.part'
+    with open(fpTmp, 'w', newline='', encoding='utf-8') as fStore:
+        wr = csv.writer(fStore, delimiter=csv_sep, lineterminator='\n')
+        wr.writerow(['gtw_id', 'freq_plan', 'lat', 'lon', 'alt', 'updated_at'])
+        for gtwId, rec in store.items():
+            wr.writerow([gtwId] + list(rec))
+    os.replace(fpTmp, fpStore)
+
+# seconds from the last refresh of the store of dirGtw (None if there is no store)
+def gatewayCacheAge(dirGtw):
+    fpStore = os.path.join(dirGtw, GtwStoreName)
+    if not os.path.exists(fpStore):
+        return None
+    return time.time() - os.path.getmtime(fpStore)
+
+# -------------------------------------------------------------------------
+# refresh the store of dirOut with the gateways of the json file fpJson,
+# read once. The diff with the store selects the frequency plans with new,
+# moved or removed gateways: the csv of these plans are written again as a
+# whole (the rows have variable length, they can not be updated in place),
+# with the combined file; the csv of the other plans are not touched, so
+# their modification time (key of the binary store, see gtwstore.py) does
+# not change.
+# return a dict with the n. of gateways new, moved, removed, unchanged
+# and the list of the plans written
+#
+def refreshGatewayStore(fpJson, dirOut, freqPlans=FreqPlans):
+    tNow = int(time.time())
+    old = readGatewayStore(dirOut)
+    store = {}
+    stats = {'new': 0, 'moved': 0, 'removed': 0, 'unchanged': 0}
+    changed = set()
+    for gtwId, val in iterGateways(fpJson):
+        rec = gatewayRecord(val)
+        if rec is None or gtwId in store:
+            continue
+        prev = old.get(gtwId)
+        if prev is None:
+            stats['new'] += 1
+            changed.add(rec[0])
+            store[gtwId] = rec + (tNow,)
+        elif prev[:4] != rec:
+            stats['moved'] += 1
+            changed.update((rec[0], prev[0]))
+            store[gtwId] = rec + (tNow,)
+        else:
+            stats['unchanged'] += 1
+            store[gtwId] = prev
+    for gtwId, prev in old.items():
+        if gtwId not in store:
+            stats['removed'] += 1
+            changed.add(prev[0])
+    writeGatewayStore(dirOut, store)
+
+    # csv of the frequency plans changed or not present
+    plans = [plan for plan in freqPlans if plan in changed or
+            not os.path.exists(os.path.join(dirOut, gatewayPlanFileName(plan)))]
+    for plan in plans:
+        fpPlan = os.path.join(dirOut, gatewayPlanFileName(plan))
+        with open(fpPlan + '.part', 'w') as fPlan:
+            fPlan.write(gatewayCsvHeader())
+            for gtwId, rec in store.items():
+                if rec[0] == plan:
+                    fPlan.write(gatewayCsvLine(gtwId, rec))
+        os.replace(fpPlan + '.part', fpPlan)
+    if plans or not os.path.exists(os.path.join(dirOut, GtwAllName + '.idx')):
+        counts = dict.fromkeys(freqPlans, 0)
+        for rec in store.values():
+            if rec[0] in counts:
+                counts[rec[0]] += 1
+        writeGatewayIndex(dirOut, freqPlans, counts)
+    stats['plans'] = plans
+    return stats
+
+# -------------------------------------------------------------------------
+# combined file gtwttn-all.csv and its index gtwttn-all.idx:
+# the rows of each plan are copied from its csv, without the first row
+#
+def writeGatewayIndex(dirOut, freqPlans, counts):
+    fpAll = os.path.join(dirOut, GtwAllName + '.csv')
+    fpIdx = os.path.join(dirOut, GtwAllName + '.idx')
+    with open(fpAll, 'wb') as fAll, open(fpIdx, 'w') as fIdx:
+        fAll.write(gatewayCsvHeader().encode('utf-8'))
+        fIdx.write("freq_plan" + csv_sep + "pos_data" + csv_sep + "size" + csv_sep + "n_rec" + '\n')
+        for plan in freqPlans:
+            pos = fAll.tell()
+            with open(os.path.join(dirOut, gatewayPlanFileName(plan)), 'rb') as fPlan:
+                fPlan.readline()                    # first row
+                shutil.copyfileobj(fPlan, fAll)
+            fIdx.write(plan + csv_sep + str(pos) + csv_sep + str(fAll.tell() - pos)
+                    + csv_sep + str(counts[plan]) + '\n')
+
+# -------------------------------------------------------------------------
+# csv of the gateways of the frequency plan, searched in dirGtw:
+# the file gtwttn-<plan>.csv or, if not present, the rows of the plan read
+# from gtwttn-all.csv with the index. Return None if the plan is not found
+#
+def gatewayPlanCsv(dirGtw, freqPlan):
+    fpPlan = os.path.join(dirGtw, gatewayPlanFileName(freqPlan))
+    if os.path.exists(fpPlan):
+        return fpPlan
+    fpAll = os.path.join(dirGtw, GtwAllName + '.csv')
+    fpIdx = os.path.join(dirGtw, GtwAllName + '.idx')
+    if not os.path.exists(fpAll) or not os.path.exists(fpIdx):
+        return None
+    with open(fpIdx, 'r', newline='') as fIdx:
+        for row in csv.DictReader(fIdx, delimiter=csv_sep):
+            if row['freq_plan'] != freqPlan:
+                continue
+            with open(fpAll, 'rb') as fAll:
+                header = fAll.readline()
+                fAll.seek(int(row['pos_data']))
+                block = fAll.read(int(row['size']))
+            return io.StringIO((header + block).decode('utf-8'))
+    return None